@@ -1,2 +1,3 @@
 from API.chat_api import router as chat_router
-from API.cart_api import router as cart_router
\ No newline at end of file
+from API.cart_api import router as cart_router
+from API.health_api import router as health_router
\ No newline at end of file
@@ -0,0 +1,22 @@
+from fastapi import APIRouter
+from Database.db_connection import get_pool_stats
+from Database.chat_history_writer import chat_history_writer
+from RagCore.Embeddings import embedding_cache, embedding_provider
+
+router = APIRouter()
+
+@router.get("/health/db")
+async def get_db_stats():
+    return get_pool_stats()
+
+@router.get("/health/chat-history")
+async def get_chat_history_writer_stats():
+    return chat_history_writer.get_stats()
+
+@router.get("/health/embedding")
+async def get_embedding_stats():
+    return embedding_provider.get_stats()
+
+@router.get("/health/embedding-cache")
+async def get_embedding_cache_stats():
+    return embedding_cache.get_stats()
\ No newline at end of file
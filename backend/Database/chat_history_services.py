@@ -1,38 +1,171 @@
-from .db_connection import get_db_connection
+from .db_connection import get_db_connection, get_maintenance_connection
 from typing import Dict, Optional, List
+from datetime import date, datetime, timedelta
+import argparse
+import os
+import re
 from google.genai import types
 from google.genai.types import FunctionCall, FunctionResponse
 import json
 
-def creat_db_chat_history_table():
+# Bật để tạo bảng message phân vùng theo tháng (created_at); xoá dữ liệu cũ bằng DROP partition
+MESSAGE_PARTITIONED = os.getenv("MESSAGE_PARTITIONED", "false").lower() == "true"
+MESSAGE_PARTITION_MONTHS_AHEAD = int(os.getenv("MESSAGE_PARTITION_MONTHS_AHEAD", "3"))
+MESSAGE_RETENTION_DAYS = int(os.getenv("MESSAGE_RETENTION_DAYS", "180"))
+RETENTION_DELETE_BATCH = 5000
+
+PARTITION_NAME_PATTERN = re.compile(r"^message_p(\d{4})(\d{2})$")
+
+# Thứ tự cột khớp với index idx_message_thread_created_at: mỗi lượt chat chỉ đọc `limit` dòng
+# đầu tiên của index thay vì sắp xếp toàn bộ lịch sử của thread.
+CHAT_HISTORY_QUERY = """
+    SELECT id::text AS id, thread_id, user_question, bot_answer, function_call, function_response, created_at
+    FROM message
+    WHERE thread_id = %(thread_id)s
+    ORDER BY created_at DESC, message.id DESC
+    LIMIT %(limit)s
+"""
+
+CHAT_HISTORY_BEFORE_QUERY = """
+    SELECT id::text AS id, thread_id, user_question, bot_answer, function_call, function_response, created_at
+    FROM message
+    WHERE thread_id = %(thread_id)s
+      AND (created_at, id) < (%(created_at)s, %(id)s::uuid)
+    ORDER BY created_at DESC, message.id DESC
+    LIMIT %(limit)s
+"""
+
+def creat_db_chat_history_table(partitioned: bool = MESSAGE_PARTITIONED):
     try:
-        with get_db_connection() as conn:
+        with get_maintenance_connection() as conn:
             with conn.cursor() as cursor:
                 # Tạo UUID cho mỗi tin nhắn
                 cursor.execute("CREATE EXTENSION IF NOT EXISTS \"uuid-ossp\"")
 
                 # Tạo bảng
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS message (
-                        id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-                        thread_id VARCHAR(255) NOT NULL,
-                        user_question TEXT NOT NULL,
-                        bot_answer TEXT NOT NULL,
-                        function_call TEXT,
-                        function_response TEXT, 
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
+                if partitioned:
+                    # Khoá chính của bảng phân vùng phải chứa cột phân vùng
+                    cursor.execute("""
+                        CREATE TABLE IF NOT EXISTS message (
+                            id UUID NOT NULL DEFAULT uuid_generate_v4(),
+                            thread_id VARCHAR(255) NOT NULL,
+                            user_question TEXT NOT NULL,
+                            bot_answer TEXT NOT NULL,
+                            function_call TEXT,
+                            function_response TEXT, 
+                            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                            PRIMARY KEY (id, created_at)
+                        ) PARTITION BY RANGE (created_at)
+                    """)
+                    # Chứa các dòng nằm ngoài những tháng đã tạo partition
+                    cursor.execute("CREATE TABLE IF NOT EXISTS message_default PARTITION OF message DEFAULT")
+                    _create_month_partitions(cursor, MESSAGE_PARTITION_MONTHS_AHEAD)
+                else:
+                    cursor.execute("""
+                        CREATE TABLE IF NOT EXISTS message (
+                            id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+                            thread_id VARCHAR(255) NOT NULL,
+                            user_question TEXT NOT NULL,
+                            bot_answer TEXT NOT NULL,
+                            function_call TEXT,
+                            function_response TEXT, 
+                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                        )
+                    """)
 
-                # Tạo index để tăng tốc truy vấn tin nhắn
+                # Index phục vụ đúng câu truy vấn lịch sử: lọc thread_id, sắp xếp created_at DESC.
+                # Không INCLUDE các cột TEXT: một tin nhắn dài sẽ vượt giới hạn kích thước dòng của btree.
                 cursor.execute("""
-                    CREATE INDEX IF NOT EXISTS idx_message_thread_id 
-                    ON message(thread_id)
+                    CREATE INDEX IF NOT EXISTS idx_message_thread_created_at
+                    ON message(thread_id, created_at DESC, id DESC)
                 """)
+                # Cho apply_message_retention: mỗi lô DELETE đọc theo khoảng created_at thay vì quét toàn bảng
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_message_created_at ON message(created_at)")
+                # Index cũ chỉ có thread_id là tiền tố của index trên nên không còn cần thiết
+                cursor.execute("DROP INDEX IF EXISTS idx_message_thread_id")
                 conn.commit()
     except Exception as error:
         print(f"Lỗi khi tạo bảng: {error}")
 
+def _month_start(value: date, months: int = 0) -> date:
+    month_index = value.year * 12 + value.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+def _is_partitioned(cursor) -> bool:
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('message')")
+    row = cursor.fetchone()
+    return bool(row) and row['relkind'] == 'p'
+
+def _create_month_partitions(cursor, months_ahead: int):
+    this_month = _month_start(date.today())
+    for offset in range(months_ahead + 1):
+        start = _month_start(this_month, offset)
+        end = _month_start(this_month, offset + 1)
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS message_p{start:%Y%m}
+            PARTITION OF message FOR VALUES FROM ('{start}') TO ('{end}')
+        """)
+
+def ensure_message_partitions(months_ahead: int = MESSAGE_PARTITION_MONTHS_AHEAD):
+    """Tạo trước partition cho tháng hiện tại và `months_ahead` tháng tới (chạy định kỳ, vd: cron hằng tháng)."""
+    try:
+        with get_maintenance_connection() as conn:
+            with conn.cursor() as cursor:
+                if not _is_partitioned(cursor):
+                    print("Bảng message không được phân vùng, bỏ qua.")
+                    return
+                _create_month_partitions(cursor, months_ahead)
+                conn.commit()
+    except Exception as error:
+        print(f"Lỗi khi tạo partition: {error}")
+
+def apply_message_retention(retention_days: int = MESSAGE_RETENTION_DAYS) -> int:
+    """Xoá tin nhắn cũ hơn `retention_days` ngày.
+
+    Với bảng phân vùng, các partition tháng nằm trọn trước mốc được DROP (không tạo dead tuple, không cần VACUUM);
+    bảng thường thì DELETE theo từng lô để không giữ khoá lâu.
+
+    Returns:
+        int: Số partition đã xoá (bảng phân vùng) hoặc số dòng đã xoá (bảng thường).
+    """
+    cutoff = datetime.now() - timedelta(days=retention_days)
+    removed = 0
+    try:
+        with get_maintenance_connection() as conn:
+            with conn.cursor() as cursor:
+                if _is_partitioned(cursor):
+                    cursor.execute("""
+                        SELECT c.relname FROM pg_inherits i
+                        JOIN pg_class c ON c.oid = i.inhrelid
+                        WHERE i.inhparent = 'message'::regclass
+                    """)
+                    for row in cursor.fetchall():
+                        match = PARTITION_NAME_PATTERN.match(row['relname'])
+                        if not match:
+                            continue
+                        end = _month_start(date(int(match.group(1)), int(match.group(2)), 1), 1)
+                        if end <= cutoff.date():
+                            cursor.execute(f"DROP TABLE IF EXISTS {row['relname']}")
+                            print(f"Đã xoá partition {row['relname']}")
+                            removed += 1
+                    cursor.execute("DELETE FROM message_default WHERE created_at < %s", (cutoff,))
+                    conn.commit()
+                else:
+                    while True:
+                        cursor.execute("""
+                            DELETE FROM message WHERE id = ANY(ARRAY(
+                                SELECT id FROM message WHERE created_at < %s ORDER BY created_at LIMIT %s
+                            ))
+                        """, (cutoff, RETENTION_DELETE_BATCH))
+                        conn.commit()
+                        removed += cursor.rowcount
+                        if cursor.rowcount < RETENTION_DELETE_BATCH:
+                            break
+                    print(f"Đã xoá {removed} tin nhắn cũ hơn {cutoff:%Y-%m-%d}")
+    except Exception as error:
+        print(f"Lỗi khi xoá tin nhắn cũ: {error}")
+    return removed
+
 def clear_chat_history(thread_id: Optional[str] = None):
     try:
         with get_db_connection() as conn:
@@ -62,20 +195,55 @@ def save_message(thread_id: str, user_question: str, bot_answer: str, function_c
         print(f"Lỗi khi lưu tin nhắn: {error}")
         return None
 
-def get_chat_history(thread_id: str, limit: int=20) -> Optional[Dict]:
+def save_messages(messages: List[Dict]) -> int:
+    """Ghi nhiều tin nhắn trong một lệnh COPY và một lần commit (dùng bởi ChatHistoryWriter).
+
+    Mỗi tin nhắn mang sẵn `created_at` lúc được tạo để thứ tự lịch sử không phụ thuộc thời điểm ghi.
+    """
+    if not messages:
+        return 0
     try:
         with get_db_connection() as conn:
             with conn.cursor() as cursor:
-                cursor.execute(
-                    """
-                    SELECT thread_id, user_question, bot_answer, function_call, function_response, created_at 
-                    FROM message 
-                    WHERE thread_id = %s 
-                    ORDER BY created_at DESC
-                    LIMIT %s
-                    """,
-                    (thread_id, limit)
-                )
+                with cursor.copy(
+                    "COPY message (thread_id, user_question, bot_answer, function_call, function_response, created_at) FROM STDIN"
+                ) as copy:
+                    for message in messages:
+                        copy.write_row((
+                            message["thread_id"], message["user_question"], message["bot_answer"],
+                            message["function_call"], message["function_response"], message["created_at"],
+                        ))
+            conn.commit()
+            return len(messages)
+    except Exception as error:
+        print(f"Lỗi khi lưu {len(messages)} tin nhắn: {error}")
+        return 0
+
+def history_cursor(message: Dict) -> str:
+    """Cursor của một tin nhắn, truyền vào `get_chat_history(before=...)` để lấy trang cũ hơn."""
+    return f"{message['created_at'].isoformat()}|{message['id']}"
+
+def get_chat_history(thread_id: str, limit: int=20, before: Optional[str]=None) -> Optional[List[Dict]]:
+    """Lấy các tin nhắn mới nhất của thread (mới nhất trước), phân trang theo keyset.
+
+    Args:
+        thread_id (str): Mã cuộc trò chuyện.
+        limit (int): Số tin nhắn tối đa.
+        before (str): Cursor (từ `history_cursor`) của tin nhắn cũ nhất ở trang trước.
+    """
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                if before:
+                    created_at, message_id = before.split("|", 1)
+                    cursor.execute(CHAT_HISTORY_BEFORE_QUERY, {
+                        "thread_id": thread_id,
+                        "created_at": datetime.fromisoformat(created_at),
+                        "id": message_id,
+                        "limit": limit,
+                    })
+                else:
+                    cursor.execute(CHAT_HISTORY_QUERY, {"thread_id": thread_id, "limit": limit})
                 results = cursor.fetchall()
                 if results:
                     return results
@@ -104,4 +272,18 @@ def format_chat_history(chat_history: List[Dict]) -> Optional[List]:
         return []
 
     return formatted_history
-    
\ No newline at end of file
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bảo trì bảng message (lịch sử trò chuyện)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    partitions_parser = subparsers.add_parser("partitions", help="Tạo trước partition cho các tháng tới")
+    partitions_parser.add_argument("--months-ahead", type=int, default=MESSAGE_PARTITION_MONTHS_AHEAD)
+    retention_parser = subparsers.add_parser("retention", help="Xoá tin nhắn cũ hơn số ngày chỉ định")
+    retention_parser.add_argument("--days", type=int, default=MESSAGE_RETENTION_DAYS)
+    args = parser.parse_args()
+
+    if args.command == "partitions":
+        ensure_message_partitions(args.months_ahead)
+    elif args.command == "retention":
+        apply_message_retention(args.days)
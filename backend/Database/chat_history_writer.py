@@ -0,0 +1,232 @@
+import os
+import time
+import asyncio
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+from .chat_history_services import save_messages
+
+
+CHAT_HISTORY_BATCH_SIZE = int(os.getenv("CHAT_HISTORY_BATCH_SIZE", "100"))
+CHAT_HISTORY_FLUSH_INTERVAL = float(os.getenv("CHAT_HISTORY_FLUSH_INTERVAL", "1.0"))     # giây
+CHAT_HISTORY_QUEUE_SIZE = int(os.getenv("CHAT_HISTORY_QUEUE_SIZE", "1000"))
+CHAT_HISTORY_ENQUEUE_TIMEOUT = float(os.getenv("CHAT_HISTORY_ENQUEUE_TIMEOUT", "5.0"))   # giây
+CHAT_HISTORY_MAX_RETRIES = int(os.getenv("CHAT_HISTORY_MAX_RETRIES", "3"))
+CHAT_HISTORY_RETRY_BACKOFF = float(os.getenv("CHAT_HISTORY_RETRY_BACKOFF", "0.5"))       # giây, nhân đôi sau mỗi lần
+
+_STOP = object()
+
+
+class ChatHistoryWriter():
+    """Ghi lịch sử trò chuyện ở chế độ write-behind.
+
+    Tin nhắn được đưa vào hàng đợi có giới hạn và một task nền ghi theo lô (COPY) khi đủ
+    `batch_size` tin nhắn hoặc sau `flush_interval` giây, và khi tắt ứng dụng.
+    Hàng đợi đầy thì `enqueue` phải chờ (backpressure); chờ quá `enqueue_timeout` thì
+    ghi thẳng xuống DB để không mất tin nhắn.
+
+    Lô ghi lỗi (mất kết nối, DB khởi động lại...) được thử lại `max_retries` lần với thời gian chờ
+    tăng gấp đôi; vẫn lỗi thì được giữ lại và ghép vào lần ghi sau (tối đa `max_queue_size` tin nhắn),
+    trong lúc đó vẫn đọc được qua `pending_messages`.
+    """
+
+    def __init__(self, batch_size: int = CHAT_HISTORY_BATCH_SIZE, flush_interval: float = CHAT_HISTORY_FLUSH_INTERVAL,
+                 max_queue_size: int = CHAT_HISTORY_QUEUE_SIZE, enqueue_timeout: float = CHAT_HISTORY_ENQUEUE_TIMEOUT,
+                 max_retries: int = CHAT_HISTORY_MAX_RETRIES, retry_backoff: float = CHAT_HISTORY_RETRY_BACKOFF):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self.enqueue_timeout = enqueue_timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # Tin nhắn đã nhận nhưng chưa ghi xong, để lượt chat kế tiếp vẫn đọc được
+        self._unflushed: Dict[str, List[Dict]] = defaultdict(list)
+        # Tin nhắn của các lô ghi lỗi, chờ được ghi lại cùng lô kế tiếp
+        self._retry: List[Dict] = []
+
+        self.stats = {
+            "enqueued": 0,
+            "written": 0,
+            "failed": 0,
+            "retries": 0,
+            "dropped": 0,
+            "batches": 0,
+            "direct_writes": 0,
+            "backpressure_waits": 0,
+            "last_batch_size": 0,
+            "last_flush_ms": 0.0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._task = asyncio.create_task(self._run(), name="chat-history-writer")
+
+    async def stop(self):
+        """Ghi nốt các tin nhắn còn trong hàng đợi rồi dừng task nền."""
+        if not self.running:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    async def enqueue(self, thread_id: str, user_question: str, bot_answer: str,
+                      function_call: Optional[str], function_response: Optional[str]):
+        message = {
+            "thread_id": thread_id,
+            "user_question": user_question,
+            "bot_answer": bot_answer,
+            "function_call": function_call,
+            "function_response": function_response,
+            "created_at": datetime.now(),
+        }
+        self.stats["enqueued"] += 1
+
+        if not self.running:
+            # Chạy ngoài FastAPI (vd: test.py) thì không có task nền
+            await self._write_direct(message)
+            return
+
+        self._unflushed[thread_id].append(message)
+        try:
+            self._queue.put_nowait(message)
+            return
+        except asyncio.QueueFull:
+            self.stats["backpressure_waits"] += 1
+        try:
+            await asyncio.wait_for(self._queue.put(message), timeout=self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            self._discard_unflushed([message])
+            await self._write_direct(message)
+
+    def pending_messages(self, thread_id: str) -> List[Dict]:
+        """Các tin nhắn của thread chưa được ghi xuống DB (mới nhất trước, cùng dạng với get_chat_history)."""
+        return list(reversed(self._unflushed.get(thread_id, [])))
+
+    def get_stats(self) -> Dict:
+        return {
+            **self.stats,
+            "running": self.running,
+            "queue_size": self._queue.qsize() if self._queue else 0,
+            "retry_pending": len(self._retry),
+            "max_queue_size": self.max_queue_size,
+        }
+
+    async def _save_with_retry(self, batch: List[Dict]) -> bool:
+        delay = self.retry_backoff
+        for attempt in range(self.max_retries + 1):
+            if await asyncio.to_thread(save_messages, batch) == len(batch):
+                return True
+            if attempt < self.max_retries:
+                self.stats["retries"] += 1
+                await asyncio.sleep(delay)
+                delay *= 2
+        return False
+
+    async def _write_direct(self, message: Dict):
+        self.stats["direct_writes"] += 1
+        if await self._save_with_retry([message]):
+            self.stats["written"] += 1
+            return
+        self.stats["failed"] += 1
+        if self.running:
+            # Giữ lại để task nền ghi cùng lô sau
+            self._unflushed[message["thread_id"]].append(message)
+            self._keep_for_retry([message])
+        else:
+            print(f"Bỏ tin nhắn của thread {message['thread_id']} sau {self.max_retries} lần ghi lại không thành công")
+            self.stats["dropped"] += 1
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            if self._retry:
+                # Còn lô ghi lỗi: không chờ tin nhắn mới quá flush_interval trước khi thử ghi lại
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    await self._flush([])
+                    continue
+            else:
+                item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+        # Ghi nốt phần còn lại sau tín hiệu dừng
+        remaining = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not _STOP:
+                remaining.append(item)
+        for start in range(0, len(remaining), self.batch_size):
+            await self._flush(remaining[start:start + self.batch_size])
+        if self._retry:
+            await self._flush([])
+        if self._retry:
+            print(f"Bỏ {len(self._retry)} tin nhắn chưa ghi được khi dừng ChatHistoryWriter")
+            self.stats["dropped"] += len(self._retry)
+            self._discard_unflushed(self._retry)
+            self._retry = []
+
+    async def _flush(self, batch: List[Dict]):
+        batch, self._retry = self._retry + batch, []
+        if not batch:
+            return
+        start = time.perf_counter()
+        saved = await self._save_with_retry(batch)
+        self.stats["last_flush_ms"] = (time.perf_counter() - start) * 1000
+        self.stats["last_batch_size"] = len(batch)
+        self.stats["batches"] += 1
+        if saved:
+            self.stats["written"] += len(batch)
+            self._discard_unflushed(batch)
+        else:
+            self.stats["failed"] += len(batch)
+            self._keep_for_retry(batch)
+
+    def _keep_for_retry(self, batch: List[Dict]):
+        """Giữ lô ghi lỗi cho lần ghi sau; vượt quá max_queue_size thì bỏ các tin nhắn cũ nhất."""
+        self._retry.extend(batch)
+        overflow = len(self._retry) - self.max_queue_size
+        if overflow > 0:
+            dropped, self._retry = self._retry[:overflow], self._retry[overflow:]
+            print(f"Bỏ {overflow} tin nhắn cũ nhất sau nhiều lần ghi không thành công")
+            self.stats["dropped"] += overflow
+            self._discard_unflushed(dropped)
+
+    def _discard_unflushed(self, batch: List[Dict]):
+        for message in batch:
+            pending = self._unflushed.get(message["thread_id"])
+            if not pending:
+                continue
+            pending[:] = [m for m in pending if m is not message]
+            if not pending:
+                del self._unflushed[message["thread_id"]]
+
+
+# Dùng chung cho toàn bộ process, được start/stop trong lifespan của FastAPI
+chat_history_writer = ChatHistoryWriter()
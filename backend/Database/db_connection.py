@@ -1,7 +1,10 @@
 import os
 import dotenv
 import psycopg
+from psycopg.conninfo import make_conninfo
 from psycopg.rows import dict_row
+from psycopg_pool import ConnectionPool
+from pgvector.psycopg import register_vector
 
 
 dotenv.load_dotenv()
@@ -12,12 +15,76 @@ db_password = os.getenv("DB_PASSWORD")
 db_host = os.getenv("DB_HOST")
 db_port = os.getenv("DB_PORT")
 
+# Cấu hình connection pool
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", "300"))            # giây
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))               # giây chờ lấy connection
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "5000"))
+
+
+def _configure_connection(conn):
+    # Đăng ký adapter pgvector để vector được gửi/nhận ở dạng binary thay vì chuỗi số thập phân
+    try:
+        register_vector(conn)
+        conn.commit()
+    except psycopg.ProgrammingError:
+        # Extension vector chưa được tạo (trước khi chạy configuration_for_search)
+        conn.rollback()
+
+
+conninfo = make_conninfo(
+    host=db_host,
+    dbname=db_name,
+    user=db_user,
+    password=db_password,
+    port=db_port,
+)
+
+pool = ConnectionPool(
+    conninfo,
+    kwargs={
+        "row_factory": dict_row,    #Trả về kết quả dưới dạng dictionary thay vì tuple
+        "options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}",
+    },
+    min_size=DB_POOL_MIN_SIZE,
+    max_size=DB_POOL_MAX_SIZE,
+    max_idle=DB_POOL_MAX_IDLE,
+    timeout=DB_POOL_TIMEOUT,
+    configure=_configure_connection,
+    name="Database",
+    open=False,
+)
+
+
+def open_db_pool():
+    if pool.closed:
+        pool.open()
+
+
+def close_db_pool():
+    if not pool.closed:
+        pool.close()
+
+
 def get_db_connection():
-    return psycopg.connect(
-        host=db_host,
-        dbname=db_name,
-        user=db_user,
-        password=db_password,
-        port=db_port,
-        row_factory=dict_row    #Trả về kết quả dưới dạng dictionary thay vì tuple
-    )
+    """Mượn một connection từ pool; trả lại pool khi thoát khỏi khối `with`."""
+    # Mở pool khi chạy script ngoài FastAPI (vd: init_db, test.py)
+    open_db_pool()
+    return pool.connection()
+
+
+def get_maintenance_connection():
+    """Mở một connection riêng, không qua pool và không giới hạn statement_timeout; đóng khi thoát khối `with`.
+
+    Dùng cho DDL, migrate, build index và xoá dữ liệu cũ: trên catalog lớn các lệnh này chạy lâu hơn
+    DB_STATEMENT_TIMEOUT_MS nhiều và không nên giữ một connection của pool trong lúc chạy.
+    """
+    conn = psycopg.connect(conninfo, row_factory=dict_row, options="-c statement_timeout=0")
+    _configure_connection(conn)
+    return conn
+
+
+def get_pool_stats() -> dict:
+    """Thống kê sử dụng pool (số connection, số request đang chờ, thời gian chờ...)."""
+    return {**pool.get_stats(), "closed": pool.closed}
@@ -1,17 +1,28 @@
+import os
+from decimal import Decimal
+from typing import Optional
+import numpy as np
 import pandas as pd
-from sqlalchemy import create_engine, text
+from pgvector.psycopg import register_vector
 from .user_services import insert_user
-from .db_connection import get_db_connection
-from .db_connection import db_name, db_user, db_password, db_host, db_port
+from .db_connection import get_db_connection, get_maintenance_connection
 from .chat_history_services import creat_db_chat_history_table
-from .product_services import configuration_for_search
+from .product_services import EMBEDDING_DIMENSION, configuration_for_search, set_vector_dimension
+
+PRODUCT_DATA_PATH = os.getenv(
+    "PRODUCT_DATA_PATH", os.path.join(os.path.dirname(__file__), "product_data", "embedding_data.csv")
+)
+PRODUCT_IMAGE_URL = os.getenv("PRODUCT_IMAGE_URL", "img.png")
+
+# Cột ghi vào bảng Product và kiểu Postgres tương ứng cho COPY ... (FORMAT BINARY)
+PRODUCT_COLUMNS = ["name", "author", "category", "highlight", "description", "image_url", "embedding_vector", "price"]
+PRODUCT_COLUMN_TYPES = ["varchar", "varchar", "varchar", "text", "text", "varchar", "vector", "numeric"]
 
 
 
 def init_db_tables():
     try:
         with get_db_connection() as conn:
-            conn.autocommit = True
             with conn.cursor() as cursor:
                 create_user_table = """
                 CREATE TABLE IF NOT EXISTS "user" (
@@ -59,34 +70,70 @@ def init_db_tables():
 
                 cursor.execute(create_order_table)
                 print("Bảng Order đã được tạo thành công!")
+            conn.commit()
 
-                creat_db_chat_history_table()
+        creat_db_chat_history_table()
 
-                print("Tất cả các bảng đã được tạo thành công!")
+        print("Tất cả các bảng đã được tạo thành công!")
 
     except Exception as error:
         print(f"Lỗi khi tạo bảng: {error}")
 
-    finally:
-        if 'cursor' in locals():
-            cursor.close()
-        if 'conn' in locals():
-            conn.close()
-            print("Kết nối đến PostgreSQL đã đóng.")
-
 
-def seed_product_data():
-    df = pd.read_csv(r'D:\PythonProject\DemoRag2\backend\Database\product_data\embedding_data.csv')
-    df = df.drop(columns=['description_length', 'full_description', 'summarize'], errors='ignore')
-    df['image_url'] = "D:\PythonProject\DemoRag2\backend\Database\img.png"
-
-    engine = create_engine(f'postgresql+psycopg2://{db_user}:{db_password}@{db_host}/{db_name}')
-    print("connected!")
-    # Upload dữ liệu vào bảng Product
-    df.to_sql('product', engine, if_exists='append', index=False)
-    print("Thêm product data thành công!")
-
-def seed_data():
+def _clean(value):
+    # pandas dùng NaN cho ô trống; COPY cần None
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    return value
+
+
+def _parse_embedding(value) -> Optional[np.ndarray]:
+    value = _clean(value)
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.strip().strip("[]").split(",")
+    return np.asarray(value, dtype=np.float32)
+
+
+def seed_product_data(embedding_provider=None, path: str = PRODUCT_DATA_PATH, image_url: str = PRODUCT_IMAGE_URL):
+    """Nạp catalog bằng COPY ... FROM STDIN (FORMAT BINARY), embedding gửi ở dạng binary của pgvector."""
+    df = pd.read_csv(path)
+    if embedding_provider is not None:
+        # Tính lại embedding từ bản tóm tắt bằng provider đang cấu hình thay cho vector Gemini có sẵn trong file
+        texts = df['summarize'].fillna(df['name']).tolist()
+        vectors = [np.asarray(vector, dtype=np.float32) for vector in embedding_provider.get_embeddings(texts)]
+        vector_size = embedding_provider.dimension
+    else:
+        vectors = [_parse_embedding(value) for value in df['embedding_vector']]
+        vector_size = EMBEDDING_DIMENSION
+
+    with get_maintenance_connection() as conn:
+        with conn.cursor() as cursor:
+            # Cột embedding_vector được tạo với kiểu TEXT, chuyển sang vector(N) trước khi COPY binary
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS vector;")
+            set_vector_dimension(cursor, vector_size)
+        # Cursor sao chép bảng adapter của connection lúc được tạo nên phải mở cursor mới cho COPY
+        register_vector(conn)
+        with conn.cursor() as cursor:
+            with cursor.copy(f"COPY Product ({', '.join(PRODUCT_COLUMNS)}) FROM STDIN (FORMAT BINARY)") as copy:
+                copy.set_types(PRODUCT_COLUMN_TYPES)
+                for record, vector in zip(df.to_dict("records"), vectors):
+                    price = _clean(record.get("price"))
+                    copy.write_row((
+                        _clean(record.get("name")),
+                        _clean(record.get("author")),
+                        _clean(record.get("category")),
+                        _clean(record.get("highlight")),
+                        _clean(record.get("description")),
+                        image_url,
+                        vector,
+                        Decimal(str(price)) if price is not None else None,
+                    ))
+        conn.commit()
+    print(f"Thêm {len(df)} product thành công!")
+
+def seed_data(embedding_provider=None):
     users = [
         ("user1", "Hanoi, Vietnam"),
         ("user2", "Ho Chi Minh City, Vietnam"),
@@ -96,12 +143,15 @@ def seed_data():
     for user in users:
         insert_user(user[0], user[1])
 
-    seed_product_data()
+    seed_product_data(embedding_provider)
     
 
 
 if __name__ == "__main__":
+    from RagCore.Embeddings import embedding_provider
+
     init_db_tables()
-    seed_data()
-    configuration_for_search()
+    # embedding_data.csv chứa sẵn embedding của Gemini text-embedding-004; provider khác phải tính lại
+    seed_data(embedding_provider if embedding_provider.name != "gemini" else None)
+    configuration_for_search(embedding_provider.dimension)
     
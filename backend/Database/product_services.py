@@ -1,87 +1,209 @@
+import os
 from typing import Optional, Dict, List
-from .init_db import get_db_connection
+from .db_connection import get_db_connection, get_maintenance_connection
+from .vector_index import DISTANCE_OPERATOR, build_vector_index, vector_search_settings
 from decimal import Decimal
+import numpy as np
 
-def configuration_for_search(vector_size: int=768):
+# Số chiều của cột embedding_vector, phải khớp với EmbeddingProvider đang dùng (cùng biến môi trường)
+EMBEDDING_DIMENSION = int(os.getenv("EMBEDDING_DIMENSION", "768"))
+
+# Hybrid search trong một câu truy vấn: lấy ứng viên từ vector search và FTS,
+# rồi tính Reciprocal Rank Fusion ngay trong Postgres.
+HYBRID_SEARCH_QUERY = f"""
+    WITH vector_candidates AS (
+        SELECT id, distance, row_number() OVER (ORDER BY distance) AS vector_rank
+        FROM (
+            SELECT id, (embedding_vector {DISTANCE_OPERATOR} %(query_vector)b) AS distance
+            FROM Product
+            ORDER BY distance
+            LIMIT %(candidates)s
+        ) v
+    ),
+    text_candidates AS (
+        SELECT id, rank, row_number() OVER (ORDER BY rank DESC) AS text_rank
+        FROM (
+            SELECT id, ts_rank(search_vector, query) AS rank
+            FROM Product, plainto_tsquery('public.vietnamese', %(keyword)s) AS query
+            WHERE search_vector @@ query
+            ORDER BY rank DESC
+            LIMIT %(candidates)s
+        ) t
+    ),
+    fused AS (
+        SELECT coalesce(v.id, t.id) AS id, v.distance, t.rank,
+               coalesce(%(vector_weight)s / (%(rrf_k)s + v.vector_rank), 0)
+             + coalesce(%(text_weight)s / (%(rrf_k)s + t.text_rank), 0) AS rrf_score
+        FROM vector_candidates v
+        FULL OUTER JOIN text_candidates t ON v.id = t.id
+    )
+    SELECT p.id, p.name, p.author, p.category, p.description, p.price, p.stock_quantity,
+           f.distance, f.rank, f.rrf_score
+    FROM fused f
+    JOIN Product p ON p.id = f.id
+    ORDER BY f.rrf_score DESC
+    LIMIT %(k)s;
+"""
+
+# Tên sản phẩm được chuẩn hoá (chữ thường, bỏ dấu) giống hệt biểu thức của index trigram,
+# nếu không Postgres sẽ không dùng được index.
+NORMALIZED_NAME = "public.immutable_unaccent(lower(name))"
+
+# `<%` (word_similarity) để từ khoá ngắn vẫn khớp với tên sách dài; similarity để ưu tiên tên khớp trọn vẹn
+PRODUCT_BY_NAME_QUERY = f"""
+    SELECT id, name, author, category, highlight, description, price, stock_quantity,
+           word_similarity(q.term, {NORMALIZED_NAME}) AS score
+    FROM Product, (SELECT public.immutable_unaccent(lower(%(name)s)) AS term) AS q
+    WHERE q.term <%% {NORMALIZED_NAME}
+    ORDER BY score DESC, similarity(q.term, {NORMALIZED_NAME}) DESC
+    LIMIT %(limit)s;
+"""
+
+def configuration_for_search(vector_size: int=EMBEDDING_DIMENSION):
     try:
-        with get_db_connection() as conn:
+        with get_maintenance_connection() as conn:
             with conn.cursor() as cursor:
+                # Chỉ tạo cấu hình tiếng Việt một lần để có thể chạy lại hàm này
                 cursor.execute("""
-                    CREATE TEXT SEARCH DICTIONARY public.vietnamese (
-                        TEMPLATE = pg_catalog.simple,
-                        STOPWORDS = vietnamese
-                    );
-                    CREATE TEXT SEARCH CONFIGURATION public.vietnamese (
-                        COPY = pg_catalog.english
-                    );
-                    ALTER TEXT SEARCH CONFIGURATION public.vietnamese
-                        ALTER MAPPING
-                            FOR asciiword, asciihword, hword_asciipart, hword, hword_part, word
-                            WITH vietnamese;
+                    DO $$
+                    BEGIN
+                        IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'vietnamese') THEN
+                            CREATE TEXT SEARCH DICTIONARY public.vietnamese (
+                                TEMPLATE = pg_catalog.simple,
+                                STOPWORDS = vietnamese
+                            );
+                            CREATE TEXT SEARCH CONFIGURATION public.vietnamese (
+                                COPY = pg_catalog.english
+                            );
+                            ALTER TEXT SEARCH CONFIGURATION public.vietnamese
+                                ALTER MAPPING
+                                    FOR asciiword, asciihword, hword_asciipart, hword, hword_part, word
+                                    WITH vietnamese;
+                        END IF;
+                    END
+                    $$;
                 """)
 
+                migrate_search_vector(cursor)
+                migrate_name_search(cursor)
+
                 cursor.execute("CREATE EXTENSION IF NOT EXISTS vector;")
 
-                cursor.execute(f"""
-                    ALTER TABLE Product
-                    ALTER COLUMN embedding_vector TYPE vector({vector_size})
-                    USING embedding_vector::vector({vector_size});
-                """)
+                set_vector_dimension(cursor, vector_size)
 
-                cursor.execute("CREATE INDEX ON Product USING ivfflat (embedding_vector vector_cosine_ops);")
+                build_vector_index(cursor)
                 conn.commit()
     except Exception as err:
         print("Lỗi configuration: ",err)
 
-                
-def hybrid_search(keyword: str, query_vector: List, rrf_k: int=60, k: int=5) -> Optional[List[Dict]]:
-    text_results = get_related_product_by_word(keyword, k=k)
-    vector_results = get_related_product_by_vector(query_vector, k=k)
-    
-    # print(text_results)
-    # print("*"*80)
-    # print(vector_results)
-
-    if not text_results and not vector_results:
+def get_vector_dimension(cursor) -> Optional[int]:
+    """Số chiều hiện tại của cột embedding_vector, None nếu cột chưa có kiểu vector(N)."""
+    # Với kiểu vector(N) của pgvector, atttypmod chính là N (-1 nếu không khai báo số chiều)
+    cursor.execute("""
+        SELECT format_type(atttypid, atttypmod) AS column_type, atttypmod AS dimension
+        FROM pg_attribute
+        WHERE attrelid = 'product'::regclass AND attname = 'embedding_vector';
+    """)
+    row = cursor.fetchone()
+    if row is None or not row['column_type'].startswith("vector") or row['dimension'] <= 0:
         return None
-    if not text_results:
-        return sorted(vector_results, key=lambda x: x.get('distance', float('inf')))[:k]
-    if not vector_results:
-        return text_results[:k]
+    return row['dimension']
 
-    all_items_dict = {item['id']: item for item in vector_results}
-    all_items_dict.update({item['id']: item for item in text_results}) 
+def set_vector_dimension(cursor, vector_size: int = EMBEDDING_DIMENSION):
+    """Đưa cột embedding_vector về kiểu vector(vector_size).
 
-    text_ranks = {item['id']: rank + 1 for rank, item in enumerate(text_results)}
-    vector_ranks = {item['id']: rank + 1 for rank, item in enumerate(vector_results)}
+    Nếu cột đã là vector với số chiều khác (đổi embedding model/provider), embedding cũ không so sánh
+    được với vector của model mới nên bị đặt về NULL và cần được tính lại.
+    """
+    current = get_vector_dimension(cursor)
+    if current == vector_size:
+        return
+    if current is None:
+        using = f"embedding_vector::vector({vector_size})"
+    else:
+        using = f"NULL::vector({vector_size})"
+        print(f"Cột embedding_vector đổi từ {current} sang {vector_size} chiều: embedding cũ đã bị xoá, "
+              f"cần tính lại embedding cho các sản phẩm")
 
-    all_ids = set(text_ranks.keys()).union(set(vector_ranks.keys()))
+    cursor.execute(f"""
+        ALTER TABLE Product
+        ALTER COLUMN embedding_vector TYPE vector({vector_size})
+        USING {using};
+    """)
 
-    rrf_scores = {}
-    for id_ in all_ids:
-        score = 0.0
-        text_rank = text_ranks.get(id_)
-        if text_rank is not None:
-            score += 1.0 / (rrf_k + text_rank)
+def migrate_search_vector(cursor):
+    """Thêm cột tsvector sinh tự động (có trọng số) và GIN index cho full-text search.
 
-        vector_rank = vector_ranks.get(id_)
-        if vector_rank is not None:
-            score += 1.0 / (rrf_k + vector_rank)
+    Tên sách và tác giả có trọng số cao nhất (A), thể loại (B), mô tả (C).
+    `ADD COLUMN ... STORED` tính giá trị cho toàn bộ các dòng đã có, nên đây cũng
+    là bước migrate dữ liệu cũ. `coalesce` tránh việc cả vector bị NULL khi một cột NULL.
+    """
+    cursor.execute("""
+        ALTER TABLE Product
+        ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('public.vietnamese', coalesce(name, '')), 'A') ||
+            setweight(to_tsvector('public.vietnamese', coalesce(author, '')), 'A') ||
+            setweight(to_tsvector('public.vietnamese', coalesce(category, '')), 'B') ||
+            setweight(to_tsvector('public.vietnamese', coalesce(description, '')), 'C')
+        ) STORED;
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_product_search_vector
+        ON Product USING GIN (search_vector);
+    """)
 
-        rrf_scores[id_] = score
+def migrate_name_search(cursor):
+    """Tạo GIN index trigram trên tên sản phẩm (không phân biệt hoa thường và dấu tiếng Việt).
 
-    # Sắp xếp các ID dựa trên điểm RRF giảm dần
-    sorted_ids = sorted(rrf_scores, key=rrf_scores.get, reverse=True)
+    `unaccent()` chỉ là STABLE nên không dùng trực tiếp trong index được; bọc nó trong một
+    hàm IMMUTABLE với từ điển ghi rõ schema để kết quả không phụ thuộc search_path.
+    """
+    cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+    cursor.execute("CREATE EXTENSION IF NOT EXISTS unaccent;")
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION public.immutable_unaccent(text) RETURNS text
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+        AS $func$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $func$;
+    """)
+    cursor.execute(f"""
+        CREATE INDEX IF NOT EXISTS idx_product_name_trgm
+        ON Product USING GIN ({NORMALIZED_NAME} gin_trgm_ops);
+    """)
+                
+def hybrid_search(keyword: str, query_vector: List, rrf_k: int=60, k: int=5,
+                  vector_weight: float=1.0, text_weight: float=1.0, candidates: Optional[int]=None) -> Optional[List[Dict]]:
+    """Tìm kiếm kết hợp vector + full-text, xếp hạng bằng RRF trong một lần truy vấn.
 
-    final_results = []
-    for id_ in sorted_ids[:k]:
-        if id_ in all_items_dict:
-            item = all_items_dict[id_].copy()
-            item['rrf_score'] = rrf_scores[id_]
-            print(item['name'])
-            print(item['rrf_score'])
-            final_results.append(item)
-    return final_results
+    Args:
+        keyword (str): Từ khoá cho full-text search.
+        query_vector (List): Embedding của truy vấn.
+        rrf_k (int): Hằng số k của Reciprocal Rank Fusion.
+        k (int): Số sản phẩm trả về.
+        vector_weight (float): Trọng số của nhánh vector.
+        text_weight (float): Trọng số của nhánh full-text.
+        candidates (int): Số ứng viên lấy từ mỗi nhánh trước khi hợp nhất.
+    """
+    if not query_vector:
+        return get_related_product_by_word(keyword, k=k)
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(*vector_search_settings())
+                cursor.execute(HYBRID_SEARCH_QUERY, {
+                    "keyword": keyword,
+                    "query_vector": np.asarray(query_vector, dtype=np.float32),
+                    "rrf_k": rrf_k,
+                    "k": k,
+                    "vector_weight": float(vector_weight),
+                    "text_weight": float(text_weight),
+                    "candidates": candidates or max(k * 4, 20),
+                })
+                return cursor.fetchall()
+
+    except Exception as e:
+        print(f"Lỗi khi tìm kiếm hybrid ({type(e).__name__}): {e}") 
+        return None
 
 
 def get_related_product_by_word(keyword: str, k: int=5) -> Optional[List[Dict]]:
@@ -90,13 +212,12 @@ def get_related_product_by_word(keyword: str, k: int=5) -> Optional[List[Dict]]:
             with conn.cursor() as cursor:
                 cursor.execute("""
                 SELECT id, name, author, category, description, price, stock_quantity,
-                       ts_rank(to_tsvector('vietnamese', description || ' ' || name || ' ' || author || ' ' || category), 
-                               plainto_tsquery('vietnamese', %s)) AS rank
-                FROM Product
-                WHERE to_tsvector('vietnamese', description || ' ' || name || ' ' || author || ' ' || category) @@ plainto_tsquery('vietnamese', %s)
+                       ts_rank(search_vector, query) AS rank
+                FROM Product, plainto_tsquery('public.vietnamese', %s) AS query
+                WHERE search_vector @@ query
                 ORDER BY rank DESC
                 LIMIT %s;
-                """, (keyword, keyword, k)
+                """, (keyword, k)
                 )
                 results = cursor.fetchall()
                 # print(results)
@@ -113,14 +234,15 @@ def get_related_product_by_vector(query_vector: List, k: int=5) -> Optional[List
     try:
         with get_db_connection() as conn:
             with conn.cursor() as cursor:
-                cursor.execute("""
+                cursor.execute(*vector_search_settings())
+                cursor.execute(f"""
                     SELECT id, name, author, category, description, price, stock_quantity, 
-                            (embedding_vector <-> %s) AS distance
+                            (embedding_vector {DISTANCE_OPERATOR} %b) AS distance
                     FROM Product 
                     ORDER BY distance 
                     LIMIT %s;
                     """,
-                    (str(query_vector), k)
+                    (np.asarray(query_vector, dtype=np.float32), k)
                 )
 
                 results = cursor.fetchall()
@@ -166,24 +288,33 @@ def update_product_stock(product_id: int, quantity: int) -> bool:
         print(err)
         return False
 
-def get_product_by_name(product_name: str) -> Optional[Dict]:
+def search_products_by_name(product_name: str, limit: int=5) -> Optional[List[Dict]]:
+    """Tìm sản phẩm theo tên gần đúng (trigram), xếp theo độ tương đồng giảm dần.
+
+    Args:
+        product_name (str): Tên (hoặc một phần tên) sản phẩm, có dấu hoặc không dấu.
+        limit (int): Số sản phẩm trả về.
+
+    Returns:
+        List[Dict]: Các sản phẩm kèm `score` trong khoảng [0, 1].
+    """
     try:
         with get_db_connection() as conn:
             with conn.cursor() as cursor:
-                cursor.execute("""SELECT id, author, category, highlight, description, price, stock_quantity 
-                FROM Product
-                WHERE LOWER(name) LIKE LOWER(%s);""", 
-                ("%" + product_name + "%",)
-                )
-
-                result = cursor.fetchone()
-                if result:
+                cursor.execute(PRODUCT_BY_NAME_QUERY, {"name": product_name, "limit": limit})
+                results = cursor.fetchall()
+                for result in results:
                     result['price'] = Decimal(result['price'])
-                    
-                return result
+
+                return results
 
     except Exception as err:
         print(err)
         return None
 
+def get_product_by_name(product_name: str) -> Optional[Dict]:
+    """Trả về sản phẩm có tên khớp nhất, hoặc None nếu không tìm thấy."""
+    results = search_products_by_name(product_name, limit=1)
+    return results[0] if results else None
+
 
@@ -0,0 +1,80 @@
+import os
+import math
+import dotenv
+
+
+dotenv.load_dotenv()
+
+# Metric quyết định đồng thời toán tử trong câu truy vấn và operator class của index.
+# Nếu hai thứ này lệch nhau (vd: index cosine nhưng ORDER BY <->) thì Postgres không dùng được index.
+DISTANCE_METRICS = {
+    "cosine": {"operator": "<=>", "opclass": "vector_cosine_ops"},
+    "l2": {"operator": "<->", "opclass": "vector_l2_ops"},
+    "inner_product": {"operator": "<#>", "opclass": "vector_ip_ops"},
+}
+
+VECTOR_DISTANCE_METRIC = os.getenv("VECTOR_DISTANCE_METRIC", "cosine")
+VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "hnsw")      # "hnsw" hoặc "ivfflat"
+VECTOR_INDEX_NAME = "idx_product_embedding_vector"
+INDEX_BUILD_MAINTENANCE_WORK_MEM = os.getenv("INDEX_BUILD_MAINTENANCE_WORK_MEM", "256MB")
+
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "40"))
+IVFFLAT_PROBES = int(os.getenv("IVFFLAT_PROBES", "10"))
+
+if VECTOR_DISTANCE_METRIC not in DISTANCE_METRICS:
+    raise ValueError(f"Unknown VECTOR_DISTANCE_METRIC: {VECTOR_DISTANCE_METRIC}")
+if VECTOR_INDEX_TYPE not in ("hnsw", "ivfflat"):
+    raise ValueError(f"Unknown VECTOR_INDEX_TYPE: {VECTOR_INDEX_TYPE}")
+
+DISTANCE_OPERATOR = DISTANCE_METRICS[VECTOR_DISTANCE_METRIC]["operator"]
+DISTANCE_OPCLASS = DISTANCE_METRICS[VECTOR_DISTANCE_METRIC]["opclass"]
+
+
+def ivfflat_lists(row_count: int) -> int:
+    """Số list cho ivfflat theo khuyến nghị của pgvector: rows/1000 (tới 1 triệu dòng), sau đó sqrt(rows)."""
+    if row_count <= 1_000_000:
+        return max(1, row_count // 1000)
+    return max(1, int(math.sqrt(row_count)))
+
+
+def vector_search_settings() -> tuple[str, tuple]:
+    """Câu lệnh đặt tham số recall cho truy vấn ANN, chỉ có hiệu lực trong transaction hiện tại."""
+    return (
+        "SELECT set_config('hnsw.ef_search', %s, true), set_config('ivfflat.probes', %s, true);",
+        (str(HNSW_EF_SEARCH), str(IVFFLAT_PROBES)),
+    )
+
+
+def build_vector_index(cursor, index_type: str = VECTOR_INDEX_TYPE):
+    """(Re)build index ANN trên embedding_vector khớp với metric đã cấu hình."""
+    cursor.execute("SELECT set_config('maintenance_work_mem', %s, true);", (INDEX_BUILD_MAINTENANCE_WORK_MEM,))
+    # Xoá cả các index cũ không tên (mỗi lần chạy configuration_for_search trước đây lại tạo thêm một index ivfflat)
+    cursor.execute("""
+        SELECT indexname FROM pg_indexes
+        WHERE tablename = 'product' AND indexdef LIKE '%(embedding_vector%';
+    """)
+    for row in cursor.fetchall():
+        cursor.execute(f'DROP INDEX IF EXISTS "{row["indexname"]}";')
+
+    if index_type == "hnsw":
+        cursor.execute(f"""
+            CREATE INDEX {VECTOR_INDEX_NAME} ON Product
+            USING hnsw (embedding_vector {DISTANCE_OPCLASS})
+            WITH (m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION});
+        """)
+        print(f"Đã tạo index hnsw ({DISTANCE_OPCLASS}, m={HNSW_M}, ef_construction={HNSW_EF_CONSTRUCTION})")
+    elif index_type == "ivfflat":
+        cursor.execute("SELECT count(*) AS total FROM Product WHERE embedding_vector IS NOT NULL;")
+        lists = ivfflat_lists(cursor.fetchone()['total'])
+        cursor.execute(f"""
+            CREATE INDEX {VECTOR_INDEX_NAME} ON Product
+            USING ivfflat (embedding_vector {DISTANCE_OPCLASS})
+            WITH (lists = {lists});
+        """)
+        print(f"Đã tạo index ivfflat ({DISTANCE_OPCLASS}, lists={lists})")
+    else:
+        raise ValueError(f"Unknown index type: {index_type}")
+
+    cursor.execute("ANALYZE Product;")
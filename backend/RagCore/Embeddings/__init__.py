@@ -1 +1,3 @@
-from RagCore.Embeddings.embedding import GeminiEmbedding
\ No newline at end of file
+from RagCore.Embeddings.embedding import (EmbeddingProvider, GeminiEmbedding, LocalEmbedding, create_embedding_provider,
+                                          embedding_provider)
+from RagCore.Embeddings.embedding_cache import EmbeddingCache, embedding_cache
\ No newline at end of file
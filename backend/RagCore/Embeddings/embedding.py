@@ -1,20 +1,189 @@
 import os
+import threading
+from abc import ABC, abstractmethod
+from typing import Optional
 from google import genai
+from google.genai import types
 from dotenv import load_dotenv
+from RagCore.Embeddings.embedding_cache import EmbeddingCache, embedding_cache
 load_dotenv()
 
 GOOGLE_KEY = os.getenv("GEMINI_API_KEY")
+# "gemini": gọi Gemini embedding API; "local": sentence-transformers chạy trên CPU, không cần mạng
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "gemini")
+# Phải khớp với cột vector(N) do configuration_for_search tạo (Database đọc cùng biến này)
+EMBEDDING_DIMENSION = int(os.getenv("EMBEDDING_DIMENSION", "768"))
 
-class GeminiEmbedding:
-    def __init__(self, model_name='text-embedding-004'):
-        self.model_name = model_name
-        self.client = genai.Client(api_key=GOOGLE_KEY)
+# Số văn bản tối đa mỗi lần gọi provider (batchEmbedContents của Gemini nhận tối đa 100)
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "100"))
+
+LOCAL_EMBEDDING_MODEL = os.getenv("LOCAL_EMBEDDING_MODEL", "intfloat/multilingual-e5-small")
+LOCAL_EMBEDDING_BACKEND = os.getenv("LOCAL_EMBEDDING_BACKEND", "torch")   # "torch" hoặc "onnx" (cần optimum)
+LOCAL_EMBEDDING_DEVICE = os.getenv("LOCAL_EMBEDDING_DEVICE", "cpu")
+# Họ model e5 cần tiền tố khác nhau cho câu hỏi và văn bản; đặt rỗng với model không dùng tiền tố
+LOCAL_EMBEDDING_QUERY_PREFIX = os.getenv("LOCAL_EMBEDDING_QUERY_PREFIX", "query: ")
+LOCAL_EMBEDDING_DOCUMENT_PREFIX = os.getenv("LOCAL_EMBEDDING_DOCUMENT_PREFIX", "passage: ")
+
+
+class EmbeddingProvider(ABC):
+    """Giao diện chung cho các nguồn embedding dùng bởi tool tìm kiếm và lúc nạp dữ liệu sản phẩm.
+
+    Embedding của câu hỏi đi qua cache (theo model_name và số chiều, nên đổi provider không dùng nhầm vector cũ).
+    Embedding văn bản sản phẩm được chia thành các lô tối đa `max_batch_size` văn bản mỗi lần gọi.
+    """
+
+    name: str
+    model_name: str
+
+    def __init__(self, cache: Optional[EmbeddingCache] = embedding_cache, max_batch_size: int = EMBEDDING_BATCH_SIZE):
+        self.cache = cache
+        self.max_batch_size = max_batch_size
+
+    @property
+    @abstractmethod
+    def dimension(self) -> int:
+        """Số chiều của vector trả về."""
+
+    @abstractmethod
+    def _embed_query(self, text: str) -> list[float]:
+        ...
+
+    @abstractmethod
+    def _embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Embedding cho một lô văn bản sản phẩm, không quá `max_batch_size` văn bản."""
+
+    def get_embeddings(self, texts: list[str]) -> list[list[float]]:
+        """Embedding cho danh sách văn bản sản phẩm (dùng khi nạp catalog)."""
+        vectors = []
+        for offset in range(0, len(texts), self.max_batch_size):
+            vectors.extend(self._embed_documents(texts[offset:offset + self.max_batch_size]))
+        return vectors
 
     def get_embedding(self, text):
         if not text.strip():
             print("Attemp to embedding a empty text")
             return []
-        vector =  self.client.models.embed_content(model=self.model_name, contents=text)
-        
-        return vector.embeddings[0].values
+        if self.cache is not None:
+            vector = self.cache.get(self.model_name, text, self.dimension)
+            if vector is not None:
+                return vector
+
+        vector = self._embed_query(text)
+        if self.cache is not None:
+            self.cache.put(self.model_name, text, vector)
+
+        return vector
+
+    def get_stats(self) -> dict:
+        return {"provider": self.name, "model": self.model_name, "dimension": self.dimension}
+
+
+class GeminiEmbedding(EmbeddingProvider):
+    name = "gemini"
+
+    def __init__(self, model_name='text-embedding-004', dimension: int = EMBEDDING_DIMENSION,
+                 cache: Optional[EmbeddingCache] = embedding_cache):
+        super().__init__(cache)
+        self.model_name = model_name
+        self._dimension = dimension
+        self._client = None
+
+    @property
+    def client(self) -> genai.Client:
+        # Tạo client khi cần để có thể khởi tạo một instance dùng chung ngay lúc import
+        if self._client is None:
+            self._client = genai.Client(api_key=GOOGLE_KEY)
+        return self._client
+
+    @property
+    def dimension(self) -> int:
+        return self._dimension
+
+    def _embed(self, contents) -> list[list[float]]:
+        response = self.client.models.embed_content(
+            model=self.model_name,
+            contents=contents,
+            config=types.EmbedContentConfig(output_dimensionality=self._dimension),
+        )
+        return [embedding.values for embedding in response.embeddings]
+
+    def _embed_query(self, text: str) -> list[float]:
+        return self._embed(text)[0]
+
+    def _embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self._embed(texts)
+
+
+class LocalEmbedding(EmbeddingProvider):
+    """Embedding bằng sentence-transformers chạy ngay trong process (torch hoặc ONNX Runtime).
+
+    Không có round trip mạng: một câu hỏi ngắn mất vài ms trên CPU. Model được nạp lười biếng
+    một lần, có khoá để các request đồng thời không nạp trùng.
+    """
+
+    name = "local"
+
+    def __init__(self, model_name: str = LOCAL_EMBEDDING_MODEL, backend: str = LOCAL_EMBEDDING_BACKEND,
+                 device: str = LOCAL_EMBEDDING_DEVICE, dimension: int = EMBEDDING_DIMENSION,
+                 query_prefix: str = LOCAL_EMBEDDING_QUERY_PREFIX,
+                 document_prefix: str = LOCAL_EMBEDDING_DOCUMENT_PREFIX,
+                 cache: Optional[EmbeddingCache] = embedding_cache):
+        super().__init__(cache)
+        self.model_name = model_name
+        self.backend = backend
+        self.device = device
+        self.expected_dimension = dimension
+        self.query_prefix = query_prefix
+        self.document_prefix = document_prefix
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    try:
+                        from sentence_transformers import SentenceTransformer
+                    except ImportError as err:
+                        raise ImportError("Cần cài sentence-transformers để dùng EMBEDDING_PROVIDER=local: "
+                                          "pip install sentence-transformers") from err
+
+                    model = SentenceTransformer(self.model_name, device=self.device, backend=self.backend)
+                    dimension = model.get_sentence_embedding_dimension()
+                    if dimension != self.expected_dimension:
+                        raise ValueError(
+                            f"{self.model_name} trả về vector {dimension} chiều nhưng EMBEDDING_DIMENSION="
+                            f"{self.expected_dimension}; đặt EMBEDDING_DIMENSION={dimension}, chạy lại "
+                            f"configuration_for_search và tính lại embedding sản phẩm"
+                        )
+                    self._model = model
+        return self._model
+
+    @property
+    def dimension(self) -> int:
+        return self.expected_dimension
+
+    def _encode(self, texts: list[str]) -> list[list[float]]:
+        return self.model.encode(texts, normalize_embeddings=True, convert_to_numpy=True).tolist()
+
+    def _embed_query(self, text: str) -> list[float]:
+        return self._encode([self.query_prefix + text])[0]
+
+    def _embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self._encode([self.document_prefix + text for text in texts])
+
+    def get_stats(self) -> dict:
+        return {**super().get_stats(), "backend": self.backend, "loaded": self._model is not None}
+
+
+def create_embedding_provider(provider: str = EMBEDDING_PROVIDER) -> EmbeddingProvider:
+    if provider == "gemini":
+        return GeminiEmbedding()
+    if provider == "local":
+        return LocalEmbedding()
+    raise ValueError(f"Unknown EMBEDDING_PROVIDER: {provider}")
+
 
+# Instance dùng chung cho các tool, tránh tạo client/nạp model mới ở mỗi lần tìm kiếm
+embedding_provider = create_embedding_provider()
@@ -0,0 +1,185 @@
+import os
+import re
+import time
+import asyncio
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+import numpy as np
+from dotenv import load_dotenv
+load_dotenv()
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(".cache", "embedding_cache.sqlite3"))
+EMBEDDING_CACHE_MEMORY_SIZE = int(os.getenv("EMBEDDING_CACHE_MEMORY_SIZE", "1024"))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "100000"))
+
+
+def normalize_text(text: str) -> str:
+    """Chuẩn hoá truy vấn làm khoá cache: NFC (tiếng Việt có hai cách mã hoá dấu), chữ thường, gộp khoảng trắng."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip().lower()
+
+
+class EmbeddingCache:
+    """Cache embedding hai tầng theo khoá (model, số chiều, text đã chuẩn hoá).
+
+    Tầng 1 là LRU trong bộ nhớ, tầng 2 là file sqlite lưu vector float32 dạng BLOB nên vẫn còn
+    sau khi khởi động lại. Khi số bản ghi trên đĩa vượt `max_entries`, các bản ghi lâu không
+    dùng nhất bị xoá. `aget` / `aput` chỉ đọc tầng bộ nhớ trên event loop, còn tầng sqlite
+    chạy trong thread pool.
+    """
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, memory_size: int = EMBEDDING_CACHE_MEMORY_SIZE,
+                 max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.memory_size = memory_size
+        self.max_entries = max_entries
+        self._memory: OrderedDict = OrderedDict()
+        # Hai lock riêng để event loop không phải chờ một lần đọc/ghi sqlite đang chạy trong thread khác
+        self._memory_lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._disk_entries = 0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(embedding)")}
+            if columns and "dimension" not in columns:
+                # File cache cũ có khoá không gồm số chiều: bỏ đi và tính lại dần
+                self._conn.execute("DROP TABLE embedding")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS embedding (
+                    model TEXT NOT NULL,
+                    dimension INTEGER NOT NULL,
+                    text TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (model, dimension, text)
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embedding_last_access ON embedding(last_access)")
+            self._disk_entries = self._conn.execute("SELECT count(*) FROM embedding").fetchone()[0]
+        return self._conn
+
+    @staticmethod
+    def _key(model: str, dimension: int, text: str) -> tuple:
+        return (model, dimension, normalize_text(text))
+
+    def _remember(self, key: tuple, vector: list[float]):
+        with self._memory_lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def _get_memory(self, key: tuple) -> Optional[list[float]]:
+        with self._memory_lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+            return vector
+
+    def _get_disk(self, key: tuple) -> Optional[list[float]]:
+        with self._disk_lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT vector FROM embedding WHERE model = ? AND dimension = ? AND text = ?", key
+            ).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+
+            conn.execute("UPDATE embedding SET last_access = ? WHERE model = ? AND dimension = ? AND text = ?",
+                         (time.time(), *key))
+            conn.commit()
+            self.stats["disk_hits"] += 1
+        vector = np.frombuffer(row[0], dtype=np.float32).tolist()
+        self._remember(key, vector)
+        return vector
+
+    def _put_disk(self, key: tuple, vector: list[float]):
+        blob = np.asarray(vector, dtype=np.float32).tobytes()
+        with self._disk_lock:
+            conn = self._connect()
+            cursor = conn.execute(
+                "INSERT OR REPLACE INTO embedding (model, dimension, text, vector, last_access) VALUES (?, ?, ?, ?, ?)",
+                (*key, blob, time.time()),
+            )
+            self._disk_entries += cursor.rowcount
+            if self._disk_entries > self.max_entries:
+                self._evict(conn)
+            conn.commit()
+
+    def get(self, model: str, text: str, dimension: int) -> Optional[list[float]]:
+        key = self._key(model, dimension, text)
+        vector = self._get_memory(key)
+        if vector is not None:
+            return vector
+        return self._get_disk(key)
+
+    def put(self, model: str, text: str, vector: list[float]):
+        if not vector:
+            return
+        key = self._key(model, len(vector), text)
+        self._remember(key, list(vector))
+        self._put_disk(key, vector)
+
+    async def aget(self, model: str, text: str, dimension: int) -> Optional[list[float]]:
+        key = self._key(model, dimension, text)
+        vector = self._get_memory(key)
+        if vector is not None:
+            return vector
+        return await asyncio.to_thread(self._get_disk, key)
+
+    async def aput(self, model: str, text: str, vector: list[float]):
+        if not vector:
+            return
+        key = self._key(model, len(vector), text)
+        self._remember(key, list(vector))
+        await asyncio.to_thread(self._put_disk, key, vector)
+
+    def _evict(self, conn: sqlite3.Connection):
+        # INSERT OR REPLACE cũng đếm là một dòng mới, lấy lại số chính xác trước khi xoá
+        self._disk_entries = conn.execute("SELECT count(*) FROM embedding").fetchone()[0]
+        # Xoá bớt 10% để không phải dọn dẹp sau mỗi lần ghi
+        overflow = self._disk_entries - int(self.max_entries * 0.9)
+        if overflow <= 0:
+            return
+        conn.execute("""
+            DELETE FROM embedding WHERE rowid IN (
+                SELECT rowid FROM embedding ORDER BY last_access LIMIT ?
+            )
+        """, (overflow,))
+        self._disk_entries -= overflow
+        self.stats["evictions"] += overflow
+
+    def get_stats(self) -> dict:
+        lookups = self.stats["memory_hits"] + self.stats["disk_hits"] + self.stats["misses"]
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        return {
+            **self.stats,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "disk_entries": self._disk_entries,
+        }
+
+    def clear(self):
+        with self._memory_lock:
+            self._memory.clear()
+        with self._disk_lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM embedding")
+            conn.commit()
+            self._disk_entries = 0
+
+
+# Dùng chung cho toàn bộ process
+embedding_cache = EmbeddingCache()
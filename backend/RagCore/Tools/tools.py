@@ -2,7 +2,7 @@ from typing import Optional, Dict
 from decimal import Decimal
 from Database.product_services import check_product_stock, update_product_stock, get_product_by_name, hybrid_search
 from Database.orders_services import create_new_order
-from RagCore.Embeddings import GeminiEmbedding
+from RagCore.Embeddings import embedding_provider
 
 
 def related_products_search(keyword: str) -> str:
@@ -14,9 +14,8 @@ def related_products_search(keyword: str) -> str:
     Returns:
         str: Danh sách thông tin sản phẩm nếu tìm thấy.
     """
-    embedding = GeminiEmbedding()
     print(keyword)
-    query_vector = embedding.get_embedding(keyword)
+    query_vector = embedding_provider.get_embedding(keyword)
     # related_products = get_related_product_by_vector(query_vector)
     related_products = hybrid_search(keyword, query_vector)
     
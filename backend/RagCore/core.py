@@ -1,5 +1,6 @@
 from RagCore.Tools.tools import related_products_search, product_search, create_order
-from Database.chat_history_services import get_chat_history, format_chat_history, save_message
+from Database.chat_history_services import get_chat_history, format_chat_history
+from Database.chat_history_writer import chat_history_writer
 import json
 from typing import AsyncGenerator
 from google import genai
@@ -11,10 +12,16 @@ class RagAgent():
         self.model_name = model_name
         self.client = client
         self.tools = [related_products_search, product_search, create_order]
+
+    def load_chat_history(self, thread_id: str, limit: int=20) -> list:
+        # Gộp cả các tin nhắn còn nằm trong hàng đợi ghi, chưa xuống tới DB
+        pending = chat_history_writer.pending_messages(thread_id)
+        history = pending + (get_chat_history(thread_id=thread_id, limit=limit) or [])
+        return format_chat_history(history[:limit])
     
     def get_answer(self, query: str, thread_id: str) -> str:
 
-        chat_history = format_chat_history(get_chat_history(thread_id=thread_id))
+        chat_history = self.load_chat_history(thread_id)
         chat_history.append(genai.types.Content(role="user", parts=[genai.types.Part(text=query)]))
 
         response = self.client.models.generate_content(
@@ -36,7 +43,7 @@ class RagAgent():
         model_function_call_str = None
         model_function_response_str = None
 
-        chat_history = format_chat_history(get_chat_history(thread_id=thread_id))
+        chat_history = self.load_chat_history(thread_id)
         # print(chat_history)
         chat_history.append(genai.types.Content(role="user", parts=[genai.types.Part(text=query)]))
 
@@ -74,4 +81,5 @@ class RagAgent():
             # print(model_function_call_str)
             # print("-" * 100)
             # print(model_function_response_str)
-            save_message(thread_id, query, full_response, model_function_call_str, model_function_response_str)
+            # Ghi nền theo lô, không chặn response
+            await chat_history_writer.enqueue(thread_id, query, full_response, model_function_call_str, model_function_response_str)
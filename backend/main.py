@@ -1,9 +1,22 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from API import cart_router, chat_router
+from API import cart_router, chat_router, health_router
+from Database.db_connection import open_db_pool, close_db_pool
+from Database.chat_history_writer import chat_history_writer
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    open_db_pool()
+    await chat_history_writer.start()
+    yield
+    # Ghi nốt lịch sử trò chuyện còn trong hàng đợi trước khi đóng pool
+    await chat_history_writer.stop()
+    close_db_pool()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -15,3 +28,4 @@ app.add_middleware(
 
 app.include_router(cart_router, tags=["Cart"], prefix="/api")
 app.include_router(chat_router, tags=["Chat"], prefix="/api")
+app.include_router(health_router, tags=["Health"], prefix="/api")
@@ -0,0 +1,148 @@
+"""So sánh bộ trích từ khoá cục bộ với generates_keyword (Gemini): độ trễ và chất lượng truy hồi.
+
+Với mỗi câu hỏi trong bộ mẫu, mỗi chế độ sinh (vector_search_query, fts_keyword) rồi chạy full-text
+search và hybrid search trên bảng Product hiện tại. Sản phẩm liên quan được xác định theo tên /
+tác giả / thể loại (khớp chuỗi con, không phân biệt hoa thường) nên bộ mẫu dùng được với catalog
+db_helper/data/embedding_data.csv; câu hỏi không có sản phẩm liên quan trong DB bị bỏ qua.
+
+Chạy từ thư mục backend_v2 (chế độ llm cần GEMINI_API_KEY):
+
+    PYTHONPATH=src python scripts/bench_keyword_extractor.py
+    PYTHONPATH=src python scripts/bench_keyword_extractor.py --modes local --k 10
+"""
+import time
+import asyncio
+import argparse
+import statistics
+import unicodedata
+
+from agent.llm_registry import llm_registry
+from agent.sub_graph.rag_agent.embedding import embedding_provider
+from agent.sub_graph.rag_agent.graph import KeywordResponse
+from agent.sub_graph.rag_agent.keyword_extractor import keyword_extractor
+from agent.sub_graph.rag_agent.prompt import GENERATE_QUERY_SYSTEM_PROMPT
+from db_helper.db_connection import close_db_pool, get_async_db_connection, open_db_pool
+from db_helper.product_services import aget_related_product_by_word, ahybrid_search
+
+# (câu hỏi, trường, chuỗi con xác định sản phẩm liên quan)
+QUERIES = [
+    ("Shop có truyện trinh thám nào hay không?", "category", "trinh thám"),
+    ("cho mình tìm sách detective", "category", "trinh thám"),
+    ("Có sách của tác giả Colleen Hoover không?", "author", "colleen hoover"),
+    ("Mình muốn mua cuốn Cây Cam Ngọt Của Tôi", "name", "cây cam ngọt"),
+    ("có Nhà Giả Kim không shop?", "name", "nhà giả kim"),
+    ("sách của Higashino Keigo", "author", "higashino"),
+    ("gợi ý tiểu thuyết kinh dị rùng rợn", "name", "kinh dị"),
+    ("tản văn Việt Nam nhẹ nhàng", "category", "tạp văn việt nam"),
+    ("sách của Hae Min giá bao nhiêu", "author", "hae min"),
+    ("tiểu thuyết phương Tây nổi tiếng", "category", "tiểu thuyết phương tây"),
+    ("shop còn hàng Rừng Nauy không", "name", "rừng nauy"),
+    ("truyện đam mỹ hay nhất", "category", "đam mỹ"),
+    ("có light novel nào không", "category", "light novel"),
+    ("tìm sách hồi ký, tiểu sử", "category", "hồi ký"),
+    ("sách của Stephen King", "author", "stephen king"),
+    ("Kafka bên bờ biển của Murakami", "name", "kafka bên bờ biển"),
+]
+
+
+def _fold(text) -> str:
+    return unicodedata.normalize("NFC", text or "").lower()
+
+
+async def load_relevance() -> dict[str, set[int]]:
+    async with get_async_db_connection() as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute("SELECT id, name, author, category FROM Product;")
+            products = await cursor.fetchall()
+    return {
+        query: {p["id"] for p in products if needle in _fold(p[field])}
+        for query, field, needle in QUERIES
+    }
+
+
+async def llm_keywords(user_query: str) -> dict:
+    messages = [
+        {"role": "system", "content": GENERATE_QUERY_SYSTEM_PROMPT},
+        {"role": "human", "content": user_query},
+    ]
+    return await llm_registry.get_structured_model(KeywordResponse).ainvoke(messages)
+
+
+async def local_keywords(user_query: str) -> dict:
+    return keyword_extractor.extract(user_query)
+
+
+def _recall_and_rr(ids: list[int], relevant: set[int], k: int) -> tuple[float, float]:
+    top = ids[:k]
+    recall = len(relevant.intersection(top)) / min(len(relevant), k)
+    rank = next((i for i, product_id in enumerate(top, start=1) if product_id in relevant), None)
+    return recall, 1 / rank if rank else 0.0
+
+
+async def run_mode(mode: str, extract, relevance: dict[str, set[int]], k: int, hybrid: bool) -> dict:
+    latencies, fts_recall, fts_rr, hybrid_recall, hybrid_rr = [], [], [], [], []
+    for query, _, _ in QUERIES:
+        relevant = relevance[query]
+        if not relevant:
+            continue
+        start = time.perf_counter()
+        keywords = await extract(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+        print(f"  [{mode}] {query!r} -> fts={keywords['fts_keyword']!r}")
+
+        rows = await aget_related_product_by_word(keywords["fts_keyword"], k=k) or []
+        recall, rr = _recall_and_rr([row["id"] for row in rows], relevant, k)
+        fts_recall.append(recall)
+        fts_rr.append(rr)
+
+        if hybrid:
+            query_vector = await embedding_provider.aget_embedding(keywords["vector_search_query"])
+            rows = await ahybrid_search(keywords["fts_keyword"], query_vector, k=k) or []
+            recall, rr = _recall_and_rr([row["id"] for row in rows], relevant, k)
+            hybrid_recall.append(recall)
+            hybrid_rr.append(rr)
+
+    result = {
+        "queries": len(latencies),
+        "p50_ms": statistics.median(latencies),
+        "max_ms": max(latencies),
+        "fts_recall": statistics.mean(fts_recall),
+        "fts_mrr": statistics.mean(fts_rr),
+    }
+    if hybrid:
+        result["hybrid_recall"] = statistics.mean(hybrid_recall)
+        result["hybrid_mrr"] = statistics.mean(hybrid_rr)
+    return result
+
+
+async def main(args):
+    await open_db_pool()
+    try:
+        relevance = await load_relevance()
+        extractors = {"local": local_keywords, "llm": llm_keywords}
+        results = {}
+        for mode in args.modes.split(","):
+            try:
+                results[mode] = await run_mode(mode, extractors[mode], relevance, args.k, not args.fts_only)
+            except Exception as e:
+                print(f"Bỏ qua chế độ {mode} ({type(e).__name__}): {e}")
+    finally:
+        await close_db_pool()
+
+    columns = ["queries", "p50_ms", "max_ms", "fts_recall", "fts_mrr"]
+    if not args.fts_only:
+        columns += ["hybrid_recall", "hybrid_mrr"]
+    print(f"\n{'mode':<8}" + "".join(f"{column:>15}" for column in columns))
+    for mode, result in results.items():
+        print(f"{mode:<8}" + "".join(
+            f"{result[column]:>15}" if column == "queries" else f"{result[column]:>15.3f}" for column in columns
+        ))
+    print(f"\nrecall@{args.k} / MRR@{args.k} trên các câu hỏi có sản phẩm liên quan trong DB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark bộ trích từ khoá cục bộ so với LLM")
+    parser.add_argument("--modes", default="local,llm", help="các chế độ cần đo, cách nhau bởi dấu phẩy")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--fts-only", action="store_true", help="chỉ đo full-text search (không cần embedding)")
+    asyncio.run(main(parser.parse_args()))
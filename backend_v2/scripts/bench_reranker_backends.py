@@ -0,0 +1,144 @@
+"""Benchmark các backend reranker: độ trễ, bộ nhớ (peak RSS) và độ khớp thứ hạng so với backend tham chiếu.
+
+Mỗi backend chạy trong một process riêng để số đo RSS không lẫn vào nhau. Backend đầu tiên trong
+`--backends` là tham chiếu khi so thứ hạng.
+
+Chạy từ thư mục backend_v2 (backend onnx cần chạy scripts/export_reranker_onnx.py trước):
+
+    PYTHONPATH=src python scripts/bench_reranker_backends.py
+    PYTHONPATH=src python scripts/bench_reranker_backends.py --backends torch,onnx --repeat 20
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import statistics
+import subprocess
+import importlib.util
+
+import numpy as np
+
+# Bộ truy vấn cố định: mỗi truy vấn đi kèm cùng một danh sách ứng viên
+QUERIES = [
+    "sách về mèo cho thiếu nhi",
+    "tiểu thuyết trinh thám hấp dẫn",
+    "sách dạy nấu ăn món Việt",
+    "kỹ năng giao tiếp và đối nhân xử thế",
+    "lịch sử Việt Nam thời phong kiến",
+    "truyện tranh phiêu lưu hài hước",
+    "sách học lập trình Python cho người mới",
+    "tản văn nhẹ nhàng về Hà Nội",
+]
+
+DOCUMENTS = [
+    "Tên: Chuyện con mèo dạy hải âu bay\nTác giả: Luis Sepúlveda\nThể loại: Thiếu nhi\nMô tả: Câu chuyện cảm động về chú mèo mun Zorba giữ lời hứa nuôi nấng và dạy một chú hải âu con biết bay.",
+    "Tên: Đắc nhân tâm\nTác giả: Dale Carnegie\nThể loại: Kỹ năng sống\nMô tả: Nghệ thuật thu phục lòng người, những nguyên tắc giao tiếp và ứng xử giúp bạn thành công trong công việc và cuộc sống.",
+    "Tên: Phía sau nghi can X\nTác giả: Higashino Keigo\nThể loại: Trinh thám\nMô tả: Một vụ án mạng được che giấu bằng kế hoạch hoàn hảo của thiên tài toán học, cuộc đấu trí căng thẳng với nhà vật lý.",
+    "Tên: Món ngon Việt Nam\nTác giả: Nhiều tác giả\nThể loại: Ẩm thực\nMô tả: Hướng dẫn chi tiết cách nấu phở, bún chả, canh chua và hàng trăm món ăn truyền thống ba miền.",
+    "Tên: Đại Việt sử ký toàn thư\nTác giả: Ngô Sĩ Liên\nThể loại: Lịch sử\nMô tả: Bộ quốc sử ghi chép lịch sử Việt Nam từ thời Hồng Bàng đến thời Lê.",
+    "Tên: Doraemon\nTác giả: Fujiko F. Fujio\nThể loại: Truyện tranh\nMô tả: Chú mèo máy đến từ tương lai cùng Nobita trải qua những chuyến phiêu lưu hài hước.",
+    "Tên: Python cơ bản\nTác giả: Nhiều tác giả\nThể loại: Công nghệ thông tin\nMô tả: Giáo trình lập trình Python từ con số không: biến, vòng lặp, hàm, lập trình hướng đối tượng.",
+    "Tên: Hà Nội băm sáu phố phường\nTác giả: Thạch Lam\nThể loại: Tản văn\nMô tả: Những trang viết tinh tế về quà Hà Nội, phố phường và nếp sống thanh lịch của người Tràng An.",
+    "Tên: Mèo chiến binh\nTác giả: Erin Hunter\nThể loại: Thiếu nhi\nMô tả: Chú mèo nhà Rusty rời bỏ cuộc sống êm ấm để gia nhập Tộc Sấm Sét trong khu rừng hoang dã.",
+    "Tên: Sherlock Holmes toàn tập\nTác giả: Arthur Conan Doyle\nThể loại: Trinh thám\nMô tả: Những vụ án ly kỳ được phá giải bằng tài suy luận của thám tử lừng danh phố Baker.",
+]
+
+
+def _load_backends_module():
+    # Nạp trực tiếp file để không kéo theo agent/__init__ (graph, LLM client, checkpointer...)
+    path = os.path.join(os.path.dirname(__file__), "..", "src", "agent", "sub_graph", "rag_agent", "rerank_backends.py")
+    spec = importlib.util.spec_from_file_location("rerank_backends", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss tính bằng KB trên Linux, byte trên macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2**20 if sys.platform == "darwin" else rss / 2**10
+
+
+def run_worker(backend_name: str, model: str, max_length: int, repeat: int) -> dict:
+    rerank_backends = _load_backends_module()
+    baseline_rss = peak_rss_mb()
+
+    backend = rerank_backends.create_backend(backend_name, model, max_length=max_length)
+    start = time.perf_counter()
+    backend.load()
+    load_seconds = time.perf_counter() - start
+
+    scores = []
+    latencies = []
+    for query in QUERIES:
+        backend.predict([query] * len(DOCUMENTS), DOCUMENTS)      # warmup
+        for _ in range(repeat):
+            start = time.perf_counter()
+            query_scores = backend.predict([query] * len(DOCUMENTS), DOCUMENTS)
+            latencies.append((time.perf_counter() - start) * 1000)
+        scores.append(np.asarray(query_scores, dtype=np.float32).tolist())
+
+    latencies.sort()
+    return {
+        "backend": backend_name,
+        "load_seconds": load_seconds,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+        "baseline_rss_mb": baseline_rss,
+        "peak_rss_mb": peak_rss_mb(),
+        "scores": scores,
+    }
+
+
+def _ranks(values: np.ndarray) -> np.ndarray:
+    ranks = np.empty(len(values))
+    ranks[np.argsort(-values)] = np.arange(len(values))
+    return ranks
+
+
+def agreement(reference: list, candidate: list, k: int = 5) -> dict:
+    top1, overlap, spearman = [], [], []
+    for ref, cand in zip(reference, candidate):
+        ref, cand = np.asarray(ref), np.asarray(cand)
+        top1.append(int(np.argmax(ref) == np.argmax(cand)))
+        overlap.append(len(set(np.argsort(-ref)[:k]) & set(np.argsort(-cand)[:k])) / k)
+        spearman.append(float(np.corrcoef(_ranks(ref), _ranks(cand))[0, 1]))
+    return {
+        "top1_agreement": float(np.mean(top1)),
+        f"top{k}_overlap": float(np.mean(overlap)),
+        "spearman": float(np.mean(spearman)),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default="torch,onnx", help="danh sách backend, cái đầu tiên làm tham chiếu")
+    parser.add_argument("--model", default=os.getenv("RERANK_MODEL", "mixedbread-ai/mxbai-rerank-base-v2"))
+    parser.add_argument("--max-length", type=int, default=int(os.getenv("RERANK_MAX_LENGTH", "512")))
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.model, args.max_length, args.repeat)))
+        sys.exit(0)
+
+    results = []
+    for backend in args.backends.split(","):
+        output = subprocess.run(
+            [sys.executable, __file__, "--worker", backend, "--model", args.model,
+             "--max-length", str(args.max_length), "--repeat", str(args.repeat)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    reference = results[0]
+    print(f"{len(QUERIES)} truy vấn x {len(DOCUMENTS)} ứng viên, {args.repeat} lần/truy vấn, tham chiếu: {reference['backend']}")
+    print(f"{'backend':<8} {'load s':>7} {'p50 ms':>8} {'p95 ms':>8} {'RSS MB':>8} {'top1':>6} {'top5':>6} {'spearman':>9}")
+    for result in results:
+        agree = agreement(reference["scores"], result["scores"])
+        print(f"{result['backend']:<8} {result['load_seconds']:>7.1f} {result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} "
+              f"{result['peak_rss_mb'] - result['baseline_rss_mb']:>8.0f} {agree['top1_agreement']:>6.2f} "
+              f"{agree['top5_overlap']:>6.2f} {agree['spearman']:>9.3f}")
@@ -0,0 +1,68 @@
+"""Microbenchmark: chi phí gửi embedding 768 chiều dạng chuỗi (str(list)) so với binary (pgvector adapter).
+
+Chạy từ thư mục backend_v2:
+
+    PYTHONPATH=src python scripts/bench_vector_serialization.py            # chỉ đo phía client
+    PYTHONPATH=src python scripts/bench_vector_serialization.py --db       # đo thêm round trip tới Postgres
+"""
+import argparse
+import random
+import statistics
+import time
+
+import numpy as np
+from pgvector import Vector
+
+
+def bench(fn, repeat: int) -> float:
+    """Trả về thời gian trung vị (micro giây) của một lần gọi `fn`."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(samples)
+
+
+def client_side(dim: int, repeat: int):
+    values = [random.uniform(-1, 1) for _ in range(dim)]
+
+    text_payload = str(values).encode("utf8")
+    binary_payload = Vector(np.asarray(values, dtype=np.float32)).to_binary()
+
+    text_us = bench(lambda: str(values).encode("utf8"), repeat)
+    binary_us = bench(lambda: Vector(np.asarray(values, dtype=np.float32)).to_binary(), repeat)
+
+    print(f"[client] dim={dim}")
+    print(f"  text   : {len(text_payload):>6} bytes, {text_us:8.1f} us/serialize")
+    print(f"  binary : {len(binary_payload):>6} bytes, {binary_us:8.1f} us/serialize")
+
+
+def round_trip(dim: int, repeat: int):
+    from db_helper.db_connection import get_db_connection, pool
+
+    values = [random.uniform(-1, 1) for _ in range(dim)]
+    query = f"SELECT %{{}}::vector({dim}) <=> %{{}}::vector({dim}) AS distance;"
+
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            text_us = bench(lambda: cursor.execute(query.format("s", "s"), (str(values), str(values))).fetchone(), repeat)
+            vector = np.asarray(values, dtype=np.float32)
+            binary_us = bench(lambda: cursor.execute(query.format("b", "b"), (vector, vector)).fetchone(), repeat)
+
+    print(f"[round trip] dim={dim}, 2 vectors/query")
+    print(f"  text   : {text_us:8.1f} us/query")
+    print(f"  binary : {binary_us:8.1f} us/query")
+    pool.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--db", action="store_true", help="đo thêm round trip tới Postgres")
+    args = parser.parse_args()
+
+    client_side(args.dim, args.repeat)
+    if args.db:
+        round_trip(args.dim, args.repeat)
@@ -0,0 +1,106 @@
+"""Xuất reranker mxbai-rerank-v2 sang ONNX và lượng tử hoá int8 (dynamic quantization) cho CPU.
+
+Đồ thị xuất ra nhận `input_ids`, `attention_mask` (đã left padding bởi tokenizer) và trả về `logits`
+= logit("1") - logit("0") ở token cuối, đúng như MxbaiRerankV2.forward. Thay vì tính lm_head trên toàn
+bộ vocab, đồ thị chỉ nhân hidden state cuối với hiệu hai hàng "1"/"0" của lm_head.
+
+Chạy từ thư mục backend_v2 (cần: pip install onnx onnxruntime):
+
+    PYTHONPATH=src python scripts/export_reranker_onnx.py
+    PYTHONPATH=src python scripts/export_reranker_onnx.py --model mixedbread-ai/mxbai-rerank-large-v2 --output models/large-onnx
+
+Sau đó đặt RERANK_BACKEND=onnx và RERANK_ONNX_PATH=<thư mục output>.
+"""
+import os
+import time
+import argparse
+
+import numpy as np
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer
+
+
+class YesNoLogit(torch.nn.Module):
+    """Decoder của model + hiệu hai hàng "1"/"0" của lm_head, thay cho lm_head đầy đủ."""
+
+    def __init__(self, model, yes_id: int, no_id: int):
+        super().__init__()
+        self.decoder = model.get_decoder()
+        lm_head = model.get_output_embeddings()
+        self.register_buffer("direction", (lm_head.weight[yes_id] - lm_head.weight[no_id]).detach().clone())
+        bias = getattr(lm_head, "bias", None)
+        self.register_buffer("bias", (bias[yes_id] - bias[no_id]).detach().clone() if bias is not None
+                             else torch.zeros((), dtype=self.direction.dtype))
+
+    def forward(self, input_ids, attention_mask):
+        hidden = self.decoder(input_ids=input_ids, attention_mask=attention_mask, use_cache=False).last_hidden_state
+        # Left padding: vị trí cuối luôn là token thật. Dùng nhân + tổng thay cho MatMul để phép chiếu
+        # cuối giữ nguyên float32 (quantize_dynamic chỉ lượng tử hoá MatMul/Gemm của decoder)
+        return (hidden[:, -1] * self.direction).sum(-1) + self.bias
+
+
+def export(model_name: str, output: str, opset: int, quantize: bool):
+    os.makedirs(output, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name, padding_side="left")
+    model = AutoModelForCausalLM.from_pretrained(model_name, torch_dtype=torch.float32).eval()
+
+    yes_id = tokenizer("1", add_special_tokens=False)["input_ids"][0]
+    no_id = tokenizer("0", add_special_tokens=False)["input_ids"][0]
+    wrapper = YesNoLogit(model, yes_id, no_id).eval()
+
+    sample = tokenizer(["query: sách về mèo\ndocument: Chuyện con mèo dạy hải âu bay",
+                        "query: sách nấu ăn\ndocument: Đắc nhân tâm"], padding=True, return_tensors="pt")
+    inputs = (sample["input_ids"], sample["attention_mask"])
+
+    fp32_path = os.path.join(output, "model.onnx")
+    start = time.perf_counter()
+    with torch.no_grad():
+        torch.onnx.export(
+            wrapper, inputs, fp32_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["logits"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "logits": {0: "batch"},
+            },
+            opset_version=opset,
+            dynamo=False,
+        )
+        reference = wrapper(*inputs).numpy()
+    print(f"Đã xuất {fp32_path} ({time.perf_counter() - start:.1f}s)")
+
+    tokenizer.save_pretrained(output)
+    model.config.save_pretrained(output)
+
+    paths = [fp32_path]
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        int8_path = os.path.join(output, "model.int8.onnx")
+        start = time.perf_counter()
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8, per_channel=True)
+        print(f"Đã lượng tử hoá {int8_path} ({time.perf_counter() - start:.1f}s)")
+        paths.append(int8_path)
+
+    # Kiểm tra nhanh: điểm ONNX so với PyTorch trên cùng input
+    import onnxruntime as ort
+
+    feeds = {"input_ids": inputs[0].numpy(), "attention_mask": inputs[1].numpy()}
+    for path in paths:
+        session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+        (scores,) = session.run(["logits"], feeds)
+        size_mb = sum(os.path.getsize(os.path.join(output, f)) for f in os.listdir(output)
+                      if f.startswith(os.path.basename(path))) / 2**20
+        print(f"  {os.path.basename(path)}: {size_mb:,.0f} MB, max |onnx - torch| = {np.abs(scores - reference).max():.4f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=os.getenv("RERANK_MODEL", "mixedbread-ai/mxbai-rerank-base-v2"))
+    parser.add_argument("--output", default=os.getenv("RERANK_ONNX_PATH", os.path.join("models", "mxbai-rerank-base-v2-onnx")))
+    parser.add_argument("--opset", type=int, default=17)
+    parser.add_argument("--no-quantize", action="store_true", help="chỉ xuất bản float32")
+    args = parser.parse_args()
+
+    export(args.model, args.output, args.opset, not args.no_quantize)
@@ -0,0 +1,107 @@
+"""Huấn luyện và đánh giá bộ phân loại ý định cục bộ (luật từ khoá + nearest centroid) đặt trước LLM router.
+
+`train` embed các câu mẫu bằng EMBEDDING_PROVIDER hiện tại và lưu centroid của từng nhãn vào
+INTENT_MODEL_PATH. `eval` đánh giá leave-one-out trên chính các câu mẫu (centroid của nhãn được tính
+lại không có câu đang xét) và in tỉ lệ câu bỏ qua được LLM cùng độ chính xác ở nhiều ngưỡng, để chọn
+INTENT_MIN_SIMILARITY / INTENT_MIN_MARGIN. Với provider từ xa (Gemini), lúc chạy thật tầng centroid chỉ
+dùng embedding đã có trong cache nên tỉ lệ bỏ qua LLM thực tế thấp hơn số in ra.
+
+Chạy từ thư mục backend_v2:
+
+    PYTHONPATH=src python scripts/train_intent_classifier.py train
+    PYTHONPATH=src python scripts/train_intent_classifier.py eval --examples my_labelled_turns.jsonl
+
+File mẫu là JSONL, mỗi dòng {"text": ..., "label": "order" | "product_infomation" | "chitchat"}.
+"""
+import argparse
+import itertools
+
+import numpy as np
+
+from agent.intent_classifier import (INTENT_EXAMPLES_PATH, INTENT_MIN_MARGIN, INTENT_MIN_SIMILARITY,
+                                     INTENT_MODEL_PATH, IntentClassifier, load_examples, match_rules)
+from agent.sub_graph.rag_agent.embedding import embedding_provider
+
+
+def train(args):
+    texts, labels = load_examples(args.examples)
+    classifier = IntentClassifier(embedding_provider, model_path=args.output)
+    classifier.fit(texts, labels)
+    classifier.save()
+    counts = {label: labels.count(label) for label in classifier.labels}
+    print(f"Đã lưu {len(classifier.labels)} centroid ({embedding_provider.model_name}, {counts}) vào {args.output}")
+
+
+def leave_one_out_scores(vectors: np.ndarray, labels: list[str]) -> tuple[list[str], np.ndarray]:
+    """Similarity của mỗi câu tới centroid từng nhãn, centroid nhãn của chính nó tính không có câu đó."""
+    label_names = sorted(set(labels))
+    label_array = np.asarray(labels)
+    sums = np.stack([vectors[label_array == label].sum(axis=0) for label in label_names])
+    counts = np.asarray([(label_array == label).sum() for label in label_names], dtype=np.float32)
+
+    scores = np.empty((len(labels), len(label_names)), dtype=np.float32)
+    for i, label in enumerate(labels):
+        own = label_names.index(label)
+        centroid_sums = sums.copy()
+        centroid_sums[own] -= vectors[i]
+        centroid_counts = counts.copy()
+        centroid_counts[own] -= 1
+        centroids = centroid_sums / np.maximum(centroid_counts, 1)[:, None]
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+        scores[i] = centroids @ vectors[i]
+    return label_names, scores
+
+
+def evaluate(args):
+    texts, labels = load_examples(args.examples)
+    classifier = IntentClassifier(embedding_provider)
+    vectors = classifier.fit(texts, labels)
+    label_names, scores = leave_one_out_scores(vectors, labels)
+
+    rule_labels = [match_rules(text) for text in texts]
+    rule_hits = [i for i, label in enumerate(rule_labels) if label is not None]
+    rule_correct = sum(rule_labels[i] == labels[i] for i in rule_hits)
+    print(f"{len(texts)} câu mẫu, model {embedding_provider.model_name}")
+    print(f"Luật từ khoá: phủ {len(rule_hits)}/{len(texts)}, đúng {rule_correct}/{len(rule_hits)}")
+    if embedding_provider.name != "local":
+        print(f"Lưu ý: EMBEDDING_PROVIDER={embedding_provider.name} gọi API từ xa, lúc chạy tầng centroid chỉ dùng "
+              f"embedding đã có trong cache (còn lại đi thẳng tới LLM router), nên tỉ lệ bỏ qua LLM dưới đây "
+              f"là giới hạn trên; dùng EMBEDDING_PROVIDER=local để đạt đúng tỉ lệ này")
+    for i in rule_hits:
+        if rule_labels[i] != labels[i]:
+            print(f"  SAI luật: {texts[i]!r} -> {rule_labels[i]} (đúng: {labels[i]})")
+
+    ranked = np.sort(scores, axis=1)[:, ::-1]
+    best, margin = ranked[:, 0], ranked[:, 0] - ranked[:, 1]
+    predicted = [label_names[j] for j in scores.argmax(axis=1)]
+    rest = [i for i in range(len(texts)) if rule_labels[i] is None]
+
+    print(f"\n{'min_sim':>8} {'margin':>7} {'bỏ qua LLM':>11} {'độ chính xác':>13}")
+    for min_similarity, min_margin in itertools.product(args.similarities, args.margins):
+        covered = [i for i in rest if best[i] >= min_similarity and margin[i] >= min_margin]
+        correct = rule_correct + sum(predicted[i] == labels[i] for i in covered)
+        skipped = len(rule_hits) + len(covered)
+        marker = "  <- hiện tại" if (min_similarity, min_margin) == (INTENT_MIN_SIMILARITY, INTENT_MIN_MARGIN) else ""
+        print(f"{min_similarity:>8.2f} {min_margin:>7.2f} {skipped / len(texts):>10.0%} "
+              f"{correct / skipped if skipped else 0:>12.1%}{marker}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Huấn luyện / đánh giá bộ phân loại ý định cục bộ")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    train_parser = subparsers.add_parser("train", help="tính centroid và lưu vào INTENT_MODEL_PATH")
+    train_parser.add_argument("--examples", default=INTENT_EXAMPLES_PATH)
+    train_parser.add_argument("--output", default=INTENT_MODEL_PATH)
+    train_parser.set_defaults(func=train)
+
+    eval_parser = subparsers.add_parser("eval", help="đánh giá leave-one-out ở nhiều ngưỡng")
+    eval_parser.add_argument("--examples", default=INTENT_EXAMPLES_PATH)
+    eval_parser.add_argument("--similarities", type=float, nargs="+",
+                             default=sorted({0.6, 0.7, 0.75, 0.8, 0.85, INTENT_MIN_SIMILARITY}))
+    eval_parser.add_argument("--margins", type=float, nargs="+",
+                             default=sorted({0.0, 0.02, 0.05, 0.1, INTENT_MIN_MARGIN}))
+    eval_parser.set_defaults(func=evaluate)
+
+    args = parser.parse_args()
+    args.func(args)
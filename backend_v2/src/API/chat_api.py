@@ -1,7 +1,7 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from agent.graph import graph
+from agent.checkpointer import checkpointer_manager
 from google import genai
 from dotenv import load_dotenv
 import logging
@@ -22,12 +22,13 @@ class Query(BaseModel):
 class Response(BaseModel):
     answer: str
 
-async def text_generator(query: str, config: dict) -> AsyncGenerator[str, None]:
+async def text_generator(graph, query: str, config: dict) -> AsyncGenerator[str, None]:
     try:
         async for event in graph.astream(
             {"messages": [{"role": "user", "content": query}]},
             config=config,
             stream_mode="messages",
+            durability=checkpointer_manager.durability,
         ):
             text = event[0].content
             if text:
@@ -39,19 +40,21 @@ async def text_generator(query: str, config: dict) -> AsyncGenerator[str, None]:
 router = APIRouter()
 
 @router.post("/chat/stream")
-async def get_stream_answer(query: Query):
+async def get_stream_answer(query: Query, request: Request):
+    # Graph đã compile cùng checkpointer trong lifespan (main.py)
     return StreamingResponse(
-        text_generator(query.query, query.config),
+        text_generator(request.app.state.graph, query.query, query.config),
         media_type="text/event-stream",
     )
 
 @router.post("/chat")
-async def get_answer(query: Query):
+async def get_answer(query: Query, request: Request):
     try:
         logging.info(f"Received query: {query.query}")
-        answer = graph.invoke(
+        answer = await request.app.state.graph.ainvoke(
             {"messages": [{"role": "user", "content": query}]},
             config=config,
+            durability=checkpointer_manager.durability,
         )
         logging.info(f"Answer: {answer}")
         if not answer:
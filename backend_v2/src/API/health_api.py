@@ -0,0 +1,64 @@
+from fastapi import APIRouter
+from db_helper.db_connection import get_pool_stats
+from db_helper.vector_index import aget_vector_dimension
+from agent.llm_registry import llm_registry
+from agent.speculation import speculation_stats
+from agent.checkpointer import checkpointer_manager
+from agent.intent_classifier import intent_classifier
+from agent.sub_graph.rag_agent.embedding import embedding_provider
+from agent.sub_graph.rag_agent.embedding_cache import embedding_cache
+from agent.sub_graph.rag_agent.semantic_cache import semantic_cache
+from agent.sub_graph.rag_agent.reranker import reranker
+from agent.sub_graph.rag_agent.rerank_executor import rerank_executor
+
+router = APIRouter()
+
+
+@router.get("/health/db")
+async def get_db_stats():
+    return get_pool_stats()
+
+
+@router.get("/health/embedding")
+async def get_embedding_stats():
+    column_dimension = await aget_vector_dimension()
+    return {
+        **embedding_provider.get_stats(),
+        "column_dimension": column_dimension,
+        "compatible": column_dimension == embedding_provider.dimension,
+    }
+
+
+@router.get("/health/embedding-cache")
+async def get_embedding_cache_stats():
+    return embedding_cache.get_stats()
+
+
+@router.get("/health/semantic-cache")
+async def get_semantic_cache_stats():
+    return semantic_cache.get_stats()
+
+
+@router.get("/health/reranker")
+async def get_reranker_stats():
+    return {**reranker.get_stats(), "executor": rerank_executor.get_stats()}
+
+
+@router.get("/health/llm")
+async def get_llm_stats():
+    return llm_registry.get_stats()
+
+
+@router.get("/health/speculation")
+async def get_speculation_stats():
+    return speculation_stats.get_stats()
+
+
+@router.get("/health/intent")
+async def get_intent_stats():
+    return intent_classifier.get_stats()
+
+
+@router.get("/health/checkpointer")
+async def get_checkpointer_stats():
+    return checkpointer_manager.get_stats()
@@ -0,0 +1,104 @@
+import os
+import logging
+from typing import Optional
+from dotenv import load_dotenv
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import InMemorySaver
+from db_helper.db_connection import conninfo, DB_POOL_MAX_IDLE, DB_POOL_TIMEOUT
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Nơi lưu lịch sử hội thoại của graph: "sqlite" (một file cục bộ, chỉ dùng được cho một process),
+# "postgres" (cùng DB với sản phẩm, dùng chung giữa nhiều worker / máy) hoặc "memory" (mất khi restart)
+CHECKPOINTER = os.getenv("CHECKPOINTER", "sqlite")
+CHECKPOINT_SQLITE_PATH = os.getenv("CHECKPOINT_SQLITE_PATH", "chathistory.db")
+# "async": ghi checkpoint của bước trước song song với bước sau; "sync": đợi ghi xong mới chạy tiếp;
+# "exit": chỉ ghi một lần khi graph chạy xong (ít round trip nhất, mất trạng thái giữa chừng nếu lỗi)
+CHECKPOINT_DURABILITY = os.getenv("CHECKPOINT_DURABILITY", "async")
+# Pool riêng cho checkpointer, không dùng chung async_pool của db_helper vì cần autocommit
+# và không được giới hạn statement_timeout
+CHECKPOINT_POOL_MIN_SIZE = int(os.getenv("CHECKPOINT_POOL_MIN_SIZE", "1"))
+CHECKPOINT_POOL_MAX_SIZE = int(os.getenv("CHECKPOINT_POOL_MAX_SIZE", "10"))
+# Tạo / migrate các bảng checkpoint khi khởi động; tắt khi đã chạy migration riêng
+CHECKPOINT_SETUP = os.getenv("CHECKPOINT_SETUP", "true").lower() == "true"
+
+CHECKPOINTER_BACKENDS = ("sqlite", "postgres", "memory")
+DURABILITY_MODES = ("sync", "async", "exit")
+
+
+class CheckpointerManager:
+    """Tạo và quản lý vòng đời checkpointer của graph chính.
+
+    Các saver bất đồng bộ (AsyncSqliteSaver, AsyncPostgresSaver) phải được tạo bên trong event loop
+    nên không khởi tạo lúc import: `aopen()` được gọi trong lifespan của FastAPI và trả về saver để
+    compile graph (`build_graph`). Với Postgres, mỗi lần ghi `aput_writes` của một bước gửi toàn bộ writes trong một
+    pipeline (một round trip), và connection được mượn từ pool nên không chặn các request khác.
+    """
+
+    def __init__(self, backend: str = CHECKPOINTER, durability: str = CHECKPOINT_DURABILITY):
+        if backend not in CHECKPOINTER_BACKENDS:
+            raise ValueError(f"CHECKPOINTER must be one of {CHECKPOINTER_BACKENDS}, got {backend!r}")
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"CHECKPOINT_DURABILITY must be one of {DURABILITY_MODES}, got {durability!r}")
+        self.backend = backend
+        self.durability = durability
+        self.saver: Optional[BaseCheckpointSaver] = None
+        self.pool: Optional[AsyncConnectionPool] = None
+        self._sqlite_conn = None
+
+    async def aopen(self) -> BaseCheckpointSaver:
+        if self.saver is not None:
+            return self.saver
+        if self.backend == "postgres":
+            from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+
+            self.pool = AsyncConnectionPool(
+                conninfo,
+                # AsyncPostgresSaver yêu cầu autocommit, dict_row và tắt prepared statement
+                # (để chạy được sau pgbouncer ở chế độ transaction)
+                kwargs={"autocommit": True, "prepare_threshold": 0, "row_factory": dict_row},
+                min_size=CHECKPOINT_POOL_MIN_SIZE,
+                max_size=CHECKPOINT_POOL_MAX_SIZE,
+                max_idle=DB_POOL_MAX_IDLE,
+                timeout=DB_POOL_TIMEOUT,
+                name="checkpointer",
+                open=False,
+            )
+            await self.pool.open()
+            saver = AsyncPostgresSaver(self.pool)
+            if CHECKPOINT_SETUP:
+                await saver.setup()
+        elif self.backend == "sqlite":
+            import aiosqlite
+            from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+            self._sqlite_conn = await aiosqlite.connect(CHECKPOINT_SQLITE_PATH)
+            saver = AsyncSqliteSaver(self._sqlite_conn)
+            await saver.setup()
+        else:
+            saver = InMemorySaver()
+        self.saver = saver
+        logger.info(f"Checkpointer ready: {self.backend} (durability={self.durability})")
+        return saver
+
+    async def aclose(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+        if self._sqlite_conn is not None:
+            await self._sqlite_conn.close()
+            self._sqlite_conn = None
+        self.saver = None
+
+    def get_stats(self) -> dict:
+        stats = {"backend": self.backend, "durability": self.durability, "open": self.saver is not None}
+        if self.pool is not None:
+            stats["pool"] = {**self.pool.get_stats(), "closed": self.pool.closed}
+        return stats
+
+
+# Instance dùng chung, mở trong lifespan của FastAPI
+checkpointer_manager = CheckpointerManager()
@@ -1,10 +1,9 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.runnables import RunnableConfig
 from langchain_core.messages import BaseMessage
 from langgraph.graph import StateGraph, START, END
-from langgraph.checkpoint.sqlite import SqliteSaver
-import sqlite3
-from typing import Dict, Literal, cast, Any, TypedDict
+from langgraph.graph.state import CompiledStateGraph
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from typing import Awaitable, Dict, List, Literal, Optional, Tuple, cast, Any, TypedDict
 from dataclasses import dataclass
 from dotenv import load_dotenv
 import logging
@@ -12,16 +11,26 @@ import os
 
 from .states import AgentState, InputState
 from agent.sub_graph import order_graph, rag_graph
-from.prompts import ROUTER_SYSTEM_PROMPT, MORE_INFO_SYSTEM_PROMPT, EXTRACT_ORDER_SYSTEM_PROMPT, RAG_RESPONSE_PROMPT, ORDER_RESPONSE_PROMPT, CHITCHAT_RESPONSE_PROMPT
+from agent.sub_graph.rag_agent.embedding import embedding_provider
+from agent.llm_registry import llm_registry
+from agent.speculation import SPECULATIVE_RAG, run_speculative
+from agent.intent_classifier import INTENT_CLASSIFIER_ENABLED, intent_classifier
+from agent.sub_graph.rag_agent.semantic_cache import SEMANTIC_CACHE_ENABLED, semantic_cache
+from db_helper.product_services import add_product_change_listener
+from.prompts import ROUTER_SYSTEM_PROMPT, ROUTE_AND_QUERY_SYSTEM_PROMPT, MORE_INFO_SYSTEM_PROMPT, EXTRACT_ORDER_SYSTEM_PROMPT, RAG_RESPONSE_PROMPT, ORDER_RESPONSE_PROMPT, CHITCHAT_RESPONSE_PROMPT
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
-GEMINI_MODEL = os.getenv("GEMINI_MODEL")
+# Route and write the product search queries in one LLM call instead of two
+FUSED_ROUTER = os.getenv("FUSED_ROUTER", "false").lower() == "true"
 
-model = ChatGoogleGenerativeAI(model=GEMINI_MODEL)
+model = llm_registry.get_chat_model()
+
+# Cached RAG results include prices and stock levels, so drop them whenever products change
+add_product_change_listener(semantic_cache.invalidate)
 
 @dataclass
 class Router:
@@ -29,6 +38,14 @@ class Router:
     Field 'router' must be either 'order' or 'product_infomation'."""
     router: Literal["order", "product_infomation", "chitchat"]
 
+@dataclass
+class RouteWithQueries:
+    """Routing schema that also carries the product search queries.
+    'vector_search_query' and 'fts_keyword' are empty unless 'router' is 'product_infomation'."""
+    router: Literal["order", "product_infomation", "chitchat"]
+    vector_search_query: str
+    fts_keyword: str
+
 @dataclass
 class OrderInfo:
     """Order extraction schema.
@@ -38,18 +55,77 @@ class OrderInfo:
     quantity: int
 
 
+# Queries are only valid for the turn that produced them
+NO_QUERIES = {"vector_search_query": None, "fts_keyword": None}
+
+
+async def classify_locally(state: AgentState) -> Optional[Dict[str, Any]]:
+    """
+    Route high-confidence messages without calling the LLM router.
+
+    Args:
+        state (AgentState): Current conversation state including messages.
+
+    Returns:
+        Optional[Dict[str, Any]]: The router update if the local intent classifier is
+            confident, otherwise None.
+    """
+
+    if not INTENT_CLASSIFIER_ENABLED:
+        return None
+    intent = await intent_classifier.aclassify(state.messages[-1].content)
+    if intent is None:
+        return None
+    logging.info(f"ROUTER TO {intent} (local intent classifier)")
+    return {"router": intent, "retrieval_ready": False, **NO_QUERIES}
+
+
+async def await_route(route: Awaitable, state: AgentState) -> Tuple[Any, Optional[List[str]]]:
+    """
+    Await an LLM router call, retrieving products alongside it when SPECULATIVE_RAG is on.
+
+    Args:
+        route (Awaitable): The pending structured router call.
+        state (AgentState): Current conversation state including messages.
+
+    Returns:
+        Tuple[Any, Optional[List[str]]]: The router response and the speculatively retrieved
+            products, or None when speculation is off or the route is not 'product_infomation'.
+    """
+
+    if not SPECULATIVE_RAG:
+        return await route, None
+
+    # Start retrieval while the router is still deciding; keep it only for product questions
+    response, retrieved_products = await run_speculative(
+        route,
+        retrieve_products(state.messages[-1].content),
+        accept=lambda decision: decision['router'] == "product_infomation",
+    )
+    logging.info(f"Speculative retrieval {'used' if retrieved_products is not None else 'discarded'}")
+    return response, retrieved_products
+
+
 async def determine_agent(
         state: AgentState, *, config: RunnableConfig
-) -> Dict[str, str]:
+) -> Dict[str, Any]:
     """
     Classify the user's intent and determine the processing route.
 
+    With INTENT_CLASSIFIER_ENABLED, confident cases are routed by the local intent
+    classifier and only ambiguous messages reach the LLM router.
+    When SPECULATIVE_RAG is enabled, the RAG pipeline starts at the same time as
+    the router instead of after it. Its result is used if the router picks
+    'product_infomation' and cancelled otherwise.
+
     Args:
         state (AgentState): Current conversation state including messages.
         config (RunnableConfig): Runtime configuration for execution.
 
     Returns:
-        Dict[str, str]: Dictionary with key 'router' set to 'order' or 'product_infomation'.
+        Dict[str, Any]: Dictionary with key 'router' set to 'order', 'product_infomation' or
+            'chitchat'. With SPECULATIVE_RAG enabled, product questions also carry the
+            'retrieved_products' found while the router was running.
     """
 
     messages = [
@@ -58,12 +134,63 @@ async def determine_agent(
 
     logging.info("---ANALYZE AND ROUTE QUERY---")
     logging.info(f"MESSAGES: {state.messages}")
-    response = cast(Router, await model.with_structured_output(Router).ainvoke(messages))
-    logging.info(f"ROUTER TO {response}")
     print(state.messages[-1].content)
-    return {"router": response['router']}
+    if (local := await classify_locally(state)) is not None:
+        return local
+    response, retrieved_products = await await_route(llm_registry.get_structured_model(Router).ainvoke(messages), state)
+    response = cast(Router, response)
+    logging.info(f"ROUTER TO {response}")
+    if retrieved_products is None:
+        return {"router": response['router'], "retrieval_ready": False, **NO_QUERIES}
+    return {"router": response['router'], "retrieved_products": retrieved_products, "retrieval_ready": True,
+            **NO_QUERIES}
+
+async def route_and_generate_queries(
+        state: AgentState, *, config: RunnableConfig
+) -> Dict[str, Any]:
+    """
+    Classify the user's intent and, for product questions, write the search queries.
 
-def router_query(state: AgentState) -> Literal["check_order_info", "rag"]:
+    Replaces determine_agent when FUSED_ROUTER is enabled: the rag node passes the
+    queries to the RAG subgraph, which then skips its own keyword-generation LLM call.
+    With SPECULATIVE_RAG also enabled, retrieval starts alongside this call as in
+    determine_agent; when it is used, the generated queries are not needed.
+
+    Args:
+        state (AgentState): Current conversation state including messages.
+        config (RunnableConfig): Runtime configuration for execution.
+
+    Returns:
+        Dict[str, Any]: Dictionary with 'router', 'vector_search_query' and 'fts_keyword'
+            (the queries are None unless the route is 'product_infomation'), or the
+            speculatively 'retrieved_products' with 'retrieval_ready' set.
+    """
+
+    messages = [
+        {"role": "system", "content": ROUTE_AND_QUERY_SYSTEM_PROMPT},
+    ] + state.messages
+
+    logging.info("---ANALYZE AND ROUTE QUERY (WITH SEARCH QUERIES)---")
+    if (local := await classify_locally(state)) is not None:
+        return local
+    response, retrieved_products = await await_route(
+        llm_registry.get_structured_model(RouteWithQueries).ainvoke(messages), state
+    )
+    response = cast(RouteWithQueries, response)
+    logging.info(f"ROUTER TO {response}")
+    if retrieved_products is not None:
+        return {"router": response['router'], "retrieved_products": retrieved_products, "retrieval_ready": True,
+                **NO_QUERIES}
+    if response['router'] != "product_infomation" or not response['vector_search_query']:
+        return {"router": response['router'], "retrieval_ready": False, **NO_QUERIES}
+    return {
+        "router": response['router'],
+        "retrieval_ready": False,
+        "vector_search_query": response['vector_search_query'],
+        "fts_keyword": response['fts_keyword'],
+    }
+
+def router_query(state: AgentState) -> Literal["check_order_info", "rag", "response"]:
     """
     Map the router value to the next graph node name.
 
@@ -71,17 +198,57 @@ def router_query(state: AgentState) -> Literal["check_order_info", "rag"]:
         state (AgentState): Current conversation state with the 'router' value.
 
     Returns:
-        Literal: Next node name ('check_order_info' or 'rag').
+        Literal: Next node name ('check_order_info', 'rag' or 'response').
     """
     if state.router == "order":
         return "check_order_info"
     elif state.router == "product_infomation":
-        return "rag"
+        # Products were already retrieved speculatively in determine_agent
+        return "response" if state.retrieval_ready else "rag"
     elif state.router == "chitchat":
         return "response"
     else:
         raise ValueError(f"Unknown router type: {state.router}")
     
+async def retrieve_products(user_query: str, vector_search_query: Optional[str] = None,
+                            fts_keyword: Optional[str] = None) -> List[str]:
+    """
+    Retrieve product-related information for a query using the RAG pipeline.
+
+    Near-duplicate questions are answered from the semantic cache without
+    running the RAG subgraph (keyword generation, search and rerank).
+
+    Args:
+        user_query (str): The user's question.
+        vector_search_query (Optional[str]): Precomputed semantic search query; when set,
+            the RAG subgraph skips keyword generation.
+        fts_keyword (Optional[str]): Precomputed full-text search keywords.
+
+    Returns:
+        List[str]: The retrieved products.
+    """
+
+    query_vector = None
+    if SEMANTIC_CACHE_ENABLED:
+        try:
+            query_vector = await embedding_provider.aget_embedding(user_query)
+            cached = semantic_cache.get(query_vector)
+            if cached is not None:
+                logger.info("SEMANTIC CACHE HIT")
+                return cached
+        except Exception as e:
+            logger.error("Semantic cache lookup failed", exc_info=e)
+
+    result = await rag_graph.ainvoke({
+        "user_query": user_query,
+        "vector_search_query": vector_search_query,
+        "fts_keyword": fts_keyword,
+    })
+    # logger.info(f"RETRIEVAL SUCCESSED: {result}")
+    if query_vector and result.get('found'):
+        semantic_cache.put(query_vector, result['retrieved_products'])
+    return result['retrieved_products']
+
 async def rag(state: AgentState) -> Dict[str, Any]:
     """
     Retrieve product-related information using a RAG pipeline.
@@ -93,9 +260,10 @@ async def rag(state: AgentState) -> Dict[str, Any]:
         Dict[str, Any]: Dictionary containing 'retrieved_products'.
     """
 
-    result = await rag_graph.ainvoke({"user_query": state.messages[-1].content})
-    # logger.info(f"RETRIEVAL SUCCESSED: {result}")
-    return {"retrieved_products": result['retrieved_products']}
+    retrieved_products = await retrieve_products(
+        state.messages[-1].content, state.vector_search_query, state.fts_keyword
+    )
+    return {"retrieved_products": retrieved_products}
 
 def check_order_info(state: AgentState) -> Dict[str, str]:
     """
@@ -173,7 +341,7 @@ async def extract_order_info(
         {"role": "system", "content": EXTRACT_ORDER_SYSTEM_PROMPT},
     ] + state.messages
 
-    response = cast(OrderInfo, await model.with_structured_output(OrderInfo).ainvoke(messages))
+    response = cast(OrderInfo, await llm_registry.get_structured_model(OrderInfo).ainvoke(messages))
 
     return {
         "user_id": response.user_id,
@@ -233,12 +401,12 @@ async def response(
     return {"messages": [response]}
 
 
-conn = sqlite3.connect(database="chathistory.db", check_same_thread=False)
-checkpointer = SqliteSaver()
-
 builder = StateGraph(AgentState, input=InputState)
 
-builder.add_node(determine_agent)
+if FUSED_ROUTER:
+    builder.add_node("determine_agent", route_and_generate_queries)
+else:
+    builder.add_node(determine_agent)
 builder.add_node(rag)
 builder.add_node(check_order_info)
 builder.add_node(create_order)
@@ -255,4 +423,19 @@ builder.add_edge("create_order", "response")
 builder.add_edge("rag", "response")
 builder.add_edge("response", END)
 
-graph = builder.compile(checkpointer=checkpointer)
+
+def build_graph(checkpointer: Optional[BaseCheckpointSaver] = None) -> CompiledStateGraph:
+    """Compile the agent graph.
+
+    Args:
+        checkpointer: Saver for conversation state. The FastAPI app passes the one opened in its
+            lifespan (async savers must be created inside the event loop, see agent.checkpointer).
+
+    Returns:
+        The compiled graph.
+    """
+    return builder.compile(checkpointer=checkpointer)
+
+
+# Without a checkpointer: used by `langgraph dev` (which provides its own) and the tests
+graph = build_graph()
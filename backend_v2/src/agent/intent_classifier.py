@@ -0,0 +1,208 @@
+import os
+import re
+import json
+import logging
+import threading
+from typing import Optional
+import numpy as np
+from dotenv import load_dotenv
+from agent.sub_graph.rag_agent.embedding import embedding_provider
+from agent.sub_graph.rag_agent.keyword_extractor import normalize_query, strip_diacritics
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Phân loại ý định ngay trong process trước khi gọi LLM router
+INTENT_CLASSIFIER_ENABLED = os.getenv("INTENT_CLASSIFIER_ENABLED", "false").lower() == "true"
+# Centroid sinh bởi scripts/train_intent_classifier.py; thiếu file thì chỉ dùng luật từ khoá
+INTENT_MODEL_PATH = os.getenv("INTENT_MODEL_PATH", os.path.join("models", "intent_centroids.npz"))
+# Chỉ tin centroid gần nhất khi đủ giống và bỏ xa centroid thứ hai
+INTENT_MIN_SIMILARITY = float(os.getenv("INTENT_MIN_SIMILARITY", "0.75"))
+INTENT_MIN_MARGIN = float(os.getenv("INTENT_MIN_MARGIN", "0.05"))
+
+INTENT_EXAMPLES_PATH = os.path.join(os.path.dirname(__file__), "data", "intent_examples.jsonl")
+INTENT_LABELS = ("order", "product_infomation", "chitchat")
+
+# Câu chào hỏi / cảm ơn / tạm biệt đứng một mình (so khớp toàn bộ câu đã chuẩn hoá)
+CHITCHAT_PATTERN = re.compile(
+    r"^(?:(?:xin )?chao|hi|hello|hey|alo|good (?:morning|afternoon|evening)"
+    r"|(?:cam on|thank(?:s| you))(?: (?:ban|shop|ad|admin|nhieu|nhe|nha|so much|a lot))*"
+    r"|tam biet|bye|goodbye|hen gap lai)"
+    r"(?: (?:ban|shop|ad|admin|em|anh|chi|a|nhe|nha|buoi sang|buoi toi))*$"
+)
+# Ý định mua kèm một mã sản phẩm hoặc ISBN cụ thể. Sau khi bỏ dấu "đặt" và "đạt" ("sách đạt giải ...")
+# đều thành "dat", nên "đặt" được so khớp trên văn bản còn dấu; gõ không dấu thì cần "dat mua" / "dat hang"
+PURCHASE_PATTERN = re.compile(r"\b(?:mua|dat mua|dat hang|chot don|order|buy|add)\b")
+ACCENTED_PURCHASE_PATTERN = re.compile(r"\bđặt\b")
+PRODUCT_ID_PATTERN = re.compile(
+    r"\b(?:ma(?: san pham)?|san pham(?: so)?|id|product(?: id)?)\s*(?:so\s*)?\d+\b|\bisbn\s*\d{10,13}\b"
+)
+
+
+def normalize_text(text: str) -> str:
+    """Chữ thường, bỏ dấu tiếng Việt và dấu câu để luật từ khoá không phụ thuộc cách gõ."""
+    return " ".join(re.sub(r"[^\w\s]", " ", strip_diacritics(text.lower())).split())
+
+
+def match_rules(text: str) -> Optional[str]:
+    normalized = normalize_text(text)
+    if CHITCHAT_PATTERN.match(normalized):
+        return "chitchat"
+    purchase = PURCHASE_PATTERN.search(normalized) or ACCENTED_PURCHASE_PATTERN.search(normalize_query(text))
+    if purchase and PRODUCT_ID_PATTERN.search(normalized):
+        return "order"
+    return None
+
+
+def load_examples(path: str = INTENT_EXAMPLES_PATH) -> tuple[list[str], list[str]]:
+    texts, labels = [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                example = json.loads(line)
+                texts.append(example["text"])
+                labels.append(example["label"])
+    return texts, labels
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+class IntentClassifier:
+    """Bộ phân loại ý định nhanh đặt trước LLM router.
+
+    Hai tầng: luật từ khoá (chào hỏi, mua kèm mã sản phẩm) rồi nearest centroid trên embedding câu
+    hỏi. Centroid của mỗi nhãn là trung bình embedding các câu mẫu. Chỉ trả về nhãn khi đủ chắc chắn
+    (similarity >= `min_similarity` và cách nhãn thứ hai >= `min_margin`); còn lại trả về None để
+    LLM router quyết định.
+
+    Tầng centroid chỉ chạy khi có embedding mà không cần round trip mạng: với EMBEDDING_PROVIDER=local
+    câu hỏi được embed ngay trong process (qua embedding cache nên semantic cache dùng lại được); với
+    provider từ xa (Gemini) chỉ dùng vector đã có trong embedding cache. Nếu không, câu hỏi đi thẳng
+    tới LLM router thay vì chờ thêm một lần gọi embedding API rồi vẫn phải hỏi LLM.
+    """
+
+    def __init__(self, embedding_provider, model_path: str = INTENT_MODEL_PATH,
+                 min_similarity: float = INTENT_MIN_SIMILARITY, min_margin: float = INTENT_MIN_MARGIN):
+        self.embedding_provider = embedding_provider
+        self.model_path = model_path
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self.labels: list[str] = []
+        self.centroids: Optional[np.ndarray] = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        # remote_skips: provider từ xa và chưa có embedding trong cache, bỏ qua tầng centroid
+        self.stats = {"turns": 0, "rule_hits": 0, "centroid_hits": 0, "llm_fallbacks": 0, "remote_skips": 0}
+        self.label_counts = {label: 0 for label in INTENT_LABELS}
+
+    def fit(self, texts: list[str], labels: list[str]):
+        """Tính centroid cho từng nhãn từ các câu mẫu (embedding giống như lúc phân loại)."""
+        vectors = _normalize_rows(np.asarray([self.embedding_provider.get_embedding(t) for t in texts],
+                                             dtype=np.float32))
+        self.labels = sorted(set(labels))
+        label_array = np.asarray(labels)
+        self.centroids = _normalize_rows(np.stack([vectors[label_array == label].mean(axis=0)
+                                                   for label in self.labels]))
+        self._loaded = True
+        return vectors
+
+    def save(self, path: Optional[str] = None):
+        path = path or self.model_path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez(path, labels=np.asarray(self.labels), centroids=self.centroids,
+                 model=np.asarray(self.embedding_provider.model_name))
+
+    def load(self) -> bool:
+        """Nạp centroid một lần; bỏ qua (chỉ dùng luật) nếu thiếu file hoặc khác model embedding."""
+        if self._loaded:
+            return self.centroids is not None
+        with self._lock:
+            if not self._loaded:
+                try:
+                    with np.load(self.model_path, allow_pickle=False) as data:
+                        model_name = str(data["model"])
+                        labels = [str(label) for label in data["labels"]]
+                        centroids = data["centroids"].astype(np.float32)
+                    if model_name != self.embedding_provider.model_name:
+                        logger.warning(f"Intent centroids were trained with {model_name}, not "
+                                       f"{self.embedding_provider.model_name}; using keyword rules only")
+                    else:
+                        self.labels, self.centroids = labels, centroids
+                except FileNotFoundError:
+                    logger.warning(f"No intent centroids at {self.model_path}; using keyword rules only")
+                except Exception as e:
+                    logger.error("Failed to load intent centroids", exc_info=e)
+                self._loaded = True
+        return self.centroids is not None
+
+    def predict_vector(self, vector) -> tuple[Optional[str], float, float]:
+        """Nhãn gần nhất, similarity và khoảng cách tới nhãn thứ hai; nhãn là None khi chưa đủ chắc."""
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if self.centroids is None or norm == 0 or query.shape[0] != self.centroids.shape[1]:
+            return None, 0.0, 0.0
+        scores = self.centroids @ (query / norm)
+        order = np.argsort(scores)[::-1]
+        best = float(scores[order[0]])
+        margin = best - float(scores[order[1]]) if len(order) > 1 else best
+        if best < self.min_similarity or margin < self.min_margin:
+            return None, best, margin
+        return self.labels[order[0]], best, margin
+
+    def _record(self, label: Optional[str], source: str) -> Optional[str]:
+        with self._lock:
+            self.stats["turns"] += 1
+            self.stats[source] += 1
+            if label is not None:
+                self.label_counts[label] = self.label_counts.get(label, 0) + 1
+        return label
+
+    async def _local_embedding(self, text: str) -> Optional[list[float]]:
+        """Embedding của câu hỏi nếu có được trong process, None nếu phải gọi API từ xa."""
+        provider = self.embedding_provider
+        if provider.name == "local":
+            return await provider.aget_embedding(text)
+        if provider.cache is not None:
+            return await provider.cache.aget(provider.model_name, text, provider.dimension)
+        return None
+
+    async def aclassify(self, text: str) -> Optional[str]:
+        """Nhãn ý định nếu phân loại được trong process, None nếu cần hỏi LLM router."""
+        label = match_rules(text)
+        if label is not None:
+            return self._record(label, "rule_hits")
+        if self.load():
+            try:
+                vector = await self._local_embedding(text)
+            except Exception as e:
+                logger.error("Intent embedding failed", exc_info=e)
+                vector = None
+            if vector is None:
+                with self._lock:
+                    self.stats["remote_skips"] += 1
+            else:
+                label, _, _ = self.predict_vector(vector)
+                if label is not None:
+                    return self._record(label, "centroid_hits")
+        return self._record(None, "llm_fallbacks")
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            label_counts = dict(self.label_counts)
+        skipped = stats["rule_hits"] + stats["centroid_hits"]
+        return {
+            **stats,
+            "skip_rate": skipped / stats["turns"] if stats["turns"] else 0.0,
+            "labels": label_counts,
+            "centroids_loaded": self.centroids is not None,
+            "min_similarity": self.min_similarity,
+            "min_margin": self.min_margin,
+        }
+
+
+# Instance dùng chung cho node router của graph
+intent_classifier = IntentClassifier(embedding_provider)
@@ -0,0 +1,119 @@
+import os
+import time
+import threading
+from typing import Any, Optional
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables import Runnable
+from langchain_google_genai import ChatGoogleGenerativeAI
+from dotenv import load_dotenv
+load_dotenv()
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL")
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))            # giây, cho mỗi lần gọi model
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+
+
+class LLMStatsCallback(BaseCallbackHandler):
+    """Đếm số request, số lỗi và độ trễ của một chat model.
+
+    Gắn vào model lúc tạo nên mọi lần gọi (kể cả qua `with_structured_output`) đều được ghi lại.
+    `run_inline` để callback chạy ngay trong event loop thay vì bị đẩy sang thread pool.
+    """
+
+    run_inline = True
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self._lock = threading.Lock()
+        self._started: dict[UUID, float] = {}
+        self.stats = {"requests": 0, "errors": 0, "in_flight": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+
+    def on_chat_model_start(self, serialized: dict, messages: list, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            self._started[run_id] = time.perf_counter()
+            self.stats["in_flight"] += 1
+
+    def _finish(self, run_id: UUID, error: bool):
+        with self._lock:
+            started = self._started.pop(run_id, None)
+            if started is None:
+                return
+            elapsed = time.perf_counter() - started
+            self.stats["in_flight"] -= 1
+            self.stats["requests"] += 1
+            self.stats["errors"] += int(error)
+            self.stats["total_seconds"] += elapsed
+            self.stats["max_seconds"] = max(self.stats["max_seconds"], elapsed)
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id, error=False)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id, error=True)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        stats["avg_seconds"] = stats["total_seconds"] / stats["requests"] if stats["requests"] else 0.0
+        return stats
+
+
+class LLMRegistry:
+    """Giữ một chat model và một runnable structured output cho mỗi (model, schema) trong process.
+
+    Mỗi instance ChatGoogleGenerativeAI mở một gRPC channel riêng (HTTP/2, giữ kết nối và multiplex
+    các request đồng thời), nên dùng chung instance thay vì tạo mới ở mỗi node giúp các lượt chat
+    tái sử dụng cùng một kết nối tới Gemini, không phải bắt tay TLS lại và không phải dựng lại
+    schema/tool binding cho `with_structured_output` ở mỗi lần gọi.
+    """
+
+    def __init__(self, timeout: float = LLM_TIMEOUT, max_retries: int = LLM_MAX_RETRIES):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._lock = threading.Lock()
+        self._models: dict[str, ChatGoogleGenerativeAI] = {}
+        self._callbacks: dict[str, LLMStatsCallback] = {}
+        self._structured: dict[tuple[str, Any], Runnable] = {}
+
+    def get_chat_model(self, model_name: Optional[str] = None) -> ChatGoogleGenerativeAI:
+        model_name = model_name or GEMINI_MODEL
+        model = self._models.get(model_name)
+        if model is None:
+            with self._lock:
+                model = self._models.get(model_name)
+                if model is None:
+                    callback = LLMStatsCallback(model_name)
+                    model = ChatGoogleGenerativeAI(model=model_name, timeout=self.timeout,
+                                                   max_retries=self.max_retries, callbacks=[callback])
+                    self._callbacks[model_name] = callback
+                    self._models[model_name] = model
+        return model
+
+    def get_structured_model(self, schema: Any, model_name: Optional[str] = None) -> Runnable:
+        """Runnable `with_structured_output(schema)`; schema phải là class định nghĩa ở cấp module
+        (class tạo mới trong hàm sẽ không bao giờ trúng cache)."""
+        model_name = model_name or GEMINI_MODEL
+        key = (model_name, schema)
+        runnable = self._structured.get(key)
+        if runnable is None:
+            model = self.get_chat_model(model_name)
+            with self._lock:
+                runnable = self._structured.get(key)
+                if runnable is None:
+                    runnable = model.with_structured_output(schema)
+                    self._structured[key] = runnable
+        return runnable
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            callbacks = dict(self._callbacks)
+            structured = [getattr(schema, "__name__", str(schema)) for _, schema in self._structured]
+        return {
+            "models": {name: callback.get_stats() for name, callback in callbacks.items()},
+            "structured_outputs": structured,
+        }
+
+
+# Instance dùng chung cho tất cả các node của graph
+llm_registry = LLMRegistry()
@@ -33,6 +33,18 @@ Output requirements:
 """
 
 
+ROUTE_AND_QUERY_SYSTEM_PROMPT = ROUTER_SYSTEM_PROMPT.split("Output requirements:")[0] + """Search queries:
+When (and only when) the route is "product_infomation", also write the queries used to search the books database for the latest user message:
+- vector_search_query: a concise and meaningful phrase suited for semantic (vector) search, containing the core topic.
+- fts_keyword: a minimal list of exact keywords for traditional (keyword) filtering, omitting any common words and stop-words.
+- Both must be in the language of the user message.
+For "order" and "chitchat", set both fields to an empty string.
+
+Output requirements:
+- Return exactly three fields: `router` (`"order"`, `"product_infomation"`, or `"chitchat"`), `vector_search_query` and `fts_keyword`.
+- Do not include any extra text or explanation — output only the structured result expected by the caller.
+"""
+
 
 MORE_INFO_SYSTEM_PROMPT = """
 You are the follow-up-question generator for a bookstore chatbot. The previous step detected that required order information is missing. Your job is to produce a single, concise, user-facing follow-up question that asks exactly for the missing information needed to complete the order.
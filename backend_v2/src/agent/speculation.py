@@ -0,0 +1,107 @@
+import os
+import time
+import asyncio
+import inspect
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Optional, Tuple
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Chạy RAG song song với router thay vì đợi router xong mới bắt đầu tìm kiếm
+SPECULATIVE_RAG = os.getenv("SPECULATIVE_RAG", "false").lower() == "true"
+
+
+class SpeculationStats:
+    """Thống kê công việc chạy trước: bao nhiêu lần được dùng, bao nhiêu lần bỏ đi và tốn bao lâu."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats = {
+            "started": 0,
+            "used": 0,
+            "discarded": 0,        # router chọn nhánh khác, kết quả bị bỏ
+            "cancelled": 0,        # trong số bị bỏ: còn đang chạy nên bị huỷ giữa chừng
+            "failed": 0,           # lỗi trong lúc chạy trước, node bình thường sẽ chạy lại
+            "saved_seconds": 0.0,  # thời gian chồng lên router, không còn phải chờ nối tiếp
+            "wasted_seconds": 0.0, # thời gian chạy của các lần bị bỏ
+        }
+
+    def record(self, **deltas):
+        with self._lock:
+            for key, delta in deltas.items():
+                self.stats[key] += delta
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        finished = stats["used"] + stats["discarded"]
+        stats["waste_rate"] = stats["discarded"] / finished if finished else 0.0
+        return stats
+
+
+speculation_stats = SpeculationStats()
+
+# Giữ tham chiếu tới các task bị huỷ cho tới khi chúng kết thúc hẳn
+_background_tasks: set = set()
+
+
+def _discard(task: asyncio.Task):
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("Speculative task failed after being discarded", exc_info=task.exception())
+
+
+async def run_speculative(decide: Awaitable, speculate: Awaitable, accept: Callable[[Any], bool],
+                          stats: SpeculationStats = speculation_stats) -> Tuple[Any, Optional[Any]]:
+    """Chạy `speculate` song song với `decide` và chỉ giữ kết quả khi `accept(decision)` đúng.
+
+    Returns:
+        Tuple[Any, Optional[Any]]: (kết quả của decide, kết quả của speculate hoặc None khi bị bỏ/lỗi).
+    """
+    start = time.perf_counter()
+    finished_at = []
+
+    async def timed():
+        try:
+            return await speculate
+        finally:
+            finished_at.append(time.perf_counter())
+
+    task = asyncio.create_task(timed())
+    stats.record(started=1)
+    try:
+        decision = await decide
+    except BaseException:
+        task.cancel()
+        _background_tasks.add(task)
+        task.add_done_callback(_discard)
+        if inspect.iscoroutine(speculate) and inspect.getcoroutinestate(speculate) == inspect.CORO_CREATED:
+            # Router lỗi trước khi task kịp chạy: đóng coroutine để không bị bỏ rơi mà chưa await
+            speculate.close()
+            stats.record(discarded=1)
+        else:
+            stats.record(discarded=1, cancelled=1, wasted_seconds=time.perf_counter() - start)
+        raise
+    decided_at = time.perf_counter()
+
+    if not accept(decision):
+        if task.done():
+            stats.record(discarded=1, wasted_seconds=finished_at[0] - start)
+        else:
+            task.cancel()
+            stats.record(discarded=1, cancelled=1, wasted_seconds=decided_at - start)
+        _background_tasks.add(task)
+        task.add_done_callback(_discard)
+        return decision, None
+
+    try:
+        result = await task
+    except Exception as e:
+        logger.error("Speculative task failed", exc_info=e)
+        stats.record(failed=1)
+        return decision, None
+    stats.record(used=1, saved_seconds=min(decided_at, finished_at[0]) - start)
+    return decision, result
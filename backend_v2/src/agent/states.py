@@ -12,7 +12,10 @@ class InputState:
 class AgentState(InputState):
     router: Optional[str] = None
     user_query: Optional[str] = None
+    vector_search_query: Optional[str] = None
+    fts_keyword: Optional[str] = None
     retrieved_products: List[str] = field(default_factory=list)
+    retrieval_ready: bool = False
 
 
     respond: Optional[str] = None
@@ -1,9 +1,32 @@
 from langgraph.graph import StateGraph, START, END
 from typing import Literal, List, Any, Dict
+from dotenv import load_dotenv
+import os
 
-from .tools import check_stock, create_order, update_stock
+from .tools import check_stock, create_order, update_stock, place_order
 from .state import InputState, OrderAgentState
 
+load_dotenv()
+
+# Đặt hàng nguyên tử (một transaction) thay vì check_stock -> create_order -> update_stock
+ORDER_FAST_PATH = os.getenv("ORDER_FAST_PATH", "true").lower() == "true"
+
+async def place_order_node(state: OrderAgentState) -> Dict[str, Any]:
+    """
+    Place the order atomically in a single database transaction.
+
+    Calls the external `place_order(user_id, product_id, quantity)` service, which
+    decrements stock only if enough is available and inserts the order in the same
+    transaction. Replaces the check_stock -> create_order -> update_stock sequence.
+
+    Returns:
+        A dict with `order_created`, `order_id`, `total_amount`, `stock_available`
+        and `stock_updated`.
+    """
+
+    result = await place_order(state.user_id, state.product_id, state.quantity)
+    return result
+
 async def check_stock_node(state: OrderAgentState) -> Dict[str, Any]:
     """
     Check the available stock for the product in the current state.
@@ -50,6 +73,20 @@ async def update_stock_node(state: OrderAgentState) -> Dict[str, Any]:
     result = await update_stock(state.product_id, state.quantity)
     return result
 
+def router_entry(state: OrderAgentState) -> str:
+    """
+    Choose the order pipeline.
+
+    Returns:
+        "place_order" when the atomic fast path is enabled (ORDER_FAST_PATH),
+        otherwise "check_stock".
+    """
+
+    if ORDER_FAST_PATH:
+        return "place_order"
+    else:
+        return "check_stock"
+
 def router_check(state: OrderAgentState) -> str:
     """
     Decide whether to proceed with order creation or respond to the user.
@@ -112,12 +149,21 @@ def respond_node(state: OrderAgentState) -> Dict[str, List[str]]:
 
 builder = StateGraph(OrderAgentState, input=InputState)
 
+builder.add_node(place_order_node)
 builder.add_node(check_stock_node)
 builder.add_node(create_order_node)
 builder.add_node(update_stock_node)
 builder.add_node(respond_node)
 
-builder.add_edge(START, "check_stock_node")
+builder.add_conditional_edges(
+    START,
+    router_entry,
+    {
+        "place_order": "place_order_node",
+        "check_stock": "check_stock_node"
+    }
+)
+builder.add_edge("place_order_node", "respond_node")
 builder.add_edge("update_stock_node", "respond_node")
 builder.add_edge("respond_node", END)
 
@@ -1,6 +1,6 @@
 from typing import Annotated, Dict, Optional, Any
 
-from db_helper.orders_services import create_new_order
+from db_helper.orders_services import create_new_order, aplace_order
 from db_helper.product_services import check_product_stock, update_product_stock, get_product_by_id
 
 async def create_order(user_id: int, product_id: int, quantity: int) -> Dict[str, Any]:
@@ -61,4 +61,17 @@ async def update_stock(product_id: int, quantity: int) -> Dict[str, bool]:
 
     return {
         "stock_updated": True if updated else False,
-    }
\ No newline at end of file
+    }
+
+async def place_order(user_id: int, product_id: int, quantity: int) -> Dict[str, Any]:
+    """Đặt hàng trong một transaction: kiểm tra & trừ kho, tạo đơn hàng.
+
+    Args:
+        user_id (int): Mã người dùng.
+        product_id (int): Mã sản phẩm.
+        quantity (int): Số lượng sản phẩm.
+
+    Returns:
+        order_id, total_amount, order_created, stock_available và stock_updated
+    """
+    return await aplace_order(user_id, product_id, quantity)
@@ -1,16 +1,18 @@
 from langchain_core.runnables import RunnableConfig
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langgraph.graph import START, StateGraph, END
 from langchain_core.documents import Document
 from langchain_core.messages import BaseMessage
-from mxbai_rerank import MxbaiRerankV2
-from typing import TypedDict, cast, Dict, List, Any
+from typing import TypedDict, Literal, cast, Dict, List, Any
 from dotenv import load_dotenv
 import logging
 import asyncio
 import os
 
-from .tools import vector_search, full_text_search
+from agent.llm_registry import llm_registry
+from .tools import hybrid_product_search
+from .keyword_extractor import KEYWORD_EXTRACTOR, keyword_extractor
+from .rerank_executor import rerank_executor
+from .reranker import RERANK_MAX_LENGTH, RERANK_TOP_K
 from .prompt import GENERATE_QUERY_SYSTEM_PROMPT, RERANK_SYSTEM_PROMPT  
 from .states import RAGState
  
@@ -19,7 +21,10 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-GEMINI_MODEL = os.getenv('GEMINI_MODEL')
+
+class KeywordResponse(TypedDict):
+    vector_search_query: str
+    fts_keyword: str
 
 async def generates_keyword(
         state: RAGState, *, config: RunnableConfig
@@ -27,6 +32,10 @@ async def generates_keyword(
     """
     Generate search queries for vector and full-text search from a user query.
 
+    Uses Gemini by default. KEYWORD_EXTRACTOR="local" uses the deterministic
+    KeywordExtractor instead (normalization, synonyms, stopword removal), and
+    "fallback" uses it only when the Gemini call fails.
+
     Args:
         user_query (str): The raw user query or request text.
         config (RunnableConfig): Runtime configuration passed by the graph runner.
@@ -37,27 +46,50 @@ async def generates_keyword(
             - "fts_keyword": keyword(s) optimized for full-text search.
     """
 
-    class Response(TypedDict):
-        vector_search_query: str
-        fts_keyword: str
+    if KEYWORD_EXTRACTOR == "local":
+        response = keyword_extractor.extract(state.user_query)
+        logger.info(f"___local vts query: {response['vector_search_query']}, fts keyword: {response['fts_keyword']}")
+        return response
 
     logger.info("___generating queries...")
-    model = ChatGoogleGenerativeAI(model=GEMINI_MODEL)
     messages = [
         {"role": "system", "content": GENERATE_QUERY_SYSTEM_PROMPT},
         {"role": "human", "content": state.user_query}
     ]
-    response = cast(Response, await model.with_structured_output(Response).ainvoke(messages))
+    try:
+        response = cast(KeywordResponse, await llm_registry.get_structured_model(KeywordResponse).ainvoke(messages))
+    except Exception as e:
+        if KEYWORD_EXTRACTOR != "fallback":
+            raise
+        logger.error("Keyword generation failed, using the local keyword extractor", exc_info=e)
+        response = keyword_extractor.extract(state.user_query)
     logger.info(f"___vts query: {response['vector_search_query']}, fts keyword: {response['fts_keyword']}")
 
     return response
 
+def start_route(state: RAGState) -> Literal["generates_keyword", "hybrid_search"]:
+    """
+    Skip keyword generation when the caller already supplied the search queries.
+
+    Args:
+        state (RAGState): Initial state; the main graph's fused router may have set
+            vector_search_query and fts_keyword.
+
+    Returns:
+        Literal: 'hybrid_search' if the queries are present, otherwise 'generates_keyword'.
+    """
+
+    if state.vector_search_query and state.fts_keyword is not None:
+        logger.info("___using precomputed queries")
+        return "hybrid_search"
+    return "generates_keyword"
+
 async def hybrid_search(
     state: RAGState, *, config: RunnableConfig
 ) -> Dict[str, List[Document]]:
     """
-    Perform hybrid retrieval by running both vector search and full-text search,
-    then merge and deduplicate the results.
+    Perform hybrid retrieval: vector search and full-text search candidates are
+    fused with Reciprocal Rank Fusion inside Postgres in a single round trip.
 
     Args:
         state (RAGState): State object carrying the extraction results (expects
@@ -66,32 +98,15 @@ async def hybrid_search(
 
     Returns:
         Dict[str, List[Document]]: A dictionary with key:
-            - "retrieved_products": list of merged and deduplicated Document objects
-              returned from vector and full-text searches.
+            - "retrieved_products": list of Document objects ordered by RRF score.
     """
 
     logger.info("___retrieving products...")
-    results = await asyncio.gather(
-        vector_search(state.vector_search_query),
-        full_text_search(state.fts_keyword),
-        return_exceptions=True
-    )
-
-    vector_results, fts_results = results
-    if isinstance(vector_results, Exception):
-        logger.error("Vector search failed", exc_info=vector_results)
-        vector_results = []
-    if isinstance(fts_results, Exception):
-        logger.error("Full-text search failed", exc_info=fts_results)
-        fts_results = []
-
-    seen = set()
-    combined: List[Document] = []
-    for doc in vector_results + fts_results:
-        uid = doc.metadata.get("name")
-        if uid and uid not in seen:
-            combined.append(doc)
-            seen.add(uid)
+    try:
+        combined = await hybrid_product_search(state.vector_search_query, state.fts_keyword)
+    except Exception as e:
+        logger.error("Hybrid search failed", exc_info=e)
+        combined = []
 
     return {"retrieved_products": combined}
 
@@ -131,42 +146,77 @@ def format_products(products: List[Document]) -> str:
 
     return "\n".join(lines)
 
+def rerank_document(doc: Document, max_chars: int = RERANK_MAX_LENGTH * 4) -> str:
+    """
+    Build the text the cross-encoder scores for one candidate.
+
+    Name, author and category come first so they survive truncation; the
+    description is cut to `max_chars` before tokenization (the reranker then
+    truncates the pair to RERANK_MAX_LENGTH tokens).
+
+    Args:
+        doc (Document): Candidate product.
+        max_chars (int): Character budget for the description.
+
+    Returns:
+        str: Text to pair with the user query.
+    """
+
+    md = doc.metadata
+    lines = [
+        f"Tên: {md.get('name') or '—'}",
+        f"Tác giả: {md.get('author') or '—'}",
+        f"Thể loại: {md.get('category') or '—'}",
+    ]
+    desc = " ".join(doc.page_content.split())
+    if desc:
+        lines.append(f"Mô tả: {desc[:max_chars]}")
+    return "\n".join(lines)
+
 class RerankResponse(TypedDict):
-    reranked_list: list[str]
+    retrieved_products: List[Document]
     found: bool
 
 async def rerank(
         state: RAGState, *, config: RunnableConfig
-) -> Dict[str, RerankResponse]:
+) -> RerankResponse:
     """
-    Re-rank retrieved products according to the original user query using the LLM.
-    Updates state.retrieved_products and state.found.
+    Re-rank retrieved products against the original user query with the cross-encoder.
+    Each candidate is scored as its own (truncated) document and the scores are
+    mapped back onto the original Document objects.
 
     Args:
         state (RAGState): State containing state.user_query and state.retrieved_products.
         config (RunnableConfig): Runtime configuration passed by the graph runner.
 
     Returns:
-        Dict[str, RerankResponse]: A dictionary with keys:
-            - "retrieved_products": the reranked list (may be the original list on failure).
-            - "found" (bool): whether the LLM indicated relevant items were found.
+        RerankResponse: A dictionary with keys:
+            - "retrieved_products": Documents ordered by rerank score, each with
+              metadata["rerank_score"] (the original order on failure).
+            - "found" (bool): whether any candidate products were retrieved.
     """
 
     logger.info("___reranking...")
-    model = MxbaiRerankV2("mixedbread-ai/mxbai-rerank-base-v2")
     query = state.user_query
-    documents = format_products(state.retrieved_products)
+    candidates = state.retrieved_products
+    if not candidates:
+        return {"retrieved_products": [], "found": False}
 
     try:
-        results = model.rank(query, documents, return_documents=True, top_k=5)
+        results = await rerank_executor.rank(query, [rerank_document(doc) for doc in candidates], top_k=RERANK_TOP_K)
+        reranked = [
+            Document(
+                page_content=candidates[result.index].page_content,
+                metadata={**candidates[result.index].metadata, "rerank_score": result.score},
+            )
+            for result in results
+        ]
         logger.info("___rerank successed...")
-        found = True
     except Exception as e:
         logger.error("Rerank failed, fallback to original", exc_info=e)
-        results = state.retrieved_products
-        found = False
+        reranked = candidates[:RERANK_TOP_K]
 
-    return {"retrieved_products": results, "found": found}
+    return {"retrieved_products": reranked, "found": True}
 
 def respond(
         state: RAGState, *, config: RunnableConfig
@@ -181,16 +231,16 @@ def respond(
 
     Returns:
         Dict[str, Any]: A dictionary with key:
-            - "retrieved_products": top-N search results (or a user-facing message
-              string if no matching products were found).
+            - "retrieved_products": a one-item list with the formatted top-N products
+              (or a user-facing message if no matching products were found).
     """
 
     if state.found:
-        search_results = state.retrieved_products
+        search_results = [format_products(state.retrieved_products[:RERANK_TOP_K])]
     else:
-        search_results = "Không tìm thấy sản phẩm phù hợp!"
+        search_results = ["Không tìm thấy sản phẩm phù hợp!"]
     logger.info("___product retrieval completed...")
-    return {"retrieved_products": search_results[:5]}
+    return {"retrieved_products": search_results}
     
 
 builder = StateGraph(RAGState)
@@ -200,7 +250,7 @@ builder.add_node(hybrid_search)
 builder.add_node(rerank)
 builder.add_node(respond)
 
-builder.add_edge(START, "generates_keyword")
+builder.add_conditional_edges(START, start_route)
 builder.add_edge("generates_keyword", "hybrid_search")
 builder.add_edge("hybrid_search", "rerank")
 builder.add_edge("rerank", "respond")
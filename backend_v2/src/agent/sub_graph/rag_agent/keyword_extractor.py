@@ -0,0 +1,115 @@
+import os
+import re
+import json
+import unicodedata
+from dotenv import load_dotenv
+from db_helper.product_services import VIETNAMESE_STOPWORDS_PATH
+load_dotenv()
+
+# "llm": generates_keyword gọi Gemini; "local": chỉ dùng KeywordExtractor;
+# "fallback": gọi Gemini, lỗi (quota, timeout, mạng) thì dùng KeywordExtractor
+KEYWORD_EXTRACTOR = os.getenv("KEYWORD_EXTRACTOR", "llm")
+KEYWORD_STOPWORDS_PATH = os.getenv("KEYWORD_STOPWORDS_PATH", VIETNAMESE_STOPWORDS_PATH)
+# Bảng đồng nghĩa {từ trong catalog: [cách gọi khác]}, đặt rỗng để tắt
+KEYWORD_SYNONYMS_PATH = os.getenv(
+    "KEYWORD_SYNONYMS_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "..", "data", "keyword_synonyms.json"),
+)
+
+# Cụm hỏi đáp nhiều âm tiết chỉ bỏ khỏi câu hỏi. Không đưa vào vietnamese.stop vì Postgres chỉ đọc âm
+# tiết đầu của mỗi dòng và sẽ bỏ luôn "tác", "thể", ... khỏi nội dung sản phẩm
+QUERY_FILLER_PHRASES = (
+    "bao giờ", "bao nhiêu", "có bán", "còn hàng", "đề xuất", "giới thiệu", "gợi ý", "hay nhất",
+    "như thế nào", "tác giả", "thể loại",
+)
+
+# Dấu câu và ký hiệu thành khoảng trắng; giữ chữ, số và dấu tiếng Việt
+PUNCTUATION_PATTERN = re.compile(r"[^\w\s]")
+
+
+def strip_diacritics(text: str) -> str:
+    """Bỏ dấu tiếng Việt (kể cả đ -> d)."""
+    text = unicodedata.normalize("NFD", text).replace("đ", "d").replace("Đ", "D")
+    return unicodedata.normalize("NFC", "".join(ch for ch in text if unicodedata.category(ch) != "Mn"))
+
+
+def normalize_query(text: str) -> str:
+    """Dạng NFC, chữ thường, bỏ dấu câu.
+
+    Bàn phím / hệ điều hành khác nhau có thể gửi tiếng Việt ở dạng tổ hợp (NFD); Postgres so sánh
+    theo byte nên phải đưa về NFC giống dữ liệu sản phẩm thì full-text search mới khớp.
+    """
+    text = unicodedata.normalize("NFC", text).lower()
+    return " ".join(PUNCTUATION_PATTERN.sub(" ", text).split())
+
+
+class KeywordExtractor:
+    """Viết lại câu hỏi thành truy vấn tìm kiếm mà không cần LLM.
+
+    Tách theo âm tiết (khoảng trắng) đúng như parser của cấu hình `public.vietnamese`, thay cụm từ
+    đồng nghĩa bằng cách gọi trong catalog (so khớp cả khi người dùng gõ không dấu), rồi bỏ các
+    stopword trong cùng file Postgres dùng và các cụm hỏi đáp như "tác giả", "bao nhiêu". Kết quả:
+
+    - `fts_keyword`: các âm tiết còn lại, dùng cho plainto_tsquery (AND các từ);
+    - `vector_search_query`: câu hỏi gốc đã chuẩn hoá khoảng trắng. Embedding hiểu được câu đầy đủ,
+      và giữ nguyên văn bản để dùng lại embedding đã tính cho semantic cache / intent classifier.
+    """
+
+    def __init__(self, stopwords_path: str = KEYWORD_STOPWORDS_PATH, synonyms_path: str = KEYWORD_SYNONYMS_PATH,
+                 filler_phrases: tuple[str, ...] = QUERY_FILLER_PHRASES):
+        self.stopwords = self._load_stopwords(stopwords_path)
+        self.stopwords.update(tuple(normalize_query(phrase).split()) for phrase in filler_phrases)
+        self.synonyms: dict[tuple[str, ...], tuple[str, ...]] = {}
+        if synonyms_path:
+            self._load_synonyms(synonyms_path)
+        self.max_phrase_length = max((len(phrase) for phrase in [*self.stopwords, *self.synonyms]), default=1)
+
+    @staticmethod
+    def _load_stopwords(path: str) -> set[tuple[str, ...]]:
+        with open(path, encoding="utf-8") as f:
+            return {tuple(normalize_query(line).split()) for line in f if line.strip()}
+
+    def _add_synonym(self, phrase: str, canonical: tuple[str, ...]):
+        tokens = tuple(normalize_query(phrase).split())
+        if tokens:
+            self.synonyms.setdefault(tokens, canonical)
+            self.synonyms.setdefault(tuple(strip_diacritics(token) for token in tokens), canonical)
+
+    def _load_synonyms(self, path: str):
+        with open(path, encoding="utf-8") as f:
+            table = json.load(f)
+        for canonical, variants in table.items():
+            canonical_tokens = tuple(normalize_query(canonical).split())
+            # Từ trong catalog cũng được nhận dạng khi gõ không dấu ("trinh tham" -> "trinh thám")
+            for phrase in [canonical, *variants]:
+                self._add_synonym(phrase, canonical_tokens)
+
+    def rewrite(self, tokens: list[str]) -> list[str]:
+        """Tại mỗi vị trí, thay cụm đồng nghĩa dài nhất hoặc bỏ cụm stopword dài nhất."""
+        result, i = [], 0
+        while i < len(tokens):
+            for length in range(min(self.max_phrase_length, len(tokens) - i), 0, -1):
+                phrase = tuple(tokens[i:i + length])
+                if phrase in self.synonyms:
+                    result.extend(self.synonyms[phrase])
+                    break
+                if phrase in self.stopwords:
+                    break
+            else:
+                result.append(tokens[i])
+            i += length
+        return result
+
+    def extract(self, user_query: str) -> dict[str, str]:
+        keywords = []
+        for token in self.rewrite(normalize_query(user_query).split()):
+            if token not in keywords:
+                keywords.append(token)
+        return {
+            "vector_search_query": " ".join(unicodedata.normalize("NFC", user_query).split()),
+            "fts_keyword": " ".join(keywords),
+        }
+
+
+# Instance dùng chung, nạp stopword và bảng đồng nghĩa một lần
+keyword_extractor = KeywordExtractor()
@@ -0,0 +1,169 @@
+import os
+import json
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Optional
+import numpy as np
+from dotenv import load_dotenv
+load_dotenv()
+
+# "torch": MxbaiRerankV2 (PyTorch); "onnx": model ONNX (int8) xuất bằng scripts/export_reranker_onnx.py
+RERANK_BACKEND = os.getenv("RERANK_BACKEND", "torch")
+RERANK_ONNX_PATH = os.getenv("RERANK_ONNX_PATH", os.path.join("models", "mxbai-rerank-base-v2-onnx"))
+RERANK_ONNX_FILE = os.getenv("RERANK_ONNX_FILE", "model.int8.onnx")
+RERANK_NUM_THREADS = int(os.getenv("RERANK_NUM_THREADS", "0"))        # 0: để runtime tự chọn
+
+
+@dataclass
+class RankResult:
+    """Cùng dạng với mxbai_rerank.base.RankResult, định nghĩa lại để không phải import PyTorch."""
+    index: int
+    score: float
+    document: Optional[str]
+
+
+class RerankerBackend(ABC):
+    """Giao diện chung của các backend chấm điểm cặp (query, document) cho RerankerService."""
+
+    name: str
+
+    @abstractmethod
+    def load(self):
+        """Nạp model (gọi một lần, dưới khoá của RerankerService)."""
+
+    @abstractmethod
+    def predict(self, queries: list[str], documents: list[str]) -> np.ndarray:
+        """Trả về điểm liên quan (logit "1" - logit "0") cho từng cặp, cùng thang điểm với MxbaiRerankV2."""
+
+
+class TorchRerankerBackend(RerankerBackend):
+    name = "torch"
+
+    def __init__(self, model_name: str, device: str = "cpu", max_length: int = 512):
+        self.model_name = model_name
+        self.device = device
+        self.max_length = max_length
+        self.model = None
+
+    def load(self):
+        from mxbai_rerank import MxbaiRerankV2
+
+        if RERANK_NUM_THREADS:
+            import torch
+            torch.set_num_threads(RERANK_NUM_THREADS)
+        self.model = MxbaiRerankV2(self.model_name, device=self.device, max_length=self.max_length)
+
+    def predict(self, queries: list[str], documents: list[str]) -> np.ndarray:
+        return np.asarray(self.model.predict(queries, documents), dtype=np.float32)
+
+
+class MxbaiPromptFormatter:
+    """Chuẩn bị input giống hệt MxbaiRerankV2.prepare_inputs (prompt, chat template, truncation,
+    left padding) nhưng trả về numpy, để backend ONNX không phải import PyTorch.
+
+    Các chuỗi prompt sao chép từ mxbai_rerank/mxbai_rerank_v2.py; bench_reranker_backends.py
+    kiểm tra điểm của hai backend khớp nhau.
+    """
+
+    sep = "\n"
+    query_prompt = "query: {query}"
+    doc_prompt = "document: {document}"
+    task_prompt = "You are a search relevance expert who evaluates how well documents match search queries. For each query-document pair, carefully analyze the semantic relationship between them, then provide your binary relevance judgment (0 for not relevant, 1 for relevant).\nRelevance:"  # noqa: E501
+    chat_prefix = "<|im_start|>system\nYou are Qwen, created by Alibaba Cloud. You are a helpful assistant.<|im_end|>\n<|im_start|>user\n"  # noqa: E501
+    chat_suffix = "<|im_end|>\n<|im_start|>assistant\n"
+
+    def __init__(self, tokenizer, pad_token_id: int, model_max_length: int, max_length: int):
+        self.tokenizer = tokenizer
+        self.pad_token_id = pad_token_id
+        self.model_max_length = model_max_length
+        self.sep_ids = self._ids(self.sep)
+        self.prefix_ids = self._ids(self.chat_prefix)
+        self.suffix_ids = self._ids(self.chat_suffix)
+        self.task_ids = self._ids(self.task_prompt)
+        self.predefined_length = len(self.prefix_ids) + len(self.task_ids) + len(self.suffix_ids) + len(self.sep_ids)
+        self.max_length = min(max_length, model_max_length - self.predefined_length)
+
+    def _ids(self, text: str, max_length: Optional[int] = None) -> list[int]:
+        ids = self.tokenizer.encode(text, add_special_tokens=False).ids
+        return ids[:max_length] if max_length is not None else ids
+
+    def __call__(self, queries: list[str], documents: list[str]) -> dict[str, np.ndarray]:
+        rows = []
+        for query, document in zip(queries, documents):
+            query_ids = self._ids(self.query_prompt.format(query=query), self.max_length * 3 // 4)
+            doc_max_length = min(self.model_max_length - len(query_ids) - self.predefined_length, self.max_length)
+            doc_ids = self.sep_ids + self._ids(self.doc_prompt.format(document=document), doc_max_length)
+            # truncation="only_second": cắt phần document để cả cặp không vượt max_length
+            doc_ids = doc_ids[:max(0, self.max_length - len(query_ids))]
+            rows.append(self.prefix_ids + query_ids + doc_ids + self.sep_ids + self.task_ids + self.suffix_ids)
+
+        # Left padding tới độ dài dài nhất, làm tròn lên bội số của 8
+        length = -(-max(len(row) for row in rows) // 8) * 8
+        input_ids = np.full((len(rows), length), self.pad_token_id, dtype=np.int64)
+        attention_mask = np.zeros((len(rows), length), dtype=np.int64)
+        for i, row in enumerate(rows):
+            input_ids[i, length - len(row):] = row
+            attention_mask[i, length - len(row):] = 1
+        return {"input_ids": input_ids, "attention_mask": attention_mask}
+
+
+class OnnxRerankerBackend(RerankerBackend):
+    """Chạy reranker bằng ONNX Runtime trên CPU, không cần PyTorch lẫn transformers.
+
+    Thư mục `model_dir` (tạo bởi scripts/export_reranker_onnx.py) chứa model ONNX, tokenizer
+    và config; tokenizer được nạp thẳng từ tokenizer.json bằng thư viện `tokenizers`. Đồ thị ONNX chỉ tính hidden state cuối rồi nhân với hiệu hai hàng "1"/"0" của
+    lm_head, nên không phải tính logits trên toàn bộ vocab như bản PyTorch.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_dir: str = RERANK_ONNX_PATH, file_name: str = RERANK_ONNX_FILE,
+                 max_length: int = 512, num_threads: int = RERANK_NUM_THREADS):
+        self.model_dir = model_dir
+        self.file_name = file_name
+        self.max_length = max_length
+        self.num_threads = num_threads
+        self.session = None
+        self.formatter = None
+
+    def load(self):
+        try:
+            import onnxruntime as ort
+        except ImportError as err:
+            raise ImportError("Cần cài onnxruntime để dùng RERANK_BACKEND=onnx: pip install onnxruntime") from err
+        from tokenizers import Tokenizer
+
+        path = os.path.join(self.model_dir, self.file_name)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Không tìm thấy {path}, hãy chạy scripts/export_reranker_onnx.py trước")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.num_threads:
+            options.intra_op_num_threads = self.num_threads
+        self.session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+
+        tokenizer = Tokenizer.from_file(os.path.join(self.model_dir, "tokenizer.json"))
+        tokenizer.no_truncation()
+        tokenizer.no_padding()
+        with open(os.path.join(self.model_dir, "config.json"), encoding="utf-8") as f:
+            config = json.load(f)
+        with open(os.path.join(self.model_dir, "tokenizer_config.json"), encoding="utf-8") as f:
+            pad_token = json.load(f)["pad_token"]
+        if isinstance(pad_token, dict):
+            pad_token = pad_token["content"]
+        self.formatter = MxbaiPromptFormatter(tokenizer, tokenizer.token_to_id(pad_token),
+                                              config["max_position_embeddings"], self.max_length)
+
+    def predict(self, queries: list[str], documents: list[str]) -> np.ndarray:
+        (scores,) = self.session.run(["logits"], self.formatter(queries, documents))
+        return scores.astype(np.float32)
+
+
+def create_backend(backend: str = RERANK_BACKEND, model_name: Optional[str] = None,
+                   device: str = "cpu", max_length: int = 512) -> RerankerBackend:
+    if backend == "torch":
+        return TorchRerankerBackend(model_name, device=device, max_length=max_length)
+    if backend == "onnx":
+        return OnnxRerankerBackend(max_length=max_length)
+    raise ValueError(f"Unknown RERANK_BACKEND: {backend}")
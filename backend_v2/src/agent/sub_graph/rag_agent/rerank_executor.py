@@ -0,0 +1,135 @@
+import os
+import time
+import queue
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Optional
+import numpy as np
+from dotenv import load_dotenv
+
+from .rerank_backends import RankResult
+from .reranker import RerankerService, reranker
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+RERANK_MAX_BATCH = int(os.getenv("RERANK_MAX_BATCH", "32"))           # số cặp (query, document) mỗi lần forward
+RERANK_MAX_WAIT_MS = float(os.getenv("RERANK_MAX_WAIT_MS", "5"))      # thời gian chờ gom thêm request
+RERANK_QUEUE_DEPTH = int(os.getenv("RERANK_QUEUE_DEPTH", "64"))       # số request tối đa đang chờ
+
+
+class RerankQueueFull(Exception):
+    """Hàng đợi rerank đã đầy, request bị từ chối thay vì chờ vô hạn."""
+
+
+@dataclass
+class _RerankRequest:
+    query: str
+    documents: list[str]
+    top_k: int
+    future: Future = field(default_factory=Future)
+
+
+class RerankExecutor:
+    """Chạy rerank trên một worker thread riêng và gom các request đồng thời thành lô.
+
+    Request đến trong vòng `max_wait_ms` được gộp lại (tối đa `max_batch` cặp) và chấm điểm
+    trong cùng các lần forward, rồi tách kết quả trả về cho từng request. Event loop không bị
+    chặn trong lúc suy luận.
+    """
+
+    def __init__(self, service: RerankerService = reranker, max_batch: int = RERANK_MAX_BATCH,
+                 max_wait_ms: float = RERANK_MAX_WAIT_MS, queue_depth: int = RERANK_QUEUE_DEPTH):
+        self.service = service
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue_depth = queue_depth
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_depth)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.stats = {"requests": 0, "rejected": 0, "batches": 0, "pairs": 0, "failed": 0}
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="rerank-executor", daemon=True)
+                    self._thread.start()
+
+    def submit(self, query: str, documents: list[str], top_k: int = 5) -> Future:
+        self._ensure_started()
+        request = _RerankRequest(query=query, documents=list(documents), top_k=top_k)
+        try:
+            self._queue.put_nowait(request)
+        except queue.Full:
+            self.stats["rejected"] += 1
+            raise RerankQueueFull(f"rerank queue is full ({self.queue_depth} pending requests)")
+        self.stats["requests"] += 1
+        return request.future
+
+    async def rank(self, query: str, documents: list[str], top_k: int = 5) -> list[RankResult]:
+        if not documents:
+            return []
+        return await asyncio.wrap_future(self.submit(query, documents, top_k))
+
+    def _collect(self) -> list[_RerankRequest]:
+        batch = [self._queue.get()]
+        pairs = len(batch[0].documents)
+        deadline = time.monotonic() + self.max_wait
+        while pairs < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            batch.append(request)
+            pairs += len(request.documents)
+        return batch
+
+    def _run(self):
+        while True:
+            # Bỏ các request đã bị huỷ (vd: client ngắt kết nối); sau bước này future không thể bị huỷ nữa
+            batch = [request for request in self._collect() if request.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            queries = [request.query for request in batch for _ in request.documents]
+            documents = [document for request in batch for document in request.documents]
+            try:
+                scores = self.service.score_pairs(queries, documents, batch_size=self.max_batch)
+            except Exception as e:
+                logger.error("Batched rerank failed", exc_info=e)
+                self.stats["failed"] += len(batch)
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+
+            self.stats["batches"] += 1
+            self.stats["pairs"] += len(documents)
+            offset = 0
+            for request in batch:
+                request_scores = scores[offset:offset + len(request.documents)]
+                offset += len(request.documents)
+                top = np.argsort(-request_scores, kind="stable")[:request.top_k]
+                request.future.set_result([
+                    RankResult(index=int(i), score=float(request_scores[i]), document=request.documents[i])
+                    for i in top
+                ])
+
+    def get_stats(self) -> dict:
+        batches = self.stats["batches"]
+        return {
+            **self.stats,
+            "queue_size": self._queue.qsize(),
+            "queue_depth": self.queue_depth,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+            "avg_pairs_per_batch": self.stats["pairs"] / batches if batches else None,
+        }
+
+
+rerank_executor = RerankExecutor()
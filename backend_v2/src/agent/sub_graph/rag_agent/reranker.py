@@ -0,0 +1,109 @@
+import os
+import time
+import logging
+import threading
+from typing import Optional
+import numpy as np
+from dotenv import load_dotenv
+
+from .rerank_backends import RERANK_BACKEND, RankResult, RerankerBackend, create_backend
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+RERANK_MODEL = os.getenv("RERANK_MODEL", "mixedbread-ai/mxbai-rerank-base-v2")
+RERANK_DEVICE = os.getenv("RERANK_DEVICE", "cpu")
+# Số token tối đa của một cặp (query, document); phần dài hơn bị cắt bởi tokenizer của model
+RERANK_MAX_LENGTH = int(os.getenv("RERANK_MAX_LENGTH", "512"))
+# Số sản phẩm giữ lại sau rerank và đưa vào câu trả lời
+RERANK_TOP_K = int(os.getenv("RERANK_TOP_K", "5"))
+# Nạp model và chạy thử một lần lúc khởi động thay vì ở câu hỏi đầu tiên
+RERANK_WARMUP = os.getenv("RERANK_WARMUP", "false").lower() == "true"
+
+
+class RerankerService:
+    """Giữ một reranker dùng chung cho cả process (backend torch hoặc onnx, xem rerank_backends).
+
+    Model được nạp một lần (lười biếng ở lần gọi đầu tiên, hoặc ngay khi khởi động qua `warmup`),
+    có khoá để nhiều request đồng thời không nạp trùng. Ghi lại thời gian nạp và độ trễ mỗi lần rerank.
+    """
+
+    def __init__(self, model_name: str = RERANK_MODEL, device: str = RERANK_DEVICE,
+                 max_length: int = RERANK_MAX_LENGTH, backend: str = RERANK_BACKEND):
+        self.model_name = model_name
+        self.device = device
+        self.max_length = max_length
+        self.backend_name = backend
+        self._backend: Optional[RerankerBackend] = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            "load_seconds": None,
+            "calls": 0,
+            "documents": 0,
+            "total_inference_ms": 0.0,
+            "last_inference_ms": None,
+            "max_inference_ms": 0.0,
+        }
+
+    @property
+    def loaded(self) -> bool:
+        return self._backend is not None
+
+    def get_backend(self) -> RerankerBackend:
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    backend = create_backend(self.backend_name, self.model_name, device=self.device,
+                                             max_length=self.max_length)
+                    start = time.perf_counter()
+                    backend.load()
+                    self.stats["load_seconds"] = time.perf_counter() - start
+                    self._backend = backend
+                    logger.info(f"___reranker {self.model_name} ({backend.name}) loaded in {self.stats['load_seconds']:.1f}s")
+        return self._backend
+
+    def warmup(self):
+        """Nạp model và chạy một lần suy luận nhỏ để lần gọi thật không phải trả chi phí khởi tạo."""
+        self.rank("sách về mèo", ["Chuyện con mèo dạy hải âu bay"], top_k=1)
+
+    def _record(self, elapsed_ms: float, documents: int):
+        with self._stats_lock:
+            self.stats["calls"] += 1
+            self.stats["documents"] += documents
+            self.stats["total_inference_ms"] += elapsed_ms
+            self.stats["last_inference_ms"] = elapsed_ms
+            self.stats["max_inference_ms"] = max(self.stats["max_inference_ms"], elapsed_ms)
+
+    def rank(self, query: str, documents: list[str], top_k: int = 5) -> list[RankResult]:
+        scores = self.score_pairs([query] * len(documents), documents)
+        top = np.argsort(-scores, kind="stable")[:top_k]
+        return [RankResult(index=int(i), score=float(scores[i]), document=documents[i]) for i in top]
+
+    def score_pairs(self, queries: list[str], documents: list[str], batch_size: int = 32) -> np.ndarray:
+        """Chấm điểm từng cặp (query, document) theo lô `batch_size` cặp mỗi lần forward.
+
+        Các cặp được sắp theo độ dài document để mỗi lô ít phải padding.
+        """
+        backend = self.get_backend()
+        start = time.perf_counter()
+        scores = np.zeros(len(documents), dtype=np.float32)
+        order = sorted(range(len(documents)), key=lambda i: len(documents[i]))
+        for offset in range(0, len(order), batch_size):
+            indices = order[offset:offset + batch_size]
+            scores[indices] = backend.predict([queries[i] for i in indices], [documents[i] for i in indices])
+        self._record((time.perf_counter() - start) * 1000, len(documents))
+        return scores
+
+    def get_stats(self) -> dict:
+        calls = self.stats["calls"]
+        return {
+            **self.stats,
+            "model": self.model_name,
+            "backend": self.backend_name,
+            "loaded": self.loaded,
+            "avg_inference_ms": self.stats["total_inference_ms"] / calls if calls else None,
+        }
+
+
+reranker = RerankerService()
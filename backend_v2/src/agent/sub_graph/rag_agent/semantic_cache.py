@@ -0,0 +1,111 @@
+import os
+import time
+import threading
+from typing import Any, Optional
+import numpy as np
+from dotenv import load_dotenv
+load_dotenv()
+
+# Tắt mặc định: mỗi câu hỏi sản phẩm tốn thêm một lần embedding, và các câu ngắn chỉ khác tên sách / tác giả
+# vẫn có thể vượt ngưỡng similarity. Chỉ bật khi đã chỉnh SEMANTIC_CACHE_THRESHOLD trên dữ liệu thật
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "600"))                # giây
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2048"))
+
+
+class SemanticCache:
+    """Cache kết quả theo độ tương đồng ngữ nghĩa của câu hỏi.
+
+    Embedding (đã chuẩn hoá độ dài) của các câu hỏi được giữ trong một ma trận float32 cấp phát
+    sẵn, nên một lần tra cứu chỉ là một phép nhân ma trận-vector. Câu hỏi mới trả về kết quả cũ
+    khi cosine similarity >= `threshold` và bản ghi chưa hết hạn (`ttl`).
+
+    Cache nằm trong bộ nhớ của từng process: `invalidate` (gọi qua notify_product_change) chỉ xoá
+    cache của process hiện tại. Thay đổi sản phẩm từ process khác (ingest, reembed, worker uvicorn
+    khác) không tới được đây, nên kết quả cũ có thể được trả về tối đa `ttl` giây.
+    """
+
+    def __init__(self, threshold: float = SEMANTIC_CACHE_THRESHOLD, ttl: float = SEMANTIC_CACHE_TTL,
+                 max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None       # (max_entries, dim), cấp phát ở lần put đầu tiên
+        self._expires_at = np.zeros(max_entries, dtype=np.float64)
+        self._last_used = np.zeros(max_entries, dtype=np.float64)
+        self._values: list[Any] = [None] * max_entries
+        self._size = 0
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    @staticmethod
+    def _normalize(vector) -> Optional[np.ndarray]:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if vector.ndim != 1 or norm == 0:
+            return None
+        return vector / norm
+
+    def get(self, vector) -> Optional[Any]:
+        query = self._normalize(vector)
+        with self._lock:
+            if query is None or self._size == 0 or query.shape[0] != self._vectors.shape[1]:
+                self.stats["misses"] += 1
+                return None
+
+            now = time.monotonic()
+            scores = self._vectors[:self._size] @ query
+            scores[self._expires_at[:self._size] <= now] = -np.inf
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.stats["misses"] += 1
+                return None
+
+            self._last_used[best] = now
+            self.stats["hits"] += 1
+            return self._values[best]
+
+    def put(self, vector, value: Any):
+        item = self._normalize(vector)
+        if item is None:
+            return
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != item.shape[0]:
+                # Lần đầu hoặc đổi model embedding: cấp phát lại ma trận
+                self._vectors = np.zeros((self.max_entries, item.shape[0]), dtype=np.float32)
+                self._size = 0
+
+            now = time.monotonic()
+            if self._size < self.max_entries:
+                slot = self._size
+                self._size += 1
+            else:
+                # Ưu tiên ghi đè bản ghi đã hết hạn, nếu không thì bản ghi lâu không dùng nhất
+                expired = np.flatnonzero(self._expires_at <= now)
+                slot = int(expired[0]) if expired.size else int(np.argmin(self._last_used))
+
+            self._vectors[slot] = item
+            self._expires_at[slot] = now + self.ttl
+            self._last_used[slot] = now
+            self._values[slot] = value
+
+    def invalidate(self, *_):
+        """Xoá toàn bộ cache (vd: khi giá hoặc tồn kho sản phẩm thay đổi)."""
+        with self._lock:
+            self._size = 0
+            self._values = [None] * self.max_entries
+            self.stats["invalidations"] += 1
+
+    def get_stats(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+            "entries": self._size,
+            "threshold": self.threshold,
+            "ttl": self.ttl,
+        }
+
+
+semantic_cache = SemanticCache()
@@ -1,7 +1,7 @@
 from langchain_core.documents import Document
 
-from db_helper.product_services import get_product_by_name, get_related_product_by_vector, get_related_product_by_word
-from .embedding import GeminiEmbedding
+from db_helper.product_services import get_product_by_name, aget_related_product_by_vector, aget_related_product_by_word, ahybrid_search
+from .embedding import embedding_provider
 
 async def vector_search(query: str, k: int=5) -> list[Document]:
     """Tìm kiếm sản phẩm dựa trên query của người dùng.
@@ -13,10 +13,9 @@ async def vector_search(query: str, k: int=5) -> list[Document]:
     Returns:
         str: Danh sách thông tin sản phẩm nếu tìm thấy.
     """
-    embedding = GeminiEmbedding()
     print(query)
-    query_vector = embedding.get_embedding(query)
-    results = get_related_product_by_vector(query_vector, k=5)
+    query_vector = await embedding_provider.aget_embedding(query)
+    results = await aget_related_product_by_vector(query_vector, k=k)
     related_products: list[Document] = []
     
     if results:
@@ -48,7 +47,7 @@ async def full_text_search(keyword: str, k: int=5) -> list[Document]:
     Returns:
         str: Danh sách thông tin sản phẩm nếu tìm thấy.
     """
-    related_products = get_related_product_by_word(keyword, k)
+    related_products = await aget_related_product_by_word(keyword, k)
     
     products: list[Document]= []
 
@@ -71,6 +70,40 @@ async def full_text_search(keyword: str, k: int=5) -> list[Document]:
     # print(products)
     return products
     
+async def hybrid_product_search(query: str, keyword: str, k: int=10) -> list[Document]:
+    """Tìm kiếm kết hợp vector + full-text (RRF tính trong Postgres, một round trip).
+
+    Args:
+        query (str): truy vấn cho vector search.
+        keyword (str): keyword cho full-text search.
+        k (int): số sản phẩm trả về.
+
+    Returns:
+        list[Document]: Danh sách sản phẩm đã xếp hạng theo điểm RRF.
+    """
+    query_vector = await embedding_provider.aget_embedding(query)
+    results = await ahybrid_search(keyword, query_vector, k=k)
+    products: list[Document] = []
+
+    if results:
+        for item in results:
+            product = Document(
+                page_content=item.get('description') or "",
+                metadata={
+                    "id": item.get('id'),
+                    "name": item.get('name'),
+                    "author": item.get('author'),
+                    "category": item.get('category'),
+                    "highlight": item.get('high_light'),
+                    "price": item.get('price') if item.get('price') else "Liên hệ đế trao đổi giá chi tiết.",
+                    "score": item.get('rrf_score', item.get('rank')),
+                }
+            )
+
+            products.append(product)
+
+    return products
+    
 def product_search_by_name(product_name: str) -> str:
     """Tìm kiếm sản phẩm dựa trên tên sản phẩm.
 
@@ -1,7 +1,13 @@
 import os
+import asyncio
+import threading
+from contextlib import asynccontextmanager
 import dotenv
 import psycopg
+from psycopg.conninfo import make_conninfo
 from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool, ConnectionPool
+from pgvector.psycopg import register_vector, register_vector_async
 
 
 dotenv.load_dotenv()
@@ -12,15 +18,135 @@ db_password = os.getenv("DB_PASSWORD")
 db_host = os.getenv("DB_HOST")
 db_port = os.getenv("DB_PORT")
 
+# Cấu hình connection pool
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", "300"))            # giây
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))               # giây chờ lấy connection
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "5000"))
+
+conninfo = make_conninfo(
+    host=db_host,
+    dbname=db_name,
+    user=db_user,
+    password=db_password,
+    port=db_port,
+)
+
+connection_kwargs = {
+    "row_factory": dict_row,    #Trả về kết quả dưới dạng dictionary thay vì tuple
+    "options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}",
+}
+
+
+def _configure_connection(conn):
+    # Đăng ký adapter pgvector để vector được gửi/nhận ở dạng binary thay vì chuỗi số thập phân
+    try:
+        register_vector(conn)
+        conn.commit()
+    except psycopg.ProgrammingError:
+        # Extension vector chưa được tạo (trước khi chạy configuration_for_search)
+        conn.rollback()
+
+
+async def _configure_async_connection(conn):
+    try:
+        await register_vector_async(conn)
+        await conn.commit()
+    except psycopg.ProgrammingError:
+        await conn.rollback()
+
+
+# Pool đồng bộ cho các service cũ và các script khởi tạo DB
+pool = ConnectionPool(
+    conninfo,
+    kwargs=connection_kwargs,
+    min_size=DB_POOL_MIN_SIZE,
+    max_size=DB_POOL_MAX_SIZE,
+    max_idle=DB_POOL_MAX_IDLE,
+    timeout=DB_POOL_TIMEOUT,
+    configure=_configure_connection,
+    name="db_helper-sync",
+    open=False,
+)
+
+# Pool bất đồng bộ dùng chung cho toàn bộ process (mở khi FastAPI khởi động)
+async_pool = AsyncConnectionPool(
+    conninfo,
+    kwargs=connection_kwargs,
+    min_size=DB_POOL_MIN_SIZE,
+    max_size=DB_POOL_MAX_SIZE,
+    max_idle=DB_POOL_MAX_IDLE,
+    timeout=DB_POOL_TIMEOUT,
+    configure=_configure_async_connection,
+    name="db_helper-async",
+    open=False,
+)
+
+_pool_lock = threading.Lock()
+_async_pool_lock = asyncio.Lock()
+
+
+def _ensure_sync_pool_open():
+    # Mở pool một cách lười biếng khi chạy script ngoài FastAPI (vd: init_db)
+    if pool.closed:
+        with _pool_lock:
+            if pool.closed:
+                pool.open()
+
+
 def get_db_connection():
-    return psycopg.connect(
-        host=db_host,
-        dbname=db_name,
-        user=db_user,
-        password=db_password,
-        port=db_port,
-        row_factory=dict_row    #Trả về kết quả dưới dạng dictionary thay vì tuple
-    )
+    """Mượn một connection từ pool; trả lại pool khi thoát khỏi khối `with`."""
+    _ensure_sync_pool_open()
+    return pool.connection()
+
+
+async def _ensure_async_pool_open():
+    # Graph chạy qua `langgraph dev` không đi qua lifespan của FastAPI
+    if async_pool.closed:
+        async with _async_pool_lock:
+            if async_pool.closed:
+                await async_pool.open()
+
+
+@asynccontextmanager
+async def get_async_db_connection():
+    """Mượn một AsyncConnection từ pool; dùng với `async with`."""
+    await _ensure_async_pool_open()
+    async with async_pool.connection() as conn:
+        yield conn
+
+
+def get_maintenance_connection():
+    """Mở một connection riêng, không qua pool và không giới hạn statement_timeout; đóng khi thoát khối `with`.
+
+    Dùng cho DDL, migrate, build index và xoá dữ liệu cũ: trên catalog lớn các lệnh này chạy lâu hơn
+    DB_STATEMENT_TIMEOUT_MS nhiều và không nên giữ một connection của pool trong lúc chạy.
+    """
+    conn = psycopg.connect(conninfo, row_factory=dict_row, options="-c statement_timeout=0")
+    _configure_connection(conn)
+    return conn
+
+
+async def open_db_pool():
+    _ensure_sync_pool_open()
+    await _ensure_async_pool_open()
+
+
+async def close_db_pool():
+    if not async_pool.closed:
+        await async_pool.close()
+    if not pool.closed:
+        pool.close()
+
+
+def get_pool_stats() -> dict:
+    """Thống kê sử dụng pool (số connection, số request đang chờ, thời gian chờ...)."""
+    return {
+        "sync": {**pool.get_stats(), "closed": pool.closed},
+        "async": {**async_pool.get_stats(), "closed": async_pool.closed},
+    }
+
 
 if __name__ == "__main__":
     try:
@@ -28,5 +154,8 @@ if __name__ == "__main__":
             with conn.cursor() as cur:
                 cur.execute("SELECT version();")
                 print(cur.fetchone())   # với dict_row -> dict
+        print(get_pool_stats())
     except Exception as e:
         print("Lỗi khi test kết nối:", e)
+    finally:
+        pool.close()
@@ -0,0 +1,200 @@
+import os
+import time
+import argparse
+from decimal import Decimal
+from typing import Iterator, Optional
+import numpy as np
+import pandas as pd
+from pgvector.psycopg import register_vector
+from .db_connection import get_maintenance_connection
+from .vector_index import EMBEDDING_DIMENSION, build_vector_index, set_vector_dimension, to_vector
+from .product_services import migrate_name_search, migrate_search_vector, notify_product_change
+
+
+DEFAULT_DATA_PATH = os.path.join(os.path.dirname(__file__), "data", "embedding_data.csv")
+DEFAULT_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "5000"))
+
+# Cột ghi vào bảng Product và kiểu Postgres tương ứng cho COPY ... (FORMAT BINARY)
+PRODUCT_COLUMNS = ["name", "author", "category", "highlight", "description", "image_url", "embedding_vector", "price"]
+PRODUCT_COLUMN_TYPES = ["varchar", "varchar", "varchar", "text", "text", "varchar", "vector", "numeric"]
+
+
+def iter_chunks(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """Đọc file CSV/Parquet theo từng chunk để bộ nhớ không phụ thuộc kích thước catalog."""
+    if path.endswith(".parquet"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as err:
+            raise ImportError("Cần cài pyarrow để đọc file parquet: pip install pyarrow") from err
+
+        parquet_file = pq.ParquetFile(path)
+        # Giữ thêm cột summarize để embed_chunk có văn bản tóm tắt
+        columns = [c for c in parquet_file.schema_arrow.names if c in PRODUCT_COLUMNS or c == "summarize"]
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size)
+
+
+def parse_embedding(value) -> Optional[np.ndarray]:
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    if isinstance(value, str):
+        value = value.strip().strip("[]").split(",")
+    return to_vector(value)
+
+
+def _clean(value):
+    # pandas dùng NaN cho ô trống; COPY cần None
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    return value
+
+
+def product_embedding_text(record: dict) -> str:
+    """Văn bản dùng để tính embedding của một sản phẩm.
+
+    Ưu tiên cột `summarize` (bản tóm tắt đã dùng để tạo embedding_data.csv), nếu không có thì ghép
+    tên, tác giả, thể loại và mô tả.
+    """
+    summary = _clean(record.get("summarize"))
+    if summary:
+        return summary
+    fields = [("Tên", "name"), ("Tác giả", "author"), ("Thể loại", "category"), ("Mô tả", "description")]
+    return "\n".join(f"{label}: {record[key]}" for label, key in fields if _clean(record.get(key)))
+
+
+def embed_chunk(df: pd.DataFrame, embedding_provider, mode: str = "missing") -> list[Optional[np.ndarray]]:
+    """Tính embedding cho một chunk bằng EmbeddingProvider.
+
+    mode="missing" chỉ tính cho dòng chưa có embedding_vector, mode="all" tính lại toàn bộ
+    (vd: khi chuyển sang model/provider khác).
+    """
+    records = df.to_dict("records")
+    vectors = [None if mode == "all" else parse_embedding(record.get("embedding_vector")) for record in records]
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    if missing:
+        computed = embedding_provider.get_embeddings([product_embedding_text(records[i]) for i in missing])
+        for i, vector in zip(missing, computed):
+            vectors[i] = to_vector(vector)
+    return vectors
+
+
+def iter_rows(df: pd.DataFrame, image_url: str, embeddings: Optional[list] = None) -> Iterator[tuple]:
+    for i, record in enumerate(df.to_dict("records")):
+        price = _clean(record.get("price"))
+        yield (
+            _clean(record.get("name")),
+            _clean(record.get("author")),
+            _clean(record.get("category")),
+            _clean(record.get("highlight")),
+            _clean(record.get("description")),
+            _clean(record.get("image_url")) or image_url,
+            embeddings[i] if embeddings is not None else parse_embedding(record.get("embedding_vector")),
+            Decimal(str(price)) if price is not None else None,
+        )
+
+
+def _prepare_product_table(cursor, vector_size: int):
+    cursor.execute("CREATE EXTENSION IF NOT EXISTS vector;")
+    set_vector_dimension(cursor, vector_size)
+
+    # Bỏ index trước khi nạp, build lại một lần sau khi nạp xong
+    cursor.execute("""
+        SELECT indexname FROM pg_indexes
+        WHERE tablename = 'product' AND (indexdef LIKE '%(embedding_vector%' OR indexname = 'idx_product_search_vector'
+                                          OR indexname = 'idx_product_name_trgm');
+    """)
+    for row in cursor.fetchall():
+        cursor.execute(f'DROP INDEX IF EXISTS "{row["indexname"]}";')
+
+
+def _has_search_vector(cursor) -> bool:
+    # Cột search_vector chỉ có sau khi chạy configuration_for_search
+    cursor.execute("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'product' AND column_name = 'search_vector';
+    """)
+    return cursor.fetchone() is not None
+
+
+def _has_name_search(cursor) -> bool:
+    # Index trigram cần pg_trgm, được cài bởi configuration_for_search
+    cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm';")
+    return cursor.fetchone() is not None
+
+
+def ingest_products(path: str = DEFAULT_DATA_PATH, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                    image_url: str = "img.png", vector_size: int = EMBEDDING_DIMENSION, build_indexes: bool = True,
+                    embedding_provider=None, embed: str = "missing") -> int:
+    """Nạp catalog sản phẩm bằng COPY ... FROM STDIN (FORMAT BINARY), đọc file theo từng chunk.
+
+    Args:
+        path (str): Đường dẫn file CSV hoặc Parquet.
+        chunk_size (int): Số dòng đọc mỗi lần.
+        image_url (str): Ảnh mặc định khi file không có cột image_url.
+        vector_size (int): Số chiều của embedding.
+        build_indexes (bool): Build lại index vector và GIN sau khi nạp.
+        embedding_provider (EmbeddingProvider): Nếu có, dùng để tính embedding thay vì chỉ đọc cột
+            embedding_vector của file; số chiều lấy theo provider.
+        embed (str): "missing" (chỉ dòng thiếu embedding) hoặc "all" (tính lại toàn bộ).
+
+    Returns:
+        int: Số dòng đã nạp.
+    """
+    if embedding_provider is not None:
+        vector_size = embedding_provider.dimension
+
+    total = 0
+    start = time.perf_counter()
+    with get_maintenance_connection() as conn:
+        with conn.cursor() as cursor:
+            _prepare_product_table(cursor, vector_size)
+        # Connection có thể được mở trước khi có kiểu vector, đăng ký lại adapter cho chắc chắn.
+        # Cursor sao chép bảng adapter của connection lúc được tạo nên phải mở cursor mới cho COPY
+        register_vector(conn)
+        with conn.cursor() as cursor:
+            columns = ", ".join(PRODUCT_COLUMNS)
+            with cursor.copy(f"COPY Product ({columns}) FROM STDIN (FORMAT BINARY)") as copy:
+                copy.set_types(PRODUCT_COLUMN_TYPES)
+                for chunk in iter_chunks(path, chunk_size):
+                    embeddings = embed_chunk(chunk, embedding_provider, embed) if embedding_provider is not None else None
+                    for row in iter_rows(chunk, image_url, embeddings):
+                        copy.write_row(row)
+                    total += len(chunk)
+                    elapsed = time.perf_counter() - start
+                    print(f"Đã nạp {total} dòng ({total / elapsed:,.0f} dòng/giây)")
+
+            load_time = time.perf_counter() - start
+            if build_indexes:
+                if _has_search_vector(cursor):
+                    migrate_search_vector(cursor)
+                if _has_name_search(cursor):
+                    migrate_name_search(cursor)
+                build_vector_index(cursor)
+        conn.commit()
+    notify_product_change()
+
+    elapsed = time.perf_counter() - start
+    print(f"Hoàn tất: {total} dòng, nạp {load_time:.1f}s ({total / load_time:,.0f} dòng/giây), "
+          f"tổng cộng kể cả build index {elapsed:.1f}s")
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Nạp catalog sản phẩm (CSV/Parquet) vào bảng Product bằng COPY")
+    parser.add_argument("path", nargs="?", default=DEFAULT_DATA_PATH)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--image-url", default="img.png")
+    parser.add_argument("--vector-size", type=int, default=EMBEDDING_DIMENSION)
+    parser.add_argument("--skip-indexes", action="store_true", help="không build lại index sau khi nạp")
+    parser.add_argument("--embed", choices=["missing", "all"],
+                        help="tính embedding bằng EMBEDDING_PROVIDER cho dòng thiếu embedding hoặc cho tất cả")
+    args = parser.parse_args()
+
+    provider = None
+    if args.embed:
+        from agent.sub_graph.rag_agent.embedding import embedding_provider as provider
+
+    ingest_products(args.path, args.chunk_size, args.image_url, args.vector_size, not args.skip_indexes,
+                    provider, args.embed or "missing")
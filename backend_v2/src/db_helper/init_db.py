@@ -1,17 +1,14 @@
-import pandas as pd
-from sqlalchemy import create_engine, text
 from .user_services import insert_user
 from .db_connection import get_db_connection
-from .db_connection import db_name, db_user, db_password, db_host, db_port
 from .chat_history_services import creat_db_chat_history_table
 from .product_services import configuration_for_search
+from .ingest_products import ingest_products
 
 
 
 def init_db_tables():
     try:
         with get_db_connection() as conn:
-            conn.autocommit = True
             with conn.cursor() as cursor:
                 create_user_table = """
                 CREATE TABLE IF NOT EXISTS "user" (
@@ -59,31 +56,19 @@ def init_db_tables():
 
                 cursor.execute(create_order_table)
                 print("Bảng Order đã được tạo thành công!")
+            conn.commit()
 
-                creat_db_chat_history_table()
+        creat_db_chat_history_table()
 
-                print("Tất cả các bảng đã được tạo thành công!")
+        print("Tất cả các bảng đã được tạo thành công!")
 
     except Exception as error:
         print(f"Lỗi khi tạo bảng: {error}")
 
-    finally:
-        if 'cursor' in locals():
-            cursor.close()
-        if 'conn' in locals():
-            conn.close()
-            print("Kết nối đến PostgreSQL đã đóng.")
-
 
 def seed_product_data():
-    df = pd.read_csv(r'src\data\embedding_data.csv')
-    df = df.drop(columns=['description_length', 'full_description', 'summarize'], errors='ignore')
-    df['image_url'] = "img.png"
-
-    engine = create_engine(f'postgresql+psycopg2://{db_user}:{db_password}@{db_host}/{db_name}')
-    print("connected!")
-    # Upload dữ liệu vào bảng Product
-    df.to_sql('product', engine, if_exists='append', index=False)
+    # Nạp catalog bằng COPY binary theo từng chunk (xem ingest_products.py)
+    ingest_products()
     print("Thêm product data thành công!")
 
 def seed_data():
@@ -102,6 +87,7 @@ def seed_data():
 
 if __name__ == "__main__":
     init_db_tables()
-    seed_data()
+    # Cấu hình search trước khi nạp dữ liệu; index được build lại một lần sau khi nạp
     configuration_for_search()
+    seed_data()
     
@@ -1,7 +1,23 @@
 from typing import Optional, Dict, List
-from .init_db import get_db_connection
+from .db_connection import get_db_connection, get_async_db_connection
+from .product_services import notify_product_change
 from decimal import Decimal
 
+# Trừ kho có điều kiện và tạo đơn hàng trong cùng một câu lệnh (một transaction, một round trip).
+# Row lock của UPDATE đảm bảo hai người mua cùng lúc không thể cùng vượt qua bước kiểm tra tồn kho.
+PLACE_ORDER_QUERY = """
+    WITH reserved AS (
+        UPDATE Product
+        SET stock_quantity = stock_quantity - %(quantity)s
+        WHERE id = %(product_id)s AND stock_quantity >= %(quantity)s
+        RETURNING id, price, stock_quantity
+    )
+    INSERT INTO "order" (user_id, product_id, quantity, total_amount)
+    SELECT %(user_id)s, id, %(quantity)s, price * %(quantity)s
+    FROM reserved
+    RETURNING id, total_amount, (SELECT stock_quantity FROM reserved) AS stock_available;
+"""
+
 def create_new_order(user_id: int, product_id: int, quantity: int, total_amount: float) -> Optional[int]:
     try:
         with get_db_connection() as conn:
@@ -13,7 +29,7 @@ def create_new_order(user_id: int, product_id: int, quantity: int, total_amount:
                                """, 
                                 (user_id, product_id, quantity, total_amount)
                                 )
-                new_order_id = cursor.fetchone()[0]
+                new_order_id = cursor.fetchone()['id']
                 conn.commit()
                 return new_order_id
     except Exception as e:
@@ -35,4 +51,45 @@ def get_all_orders(user_id: int) -> Optional[List[Dict]]:
                 return results
     except Exception as e:
         print(e)
-        return None
\ No newline at end of file
+        return None
+
+async def aplace_order(user_id: int, product_id: int, quantity: int) -> Dict:
+    """Đặt hàng nguyên tử: trừ kho (nếu đủ hàng) và tạo đơn trong một transaction.
+
+    Returns:
+        Dict: `order_created`, `order_id`, `total_amount`, `stock_available`, `stock_updated`.
+    """
+    if not quantity or quantity <= 0:
+        return {"order_created": False, "stock_updated": False}
+    try:
+        async with get_async_db_connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(PLACE_ORDER_QUERY, {
+                    "user_id": user_id,
+                    "product_id": product_id,
+                    "quantity": quantity,
+                })
+                order = await cursor.fetchone()
+
+                if order is None:
+                    # Không đủ hàng hoặc sản phẩm không tồn tại: đọc lại tồn kho để phản hồi người dùng
+                    await cursor.execute("SELECT stock_quantity FROM Product WHERE id = %s;", (product_id,))
+                    product = await cursor.fetchone()
+                    return {
+                        "order_created": False,
+                        "stock_updated": False,
+                        "stock_available": product['stock_quantity'] if product else None,
+                    }
+
+            await conn.commit()
+            notify_product_change(product_id)
+            return {
+                "order_created": True,
+                "stock_updated": True,
+                "order_id": order['id'],
+                "total_amount": order['total_amount'],
+                "stock_available": order['stock_available'],
+            }
+    except Exception as e:
+        print(e)
+        return {"order_created": False, "stock_updated": False}
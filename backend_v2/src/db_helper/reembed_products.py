@@ -0,0 +1,240 @@
+import os
+import time
+import asyncio
+import hashlib
+import argparse
+from typing import Optional
+from dotenv import load_dotenv
+from .db_connection import get_async_db_connection, get_maintenance_connection, close_db_pool
+from .vector_index import needs_reindex, reindex_vector_index, set_vector_dimension, to_vector
+from .ingest_products import product_embedding_text
+from .product_services import notify_product_change
+load_dotenv()
+
+REEMBED_BATCH_SIZE = int(os.getenv("REEMBED_BATCH_SIZE", "100"))              # sản phẩm mỗi lần gọi provider
+REEMBED_CONCURRENCY = int(os.getenv("REEMBED_CONCURRENCY", "4"))              # số lô embed đồng thời
+REEMBED_REQUESTS_PER_MINUTE = int(os.getenv("REEMBED_REQUESTS_PER_MINUTE", "0"))  # 0: không giới hạn
+REEMBED_MAX_RETRIES = int(os.getenv("REEMBED_MAX_RETRIES", "3"))
+REEMBED_PAGE_SIZE = int(os.getenv("REEMBED_PAGE_SIZE", "1000"))               # số dòng đọc mỗi lần từ DB
+
+# Đọc theo keyset (id tăng dần) để không phải OFFSET trên catalog lớn
+PRODUCT_PAGE_QUERY = """
+    SELECT id, name, author, category, description, embedding_model, embedding_hash,
+           embedding_vector IS NULL AS missing
+    FROM Product
+    WHERE id > %s
+    ORDER BY id
+    LIMIT %s;
+"""
+
+UPDATE_FROM_BATCH_QUERY = """
+    UPDATE Product AS p
+    SET embedding_vector = b.embedding_vector,
+        embedding_model = b.embedding_model,
+        embedding_hash = b.embedding_hash
+    FROM reembed_batch AS b
+    WHERE p.id = b.id;
+"""
+
+
+def embedding_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def prepare_embedding_columns(vector_size: int) -> bool:
+    """Thêm cột ghi lại model và hash văn bản của từng embedding, đưa cột vector về đúng số chiều.
+
+    Hai cột này cho biết dòng nào đã được embed bằng model hiện tại từ đúng nội dung hiện tại, nhờ vậy
+    job có thể dừng giữa chừng rồi chạy lại mà không phải embed lại những dòng đã xong.
+
+    Returns:
+        bool: True nếu index vector cần build lại sau khi embed: số chiều vừa đổi ở lần chạy này hoặc ở
+            một lần chạy trước chưa build lại xong index.
+    """
+    with get_maintenance_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                ALTER TABLE Product
+                ADD COLUMN IF NOT EXISTS embedding_model TEXT,
+                ADD COLUMN IF NOT EXISTS embedding_hash TEXT;
+            """)
+            set_vector_dimension(cursor, vector_size)
+            reindex = needs_reindex(cursor)
+        conn.commit()
+    return reindex
+
+
+class RateLimiter:
+    """Giới hạn số request mỗi phút bằng cách giãn đều thời điểm bắt đầu các request."""
+
+    def __init__(self, requests_per_minute: int = 0):
+        self.interval = 60 / requests_per_minute if requests_per_minute > 0 else 0
+        self._next_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next_at - now
+            self._next_at = max(now, self._next_at) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+def _needs_embedding(row: dict, model_name: str, digest: str, only_missing: bool, force: bool) -> bool:
+    if force or row["missing"]:
+        return True
+    if only_missing:
+        return False
+    return row["embedding_model"] != model_name or row["embedding_hash"] != digest
+
+
+async def _fetch_page(after_id: int, page_size: int) -> list[dict]:
+    async with get_async_db_connection() as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute(PRODUCT_PAGE_QUERY, (after_id, page_size))
+            return await cursor.fetchall()
+
+
+async def _write_batch(rows: list[tuple]):
+    """Ghi một lô embedding: COPY vào bảng tạm rồi một câu UPDATE ... FROM."""
+    async with get_async_db_connection() as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute("""
+                CREATE TEMP TABLE reembed_batch (
+                    id INT PRIMARY KEY,
+                    embedding_vector vector,
+                    embedding_model TEXT,
+                    embedding_hash TEXT
+                ) ON COMMIT DROP;
+            """)
+            async with cursor.copy("COPY reembed_batch FROM STDIN (FORMAT BINARY)") as copy:
+                copy.set_types(["int4", "vector", "text", "text"])
+                for row in rows:
+                    await copy.write_row(row)
+            await cursor.execute(UPDATE_FROM_BATCH_QUERY)
+
+
+async def _embed_with_retry(embedding_provider, texts: list[str], limiter: RateLimiter,
+                            max_retries: int) -> Optional[list]:
+    for attempt in range(max_retries + 1):
+        await limiter.acquire()
+        try:
+            return await embedding_provider.aget_embeddings(texts)
+        except Exception as e:
+            if attempt == max_retries:
+                print(f"Lỗi khi embed lô {len(texts)} sản phẩm ({type(e).__name__}): {e}")
+                return None
+            # Lỗi tạm thời (quota, mạng): chờ lâu dần rồi thử lại
+            await asyncio.sleep(2 ** attempt)
+
+
+async def reembed_products(embedding_provider, only_missing: bool = False, force: bool = False,
+                           batch_size: int = REEMBED_BATCH_SIZE, concurrency: int = REEMBED_CONCURRENCY,
+                           requests_per_minute: int = REEMBED_REQUESTS_PER_MINUTE,
+                           max_retries: int = REEMBED_MAX_RETRIES, page_size: int = REEMBED_PAGE_SIZE) -> dict:
+    """Tính lại embedding cho các sản phẩm đã thay đổi và ghi lại theo lô.
+
+    Một dòng được embed lại khi chưa có vector, khi được embed bằng model khác, hoặc khi nội dung
+    (tên, tác giả, thể loại, mô tả) đã đổi so với lần embed trước. Có thể dừng và chạy lại bất cứ lúc
+    nào: các lô đã ghi được bỏ qua ở lần chạy sau.
+
+    Args:
+        embedding_provider (EmbeddingProvider): Provider dùng để embed.
+        only_missing (bool): Chỉ embed các dòng chưa có vector.
+        force (bool): Embed lại toàn bộ.
+        batch_size (int): Số sản phẩm mỗi lần gọi provider.
+        concurrency (int): Số lô được embed và ghi đồng thời.
+        requests_per_minute (int): Giới hạn số lần gọi provider mỗi phút (0: không giới hạn).
+        max_retries (int): Số lần thử lại một lô khi provider lỗi.
+        page_size (int): Số dòng đọc mỗi lần từ DB.
+
+    Returns:
+        dict: Thống kê (scanned, skipped, embedded, failed, seconds).
+    """
+    model_name = embedding_provider.model_name
+    reindex = await asyncio.to_thread(prepare_embedding_columns, embedding_provider.dimension)
+
+    stats = {"scanned": 0, "skipped": 0, "embedded": 0, "failed": 0}
+    limiter = RateLimiter(requests_per_minute)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    start = time.perf_counter()
+
+    async def produce():
+        after_id = 0
+        pending = []
+        while rows := await _fetch_page(after_id, page_size):
+            after_id = rows[-1]["id"]
+            for row in rows:
+                stats["scanned"] += 1
+                text = product_embedding_text(row)
+                digest = embedding_hash(text)
+                if not _needs_embedding(row, model_name, digest, only_missing, force):
+                    stats["skipped"] += 1
+                    continue
+                pending.append((row["id"], text, digest))
+                if len(pending) == batch_size:
+                    await queue.put(pending)
+                    pending = []
+        if pending:
+            await queue.put(pending)
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    async def work():
+        while (batch := await queue.get()) is not None:
+            vectors = await _embed_with_retry(embedding_provider, [text for _, text, _ in batch],
+                                              limiter, max_retries)
+            if vectors is None:
+                stats["failed"] += len(batch)
+                continue
+            try:
+                await _write_batch([
+                    (product_id, to_vector(vector), model_name, digest)
+                    for (product_id, _, digest), vector in zip(batch, vectors)
+                ])
+            except Exception as e:
+                print(f"Lỗi khi ghi lô embedding ({type(e).__name__}): {e}")
+                stats["failed"] += len(batch)
+                continue
+            stats["embedded"] += len(batch)
+            elapsed = time.perf_counter() - start
+            print(f"Đã embed {stats['embedded']} sản phẩm ({stats['embedded'] / elapsed:,.1f} sản phẩm/giây)")
+
+    await asyncio.gather(produce(), *(work() for _ in range(concurrency)))
+
+    if reindex and stats["embedded"] + stats["skipped"]:
+        # Index được tạo lại trên cột toàn NULL khi đổi số chiều, build lại trên dữ liệu mới. Cả khi lần
+        # này không embed dòng nào (lần trước đã embed xong nhưng dừng trước bước này)
+        await asyncio.to_thread(reindex_vector_index)
+    if stats["embedded"]:
+        notify_product_change()
+
+    stats["seconds"] = time.perf_counter() - start
+    print(f"Hoàn tất: quét {stats['scanned']}, bỏ qua {stats['skipped']}, embed {stats['embedded']}, "
+          f"lỗi {stats['failed']} trong {stats['seconds']:.1f}s")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tính lại embedding cho sản phẩm bằng EMBEDDING_PROVIDER hiện tại")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--only-missing", action="store_true", help="chỉ embed các dòng chưa có vector")
+    group.add_argument("--force", action="store_true", help="embed lại toàn bộ")
+    parser.add_argument("--batch-size", type=int, default=REEMBED_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=REEMBED_CONCURRENCY)
+    parser.add_argument("--rpm", type=int, default=REEMBED_REQUESTS_PER_MINUTE, help="số request tối đa mỗi phút")
+    args = parser.parse_args()
+
+    from agent.sub_graph.rag_agent.embedding import embedding_provider
+
+    async def main():
+        try:
+            await reembed_products(embedding_provider, args.only_missing, args.force, args.batch_size,
+                                   args.concurrency, args.rpm)
+        finally:
+            await close_db_pool()
+
+    asyncio.run(main())
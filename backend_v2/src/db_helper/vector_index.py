@@ -0,0 +1,193 @@
+import os
+import math
+import argparse
+import dotenv
+from typing import Optional
+import numpy as np
+from .db_connection import get_async_db_connection, get_maintenance_connection
+
+
+dotenv.load_dotenv()
+
+# Metric quyết định đồng thời toán tử trong câu truy vấn và operator class của index.
+# Nếu hai thứ này lệch nhau (vd: index cosine nhưng ORDER BY <->) thì Postgres không dùng được index.
+DISTANCE_METRICS = {
+    "cosine": {"operator": "<=>", "opclass": "vector_cosine_ops"},
+    "l2": {"operator": "<->", "opclass": "vector_l2_ops"},
+    "inner_product": {"operator": "<#>", "opclass": "vector_ip_ops"},
+}
+
+VECTOR_DISTANCE_METRIC = os.getenv("VECTOR_DISTANCE_METRIC", "cosine")
+VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "hnsw")      # "hnsw" hoặc "ivfflat"
+VECTOR_INDEX_NAME = "idx_product_embedding_vector"
+# Comment trên cột embedding_vector: index được tạo lại trên cột toàn NULL khi đổi số chiều và
+# phải build lại sau khi embed xong. Giữ tới khi build_vector_index chạy thành công
+NEEDS_REINDEX_MARKER = "needs_reindex"
+# Số chiều của cột embedding_vector, phải khớp với EmbeddingProvider đang dùng (cùng biến môi trường)
+EMBEDDING_DIMENSION = int(os.getenv("EMBEDDING_DIMENSION", "768"))
+INDEX_BUILD_MAINTENANCE_WORK_MEM = os.getenv("INDEX_BUILD_MAINTENANCE_WORK_MEM", "256MB")
+
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "40"))
+IVFFLAT_PROBES = int(os.getenv("IVFFLAT_PROBES", "10"))
+
+if VECTOR_DISTANCE_METRIC not in DISTANCE_METRICS:
+    raise ValueError(f"Unknown VECTOR_DISTANCE_METRIC: {VECTOR_DISTANCE_METRIC}")
+if VECTOR_INDEX_TYPE not in ("hnsw", "ivfflat"):
+    raise ValueError(f"Unknown VECTOR_INDEX_TYPE: {VECTOR_INDEX_TYPE}")
+
+DISTANCE_OPERATOR = DISTANCE_METRICS[VECTOR_DISTANCE_METRIC]["operator"]
+DISTANCE_OPCLASS = DISTANCE_METRICS[VECTOR_DISTANCE_METRIC]["opclass"]
+
+
+def ivfflat_lists(row_count: int) -> int:
+    """Số list cho ivfflat theo khuyến nghị của pgvector: rows/1000 (tới 1 triệu dòng), sau đó sqrt(rows)."""
+    if row_count <= 1_000_000:
+        return max(1, row_count // 1000)
+    return max(1, int(math.sqrt(row_count)))
+
+
+def to_vector(values) -> np.ndarray:
+    """Chuyển embedding sang float32 ndarray để adapter pgvector gửi ở dạng binary (dùng với placeholder `%b`)."""
+    return np.asarray(values, dtype=np.float32)
+
+
+# Với kiểu vector(N) của pgvector, atttypmod chính là N (-1 nếu không khai báo số chiều)
+VECTOR_DIMENSION_QUERY = """
+    SELECT format_type(atttypid, atttypmod) AS column_type, atttypmod AS dimension
+    FROM pg_attribute
+    WHERE attrelid = 'product'::regclass AND attname = 'embedding_vector';
+"""
+
+
+def _dimension_from_row(row) -> Optional[int]:
+    if row is None or not row['column_type'].startswith("vector") or row['dimension'] <= 0:
+        return None
+    return row['dimension']
+
+
+def needs_reindex(cursor) -> bool:
+    """True nếu index vector còn phải build lại sau lần đổi số chiều gần nhất."""
+    cursor.execute("""
+        SELECT col_description(attrelid, attnum) AS comment
+        FROM pg_attribute
+        WHERE attrelid = 'product'::regclass AND attname = 'embedding_vector';
+    """)
+    row = cursor.fetchone()
+    return row is not None and row['comment'] == NEEDS_REINDEX_MARKER
+
+
+def get_vector_dimension(cursor) -> Optional[int]:
+    """Số chiều hiện tại của cột embedding_vector, None nếu cột chưa có kiểu vector(N)."""
+    cursor.execute(VECTOR_DIMENSION_QUERY)
+    return _dimension_from_row(cursor.fetchone())
+
+
+async def aget_vector_dimension() -> Optional[int]:
+    try:
+        async with get_async_db_connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(VECTOR_DIMENSION_QUERY)
+                return _dimension_from_row(await cursor.fetchone())
+    except Exception as e:
+        print(f"Lỗi khi đọc số chiều vector ({type(e).__name__}): {e}")
+        return None
+
+
+def set_vector_dimension(cursor, vector_size: int = EMBEDDING_DIMENSION) -> bool:
+    """Đưa cột embedding_vector về kiểu vector(vector_size), trả về True nếu kiểu cột bị thay đổi.
+
+    Nếu cột đã là vector với số chiều khác (đổi embedding model/provider), embedding cũ không so sánh
+    được với vector của model mới nên bị đặt về NULL và cần được tính lại.
+    """
+    current = get_vector_dimension(cursor)
+    if current == vector_size:
+        return False
+    if current is None:
+        using = f"embedding_vector::vector({vector_size})"
+    else:
+        using = f"NULL::vector({vector_size})"
+        print(f"Cột embedding_vector đổi từ {current} sang {vector_size} chiều: embedding cũ đã bị xoá, "
+              f"cần tính lại: python -m db_helper.reembed_products")
+
+    cursor.execute(f"""
+        ALTER TABLE Product
+        ALTER COLUMN embedding_vector TYPE vector({vector_size})
+        USING {using};
+    """)
+    if current is not None:
+        # Cùng transaction với ALTER: bị ngắt giữa chừng thì lần chạy sau vẫn biết phải build lại index
+        cursor.execute(f"COMMENT ON COLUMN Product.embedding_vector IS '{NEEDS_REINDEX_MARKER}';")
+    return True
+
+
+def vector_search_settings() -> tuple[str, tuple]:
+    """Câu lệnh đặt tham số recall cho truy vấn ANN, chỉ có hiệu lực trong transaction hiện tại.
+
+    Đặt cả hai tham số để vẫn đúng khi index được build lại bằng `reindex --index-type` khác với cấu hình.
+    """
+    return (
+        "SELECT set_config('hnsw.ef_search', %s, true), set_config('ivfflat.probes', %s, true);",
+        (str(HNSW_EF_SEARCH), str(IVFFLAT_PROBES)),
+    )
+
+
+def build_vector_index(cursor, index_type: str = VECTOR_INDEX_TYPE):
+    """(Re)build index ANN trên embedding_vector khớp với metric đã cấu hình."""
+    # Build index trên catalog lớn lâu hơn statement_timeout mặc định của pool
+    cursor.execute("SET LOCAL statement_timeout = 0;")
+    cursor.execute("SELECT set_config('maintenance_work_mem', %s, true);", (INDEX_BUILD_MAINTENANCE_WORK_MEM,))
+    # Xoá cả các index cũ không tên (mỗi lần chạy configuration_for_search trước đây lại tạo thêm một index ivfflat)
+    cursor.execute("""
+        SELECT indexname FROM pg_indexes
+        WHERE tablename = 'product' AND indexdef LIKE '%(embedding_vector%';
+    """)
+    for row in cursor.fetchall():
+        cursor.execute(f'DROP INDEX IF EXISTS "{row["indexname"]}";')
+
+    if index_type == "hnsw":
+        cursor.execute(f"""
+            CREATE INDEX {VECTOR_INDEX_NAME} ON Product
+            USING hnsw (embedding_vector {DISTANCE_OPCLASS})
+            WITH (m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION});
+        """)
+        print(f"Đã tạo index hnsw ({DISTANCE_OPCLASS}, m={HNSW_M}, ef_construction={HNSW_EF_CONSTRUCTION})")
+    elif index_type == "ivfflat":
+        cursor.execute("SELECT count(*) AS total FROM Product WHERE embedding_vector IS NOT NULL;")
+        lists = ivfflat_lists(cursor.fetchone()['total'])
+        cursor.execute(f"""
+            CREATE INDEX {VECTOR_INDEX_NAME} ON Product
+            USING ivfflat (embedding_vector {DISTANCE_OPCLASS})
+            WITH (lists = {lists});
+        """)
+        print(f"Đã tạo index ivfflat ({DISTANCE_OPCLASS}, lists={lists})")
+    else:
+        raise ValueError(f"Unknown index type: {index_type}")
+
+    cursor.execute("COMMENT ON COLUMN Product.embedding_vector IS NULL;")
+    cursor.execute("ANALYZE Product;")
+
+
+def reindex_vector_index(index_type: str = VECTOR_INDEX_TYPE) -> bool:
+    """Xây lại index vector, vd: sau khi thêm nhiều sản phẩm (lists của ivfflat phụ thuộc số dòng)."""
+    try:
+        with get_maintenance_connection() as conn:
+            with conn.cursor() as cursor:
+                build_vector_index(cursor, index_type)
+            conn.commit()
+        return True
+    except Exception as err:
+        print("Lỗi khi tạo lại index vector: ", err)
+        return False
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quản lý index vector của bảng Product")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    reindex_parser = subparsers.add_parser("reindex", help="Xây lại index ANN cho embedding_vector")
+    reindex_parser.add_argument("--index-type", choices=["hnsw", "ivfflat"], default=VECTOR_INDEX_TYPE)
+    args = parser.parse_args()
+
+    if args.command == "reindex":
+        reindex_vector_index(args.index_type)
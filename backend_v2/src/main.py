@@ -1,8 +1,31 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from API import cart_router, chat_router
+from API import cart_router, chat_router, health_router
+from db_helper.db_connection import open_db_pool, close_db_pool
+from agent.sub_graph.rag_agent.reranker import RERANK_WARMUP, reranker
+from agent.sub_graph.rag_agent.embedding import EMBEDDING_WARMUP, embedding_provider
+from agent.intent_classifier import INTENT_CLASSIFIER_ENABLED, intent_classifier
+from agent.checkpointer import checkpointer_manager
+from agent.graph import build_graph
+import asyncio
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await open_db_pool()
+    app.state.graph = build_graph(await checkpointer_manager.aopen())
+    if RERANK_WARMUP:
+        await asyncio.to_thread(reranker.warmup)
+    if EMBEDDING_WARMUP:
+        await asyncio.to_thread(embedding_provider.warmup)
+    if INTENT_CLASSIFIER_ENABLED:
+        await asyncio.to_thread(intent_classifier.load)
+    yield
+    await checkpointer_manager.aclose()
+    await close_db_pool()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -13,4 +36,5 @@ app.add_middleware(
 )
 
 app.include_router(cart_router, tags=["Cart"], prefix="/api")
-app.include_router(chat_router, tags=["Chat"], prefix="/api")
\ No newline at end of file
+app.include_router(chat_router, tags=["Chat"], prefix="/api")
+app.include_router(health_router, tags=["Health"], prefix="/api")
\ No newline at end of file
@@ -0,0 +1,85 @@
+import sqlite3
+import unicodedata
+
+import pytest
+
+from agent.sub_graph.rag_agent.embedding_cache import EmbeddingCache
+
+
+@pytest.fixture
+def cache_path(tmp_path) -> str:
+    return str(tmp_path / "cache" / "embedding_cache.sqlite3")
+
+
+def test_memory_hit_with_normalized_text(cache_path: str) -> None:
+    cache = EmbeddingCache(cache_path, memory_size=8)
+    cache.put("model", "Sách  Mèo", [0.5, 0.25])
+    assert cache.get("model", unicodedata.normalize("NFD", " sách mèo "), 2) == [0.5, 0.25]
+    assert cache.get_stats()["memory_hits"] == 1
+
+
+def test_key_includes_model_and_dimension(cache_path: str) -> None:
+    cache = EmbeddingCache(cache_path)
+    cache.put("model", "mèo", [0.5, 0.25])
+    assert cache.get("other", "mèo", 2) is None
+    assert cache.get("model", "mèo", 3) is None
+    assert cache.get_stats()["misses"] == 2
+
+
+def test_disk_tier_survives_restart(cache_path: str) -> None:
+    EmbeddingCache(cache_path).put("model", "mèo", [0.5, 0.25])
+    cache = EmbeddingCache(cache_path)
+    assert cache.get("model", "mèo", 2) == [0.5, 0.25]
+    assert cache.get("model", "mèo", 2) == [0.5, 0.25]
+    stats = cache.get_stats()
+    assert stats["disk_hits"] == 1 and stats["memory_hits"] == 1
+
+
+def test_memory_tier_is_lru(cache_path: str) -> None:
+    cache = EmbeddingCache(cache_path, memory_size=2)
+    cache.put("model", "a", [1.0])
+    cache.put("model", "b", [2.0])
+    cache.get("model", "a", 1)
+    cache.put("model", "c", [3.0])
+    assert cache.get_stats()["memory_entries"] == 2
+    assert cache.get("model", "b", 1) == [2.0]
+    assert cache.get_stats()["disk_hits"] == 1
+
+
+def test_disk_tier_evicts_least_recently_used(cache_path: str) -> None:
+    cache = EmbeddingCache(cache_path, memory_size=1, max_entries=10)
+    for i in range(11):
+        cache.put("model", f"text {i}", [float(i)])
+    stats = cache.get_stats()
+    assert stats["disk_entries"] == 9 and stats["evictions"] == 2
+    assert EmbeddingCache(cache_path).get("model", "text 0", 1) is None
+    assert EmbeddingCache(cache_path).get("model", "text 10", 1) == [10.0]
+
+
+def test_old_table_without_dimension_is_dropped(cache_path: str, tmp_path) -> None:
+    (tmp_path / "cache").mkdir()
+    conn = sqlite3.connect(cache_path)
+    conn.execute("CREATE TABLE embedding (model TEXT, text TEXT, vector BLOB, last_access REAL)")
+    conn.commit()
+    conn.close()
+
+    cache = EmbeddingCache(cache_path)
+    cache.put("model", "mèo", [0.5])
+    assert EmbeddingCache(cache_path).get("model", "mèo", 1) == [0.5]
+
+
+@pytest.mark.anyio
+async def test_async_get_and_put(cache_path: str) -> None:
+    cache = EmbeddingCache(cache_path)
+    assert await cache.aget("model", "mèo", 2) is None
+    await cache.aput("model", "mèo", [0.5, 0.25])
+    assert await cache.aget("model", "mèo", 2) == [0.5, 0.25]
+    assert await EmbeddingCache(cache_path).aget("model", "mèo", 2) == [0.5, 0.25]
+
+
+def test_clear(cache_path: str) -> None:
+    cache = EmbeddingCache(cache_path)
+    cache.put("model", "mèo", [0.5])
+    cache.clear()
+    assert cache.get("model", "mèo", 1) is None
+    assert cache.get_stats()["disk_entries"] == 0
@@ -0,0 +1,121 @@
+import unicodedata
+
+import numpy as np
+import pytest
+
+from agent.intent_classifier import IntentClassifier, load_examples, match_rules
+
+
+class FakeEmbedding:
+    name = "local"
+    model_name = "fake"
+    cache = None
+
+    def __init__(self, vectors: dict[str, list[float]]):
+        self.vectors = vectors
+        self.calls = 0
+
+    def get_embedding(self, text: str) -> list[float]:
+        return self.vectors[text]
+
+    async def aget_embedding(self, text: str) -> list[float]:
+        self.calls += 1
+        return self.vectors[text]
+
+
+class FakeRemoteEmbedding(FakeEmbedding):
+    name = "gemini"
+    dimension = 2
+
+    def __init__(self, vectors: dict[str, list[float]], cached: dict[str, list[float]]):
+        super().__init__(vectors)
+        self.cache = FakeCache(cached)
+
+
+class FakeCache:
+    def __init__(self, vectors: dict[str, list[float]]):
+        self.vectors = vectors
+
+    async def aget(self, model: str, text: str, dimension: int):
+        return self.vectors.get(text)
+
+
+@pytest.mark.parametrize("text", ["Xin chào shop", "cảm ơn bạn nhiều nhé", "hello", "tạm biệt"])
+def test_rules_chitchat(text: str) -> None:
+    assert match_rules(text) == "chitchat"
+
+
+@pytest.mark.parametrize("text", [
+    "mua 2 cuốn mã 12",
+    "đặt 5 cuốn mã sản phẩm 88",
+    unicodedata.normalize("NFD", "Đặt 2 cuốn mã 45"),
+    "dat hang ma 7",
+    "buy product id 3",
+    "mua isbn 9786041234567",
+])
+def test_rules_order(text: str) -> None:
+    assert match_rules(text) == "order"
+
+
+@pytest.mark.parametrize("text", [
+    "sách đạt giải Pulitzer mã 12 có hay không",
+    "dat giai sach ma 12",
+    "mua sách trinh thám",
+    "chào shop, có sách mèo không",
+])
+def test_rules_leave_the_rest_to_llm(text: str) -> None:
+    assert match_rules(text) is None
+
+
+def test_rules_agree_with_labelled_examples() -> None:
+    texts, labels = load_examples()
+    hits = [(text, label) for text, label in zip(texts, labels) if match_rules(text) is not None]
+    assert hits
+    assert all(match_rules(text) == label for text, label in hits)
+
+
+@pytest.mark.anyio
+async def test_centroids_only_answer_when_confident() -> None:
+    provider = FakeEmbedding({
+        "a1": [1.0, 0.0, 0.0], "a2": [0.9, 0.1, 0.0],
+        "b1": [0.0, 1.0, 0.0], "b2": [0.1, 0.9, 0.0],
+        "close to a": [0.95, 0.05, 0.0], "in between": [1.0, 1.0, 0.0], "unrelated": [0.0, 0.0, 1.0],
+    })
+    classifier = IntentClassifier(provider, min_similarity=0.75, min_margin=0.05)
+    classifier.fit(["a1", "a2", "b1", "b2"], ["chitchat", "chitchat", "product_infomation", "product_infomation"])
+
+    assert await classifier.aclassify("close to a") == "chitchat"
+    assert await classifier.aclassify("in between") is None
+    assert await classifier.aclassify("unrelated") is None
+    stats = classifier.get_stats()
+    assert stats["centroid_hits"] == 1 and stats["llm_fallbacks"] == 2
+
+
+@pytest.mark.anyio
+async def test_remote_provider_only_uses_cached_embeddings() -> None:
+    provider = FakeRemoteEmbedding({"a": [1.0, 0.0], "b": [0.0, 1.0]}, cached={"cached a": [0.9, 0.1]})
+    classifier = IntentClassifier(provider, min_similarity=0.75, min_margin=0.05)
+    classifier.fit(["a", "b"], ["chitchat", "product_infomation"])
+
+    assert await classifier.aclassify("cached a") == "chitchat"
+    assert await classifier.aclassify("not cached") is None
+    assert provider.calls == 0
+    stats = classifier.get_stats()
+    assert stats["centroid_hits"] == 1 and stats["remote_skips"] == 1 and stats["llm_fallbacks"] == 1
+
+
+def test_centroids_round_trip_and_model_check(tmp_path) -> None:
+    provider = FakeEmbedding({"a": [1.0, 0.0], "b": [0.0, 1.0]})
+    path = str(tmp_path / "intent.npz")
+    trained = IntentClassifier(provider, model_path=path)
+    trained.fit(["a", "b"], ["chitchat", "order"])
+    trained.save()
+
+    loaded = IntentClassifier(provider, model_path=path)
+    assert loaded.load()
+    assert loaded.labels == ["chitchat", "order"]
+    np.testing.assert_allclose(loaded.centroids, trained.centroids)
+
+    other = FakeEmbedding({})
+    other.model_name = "other"
+    assert not IntentClassifier(other, model_path=path).load()
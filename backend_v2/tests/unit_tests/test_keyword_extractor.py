@@ -0,0 +1,42 @@
+import json
+import unicodedata
+
+import pytest
+
+from agent.sub_graph.rag_agent.keyword_extractor import KeywordExtractor, normalize_query, strip_diacritics
+
+
+@pytest.fixture
+def extractor(tmp_path) -> KeywordExtractor:
+    stopwords = tmp_path / "vietnamese.stop"
+    stopwords.write_text("có\nkhông\ncủa\nsách\n", encoding="utf-8")
+    synonyms = tmp_path / "synonyms.json"
+    synonyms.write_text(json.dumps({"trinh thám": ["detective", "phá án"]}, ensure_ascii=False), encoding="utf-8")
+    return KeywordExtractor(str(stopwords), str(synonyms))
+
+
+def test_normalize_query_nfc_lowercase_without_punctuation() -> None:
+    assert normalize_query(unicodedata.normalize("NFD", "Đặt HÀNG, nhé!")) == "đặt hàng nhé"
+
+
+def test_strip_diacritics() -> None:
+    assert strip_diacritics("Đường đi tiểu thuyết") == "Duong di tieu thuyet"
+
+
+def test_extract_drops_stopwords_and_filler_phrases(extractor: KeywordExtractor) -> None:
+    result = extractor.extract("Có bán sách của tác giả Agatha Christie không?")
+    assert result["fts_keyword"] == "agatha christie"
+    assert result["vector_search_query"] == "Có bán sách của tác giả Agatha Christie không?"
+
+
+def test_extract_rewrites_synonyms(extractor: KeywordExtractor) -> None:
+    assert extractor.extract("truyện detective")["fts_keyword"] == "truyện trinh thám"
+    assert extractor.extract("truyện phá án")["fts_keyword"] == "truyện trinh thám"
+    # Gõ không dấu vẫn nhận ra từ trong catalog
+    assert extractor.extract("truyen trinh tham")["fts_keyword"] == "truyen trinh thám"
+
+
+def test_extract_deduplicates_and_normalizes(extractor: KeywordExtractor) -> None:
+    result = extractor.extract(unicodedata.normalize("NFD", "mèo   Mèo đen"))
+    assert result["fts_keyword"] == "mèo đen"
+    assert result["vector_search_query"] == unicodedata.normalize("NFC", "mèo Mèo đen")
@@ -0,0 +1,94 @@
+import threading
+
+import numpy as np
+import pytest
+
+from agent.sub_graph.rag_agent.rerank_executor import RerankExecutor, RerankQueueFull
+
+
+class FakeReranker:
+    """Điểm = độ dài document; lần gọi đầu chờ `release` để các request sau dồn lại trong hàng đợi."""
+
+    def __init__(self):
+        self.calls: list[list[str]] = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def score_pairs(self, queries: list[str], documents: list[str], batch_size: int = 32) -> np.ndarray:
+        self.started.set()
+        self.release.wait(timeout=5)
+        self.calls.append(list(documents))
+        return np.asarray([len(document) for document in documents], dtype=np.float32)
+
+
+class FailingReranker:
+    def score_pairs(self, queries: list[str], documents: list[str], batch_size: int = 32) -> np.ndarray:
+        raise RuntimeError("model crashed")
+
+
+def test_rank_returns_top_k_by_score() -> None:
+    service = FakeReranker()
+    service.release.set()
+    executor = RerankExecutor(service, max_batch=8, max_wait_ms=1)
+    results = executor.submit("q", ["bb", "a", "dddd", "ccc"], top_k=2).result(timeout=5)
+    assert [(r.index, r.document) for r in results] == [(2, "dddd"), (3, "ccc")]
+
+
+def test_concurrent_requests_share_one_batch() -> None:
+    service = FakeReranker()
+    executor = RerankExecutor(service, max_batch=8, max_wait_ms=50)
+    first = executor.submit("q1", ["a"], top_k=1)
+    assert service.started.wait(timeout=5)
+    second = executor.submit("q2", ["bb", "c"], top_k=2)
+    third = executor.submit("q3", ["ddd"], top_k=1)
+    service.release.set()
+
+    assert first.result(timeout=5)[0].document == "a"
+    assert [r.document for r in second.result(timeout=5)] == ["bb", "c"]
+    assert third.result(timeout=5)[0].document == "ddd"
+    assert service.calls == [["a"], ["bb", "c", "ddd"]]
+    assert executor.get_stats()["batches"] == 2 and executor.get_stats()["pairs"] == 4
+
+
+def test_cancelled_request_is_not_scored() -> None:
+    service = FakeReranker()
+    executor = RerankExecutor(service, max_batch=8, max_wait_ms=50)
+    first = executor.submit("q1", ["a"])
+    assert service.started.wait(timeout=5)
+    cancelled = executor.submit("q2", ["bb"])
+    kept = executor.submit("q3", ["ccc"])
+    assert cancelled.cancel()
+    service.release.set()
+
+    assert kept.result(timeout=5)[0].document == "ccc"
+    first.result(timeout=5)
+    assert service.calls == [["a"], ["ccc"]]
+
+
+def test_full_queue_rejects() -> None:
+    service = FakeReranker()
+    executor = RerankExecutor(service, max_batch=1, max_wait_ms=0, queue_depth=1)
+    executor.submit("q1", ["a"])
+    assert service.started.wait(timeout=5)
+    executor.submit("q2", ["b"])
+    with pytest.raises(RerankQueueFull):
+        executor.submit("q3", ["c"])
+    service.release.set()
+    assert executor.get_stats()["rejected"] == 1
+
+
+@pytest.mark.anyio
+async def test_async_rank() -> None:
+    service = FakeReranker()
+    service.release.set()
+    executor = RerankExecutor(service, max_batch=8, max_wait_ms=1)
+    assert await executor.rank("q", []) == []
+    assert (await executor.rank("q", ["a", "bb"], top_k=1))[0].document == "bb"
+
+
+@pytest.mark.anyio
+async def test_backend_error_fails_the_batch() -> None:
+    executor = RerankExecutor(FailingReranker(), max_batch=8, max_wait_ms=1)
+    with pytest.raises(RuntimeError):
+        await executor.rank("q", ["a"])
+    assert executor.get_stats()["failed"] == 1
@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+import pytest
+
+from agent.sub_graph.rag_agent import semantic_cache as semantic_cache_module
+from agent.sub_graph.rag_agent.semantic_cache import SemanticCache
+
+
+@pytest.fixture
+def clock(monkeypatch) -> SimpleNamespace:
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(semantic_cache_module, "time", SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def test_hit_above_threshold_only(clock) -> None:
+    cache = SemanticCache(threshold=0.9, ttl=60, max_entries=4)
+    cache.put([1.0, 0.0], "cats")
+    assert cache.get([2.0, 0.1]) == "cats"
+    assert cache.get([1.0, 1.0]) is None
+    assert cache.get([1.0, 0.0, 0.0]) is None
+    assert cache.get_stats()["hits"] == 1 and cache.get_stats()["misses"] == 2
+
+
+def test_entries_expire_after_ttl(clock) -> None:
+    cache = SemanticCache(threshold=0.9, ttl=60, max_entries=4)
+    cache.put([1.0, 0.0], "cats")
+    clock.now += 59
+    assert cache.get([1.0, 0.0]) == "cats"
+    clock.now += 2
+    assert cache.get([1.0, 0.0]) is None
+
+
+def test_full_cache_evicts_expired_then_least_recently_used(clock) -> None:
+    cache = SemanticCache(threshold=0.99, ttl=60, max_entries=2)
+    cache.put([1.0, 0.0], "a")
+    clock.now += 1
+    cache.put([0.0, 1.0], "b")
+    clock.now += 1
+    assert cache.get([1.0, 0.0]) == "a"
+    # Đầy: "b" lâu không dùng nhất nên bị ghi đè
+    cache.put([1.0, 1.0], "c")
+    assert cache.get([0.0, 1.0]) is None
+    assert cache.get([1.0, 0.0]) == "a" and cache.get([1.0, 1.0]) == "c"
+
+    # "a" hết hạn trước "c" nên được ghi đè trước, dù vừa mới dùng
+    clock.now += 59
+    assert cache.get([1.0, 0.0]) is None
+    cache.put([1.0, -1.0], "d")
+    assert cache.get([1.0, 1.0]) == "c" and cache.get([1.0, -1.0]) == "d"
+
+
+def test_invalidate_clears_everything(clock) -> None:
+    cache = SemanticCache(threshold=0.9, ttl=60, max_entries=4)
+    cache.put([1.0, 0.0], "cats")
+    cache.invalidate("product", 42)
+    assert cache.get([1.0, 0.0]) is None
+    assert cache.get_stats()["entries"] == 0 and cache.get_stats()["invalidations"] == 1
+    cache.put([1.0, 0.0], "dogs")
+    assert cache.get([1.0, 0.0]) == "dogs"
+
+
+def test_zero_vector_is_ignored(clock) -> None:
+    cache = SemanticCache(threshold=0.9, ttl=60, max_entries=4)
+    cache.put([0.0, 0.0], "nothing")
+    assert cache.get_stats()["entries"] == 0
+    assert cache.get([0.0, 0.0]) is None
@@ -0,0 +1,108 @@
+import asyncio
+import gc
+import warnings
+
+import pytest
+
+from agent.speculation import SpeculationStats, run_speculative
+
+pytestmark = pytest.mark.anyio
+
+
+async def value_after(value, delay: float):
+    await asyncio.sleep(delay)
+    return value
+
+
+async def test_accepted_speculation_returns_result() -> None:
+    stats = SpeculationStats()
+    decision, result = await run_speculative(value_after("rag", 0.02), value_after(["product"], 0.01),
+                                             accept=lambda route: route == "rag", stats=stats)
+    assert (decision, result) == ("rag", ["product"])
+    assert stats.get_stats()["used"] == 1 and stats.get_stats()["discarded"] == 0
+
+
+async def test_accepted_speculation_waits_for_slow_work() -> None:
+    stats = SpeculationStats()
+    decision, result = await run_speculative(value_after("rag", 0), value_after(["product"], 0.02),
+                                             accept=lambda route: route == "rag", stats=stats)
+    assert result == ["product"]
+    assert stats.get_stats()["used"] == 1
+
+
+async def test_rejected_speculation_is_cancelled() -> None:
+    stats = SpeculationStats()
+    started, cancelled = asyncio.Event(), asyncio.Event()
+
+    async def slow_search():
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    decision, result = await run_speculative(value_after("chitchat", 0.01), slow_search(),
+                                             accept=lambda route: route == "rag", stats=stats)
+    assert (decision, result) == ("chitchat", None)
+    await asyncio.wait_for(cancelled.wait(), timeout=1)
+    assert started.is_set()
+    assert stats.get_stats()["discarded"] == 1 and stats.get_stats()["cancelled"] == 1
+
+
+async def test_rejected_finished_speculation_is_discarded() -> None:
+    stats = SpeculationStats()
+    decision, result = await run_speculative(value_after("chitchat", 0.02), value_after(["product"], 0),
+                                             accept=lambda route: route == "rag", stats=stats)
+    assert result is None
+    assert stats.get_stats()["discarded"] == 1 and stats.get_stats()["cancelled"] == 0
+
+
+async def test_failed_speculation_falls_back_to_none() -> None:
+    stats = SpeculationStats()
+
+    async def broken_search():
+        raise RuntimeError("db down")
+
+    decision, result = await run_speculative(value_after("rag", 0.01), broken_search(),
+                                             accept=lambda route: route == "rag", stats=stats)
+    assert (decision, result) == ("rag", None)
+    assert stats.get_stats()["failed"] == 1
+
+
+async def test_router_error_closes_unstarted_speculation() -> None:
+    stats = SpeculationStats()
+
+    async def broken_router():
+        raise RuntimeError("quota")
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        with pytest.raises(RuntimeError):
+            await run_speculative(broken_router(), value_after(["product"], 10), accept=lambda route: True,
+                                  stats=stats)
+        gc.collect()
+    assert stats.get_stats()["discarded"] == 1
+    assert stats.get_stats()["cancelled"] == 0 and stats.get_stats()["wasted_seconds"] == 0
+
+
+async def test_router_error_cancels_running_speculation() -> None:
+    stats = SpeculationStats()
+    started, cancelled = asyncio.Event(), asyncio.Event()
+
+    async def slow_search():
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    async def broken_router():
+        await started.wait()
+        raise RuntimeError("quota")
+
+    with pytest.raises(RuntimeError):
+        await run_speculative(broken_router(), slow_search(), accept=lambda route: True, stats=stats)
+    await asyncio.wait_for(cancelled.wait(), timeout=1)
+    assert stats.get_stats()["discarded"] == 1 and stats.get_stats()["cancelled"] == 1
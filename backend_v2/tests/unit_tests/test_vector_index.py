@@ -0,0 +1,13 @@
+from db_helper.vector_index import ivfflat_lists
+
+
+def test_ivfflat_lists_one_per_thousand_rows() -> None:
+    assert ivfflat_lists(0) == 1
+    assert ivfflat_lists(999) == 1
+    assert ivfflat_lists(50_000) == 50
+    assert ivfflat_lists(1_000_000) == 1000
+
+
+def test_ivfflat_lists_sqrt_above_one_million() -> None:
+    assert ivfflat_lists(4_000_000) == 2000
+    assert ivfflat_lists(1_000_001) == 1000